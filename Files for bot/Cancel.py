@@ -1,11 +1,15 @@
+import argparse
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardRemove
+from aiogram import Bot
 import os
 from dotenv import load_dotenv
 
+from broadcast import BroadcastEngine
+from database import Database
+from maintenance import MAINTENANCE_KEY, MAINTENANCE_MESSAGE
+from outbound import RateLimitMiddleware
+
 load_dotenv()
 
 logging.basicConfig(
@@ -14,89 +18,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-BOT_TOKEN = os.getenv('BOT_TOKEN')
-
-if not BOT_TOKEN:
-    raise ValueError("BOT_TOKEN environment variable is not set")
-
-# Инициализируем бота и диспетчер
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-
-# Сообщение о технических работах
-MAINTENANCE_MESSAGE = """
-🔧 *Бот временно не работает*
-
-В настоящее время проводятся технические работы. 
-Приносим извинения за временные неудобства.
-
-⏰ *Примерное время восстановления:* 
-уточняется
-
-📞 *По всем вопросам обращайтесь к администраторам.*
-
-Бот автоматически уведомит вас, когда работа будет восстановлена.
-"""
-
+# Режим техработ теперь встроен в основной бот (maintenance.py): этот скрипт только
+# переключает флаг в bot_settings, работающие экземпляры применяют его сразу.
+#
+#     python Cancel.py on              # включить техработы
+#     python Cancel.py on --broadcast  # включить и разослать уведомление всем пользователям
+#     python Cancel.py off             # выключить
 
-@dp.message(Command("start"))
-async def cmd_start(message: types.Message):
-    await message.answer(
-        MAINTENANCE_MESSAGE,
-        parse_mode="Markdown",
-        reply_markup=ReplyKeyboardRemove()
-    )
 
-@dp.message(Command("book"))
-async def cmd_book(message: types.Message):
-    await message.answer(
-        MAINTENANCE_MESSAGE,
-        parse_mode="Markdown",
-        reply_markup=ReplyKeyboardRemove()
-    )
+async def broadcast_notice(db):
+    """Рассылает уведомление о техработах и ждет окончания рассылки"""
+    bot_token = os.getenv('BOT_TOKEN')
+    if not bot_token:
+        raise ValueError("BOT_TOKEN environment variable is not set")
 
-@dp.message(Command("help"))
-async def cmd_help(message: types.Message):
-    await message.answer(
-        MAINTENANCE_MESSAGE,
-        parse_mode="Markdown",
-        reply_markup=ReplyKeyboardRemove()
-    )
-
-
-
-# Обработчик всех callback запросов
-@dp.callback_query()
-async def any_callback(callback: types.CallbackQuery):
-    await callback.message.answer(
-        MAINTENANCE_MESSAGE,
-        parse_mode="Markdown",
-        reply_markup=ReplyKeyboardRemove()
-    )
-    await callback.answer()
-
-async def main():
-    """Основная функция запуска бота в режиме техобслуживания"""
+    bot = Bot(token=bot_token)
+    bot.session.middleware(RateLimitMiddleware())
+    broadcast = BroadcastEngine(db, bot)
+    broadcast_id = None
     try:
-        logger.info("Запуск бота в режиме технического обслуживания...")
-
-        logger.info("Бот готов к работе в режиме технического обслуживания")
-        logger.info("Бот отвечает на все сообщения уведомлением о техработах")
+        broadcast_id = await broadcast.start(MAINTENANCE_MESSAGE, parse_mode="Markdown")
+        logger.info(f"Уведомление о техработах рассылается всем пользователям (рассылка #{broadcast_id})")
+        await broadcast.wait(broadcast_id)
+        broadcast_id = None
+    finally:
+        # Прерванное уведомление не должно продолжиться после возвращения бота
+        if broadcast_id is not None:
+            await broadcast.cancel(broadcast_id)
+        await bot.session.close()
 
-        # Запускаем поллинг
-        await dp.start_polling(bot)
 
-    except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
+async def main(mode, notify):
+    """Переключает режим техработ для всех экземпляров бота"""
+    db = Database()
+    try:
+        await db.set_setting(MAINTENANCE_KEY, mode)
+        logger.info(f"Режим техработ: {mode}")
+        if mode == 'on' and notify:
+            await broadcast_notice(db)
     finally:
-        await bot.session.close()
-        logger.info("Бот остановлен")
+        await db.close()
 
 
 if __name__ == "__main__":
-    print("=" * 50)
-    print("РЕЖИМ ТЕХНИЧЕСКОГО ОБСЛУЖИВАНИЯ")
-    print("Бот будет отвечать на все сообщения уведомлением о техработах")
-    print("=" * 50)
+    parser = argparse.ArgumentParser(description="Режим технического обслуживания бота")
+    parser.add_argument('mode', choices=['on', 'off'])
+    parser.add_argument('--broadcast', action='store_true', help="разослать уведомление всем пользователям")
+    args = parser.parse_args()
 
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(args.mode, args.broadcast))
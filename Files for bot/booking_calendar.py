@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+# Окно бронирования - 4 недели вперед
+WINDOW_WEEKS = 4
+
+DAYS_RU = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+MONTHS_SHORT_RU = ['янв', 'фев', 'мар', 'апр', 'май', 'июн',
+                   'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
+MONTHS_RU = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+             'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
+
+
+def week_range(today, week_offset):
+    """Диапазон дат недели (пн-сб) со смещением week_offset от недели today"""
+    monday = today - timedelta(days=today.weekday())
+    start_date = monday + timedelta(weeks=week_offset)
+    return start_date, start_date + timedelta(days=5)
+
+
+def format_date(date):
+    """Форматирует дату для отображения ("Пн, 5 окт")"""
+    return f"{DAYS_RU[date.weekday()]}, {date.day} {MONTHS_SHORT_RU[date.month - 1]}"
+
+
+def format_week(start_date, end_date):
+    """Форматирует диапазон недели ("5-10 октября")"""
+    if start_date.month == end_date.month:
+        return f"{start_date.day}-{end_date.day} {MONTHS_RU[start_date.month - 1]}"
+    return f"{start_date.day} {MONTHS_RU[start_date.month - 1]} - {end_date.day} {MONTHS_RU[end_date.month - 1]}"
+
+
+class BookingCalendar:
+    """Окно бронирования на 4 недели, собранное один раз в сутки
+
+    Даты, подписи для кнопок и рабочие часы пересчитываются только при
+    смене локальной даты; данные кнопок кодируются отдельно (callbacks.py).
+    Часы берутся из clock, поэтому в тестах время можно зафиксировать.
+    """
+
+    def __init__(self, clock=datetime.now, weeks=WINDOW_WEEKS, working_hours=None):
+        self.clock = clock
+        self.weeks_count = weeks
+        self.working_hours = working_hours
+        self._day = None
+        self._weeks = None
+        self.builds = 0
+
+    def _ensure_window(self):
+        today = self.clock().date()
+        if today != self._day:
+            self._weeks = self._build(today)
+            self._day = today
+        return self._weeks
+
+    def _day_entry(self, date):
+        return {
+            'date': date,
+            'display': format_date(date),
+            'working_hours': self.working_hours(date) if self.working_hours else None
+        }
+
+    def _build(self, today):
+        self.builds += 1
+        weeks = []
+        for week_offset in range(self.weeks_count):
+            start_date, end_date = week_range(today, week_offset)
+            dates = []
+            current = start_date
+            while current <= end_date:
+                # Исключаем воскресенья и даты в прошлом
+                if current.weekday() != 6 and current >= today:
+                    dates.append(self._day_entry(current))
+                current += timedelta(days=1)
+
+            weeks.append({
+                'offset': week_offset,
+                'start_date': start_date,
+                'end_date': end_date,
+                'display': format_week(start_date, end_date),
+                'dates': dates
+            })
+        return weeks
+
+    def today(self):
+        self._ensure_window()
+        return self._day
+
+    def week(self, week_offset):
+        """Данные недели окна или None, если неделя вне окна"""
+        weeks = self._ensure_window()
+        if 0 <= week_offset < len(weeks):
+            return weeks[week_offset]
+        return None
+
+    def available_weeks(self):
+        """Недели окна, которые еще не закончились"""
+        weeks = self._ensure_window()
+        return [week for week in weeks if week['end_date'] >= self._day]
+
+    def week_days(self, week_offset):
+        """Дни недели (без воскресений и прошедших) с готовыми подписями"""
+        week = self.week(week_offset)
+        if week is not None:
+            return week['dates']
+
+        today = self.today()
+        start_date, _ = week_range(today, week_offset)
+        days = []
+        for i in range(6):
+            current = start_date + timedelta(days=i)
+            if current >= today:
+                days.append(self._day_entry(current))
+        return days
+
+    def week_dates(self, week_offset):
+        """Даты недели без воскресений и прошедших дней"""
+        return [day['date'] for day in self.week_days(week_offset)]
+
+    def week_range(self, week_offset):
+        week = self.week(week_offset)
+        if week is not None:
+            return week['start_date'], week['end_date']
+        return week_range(self.today(), week_offset)
+
+    def week_display(self, week_offset):
+        week = self.week(week_offset)
+        if week is not None:
+            return week['display']
+        return format_week(*week_range(self.today(), week_offset))
@@ -0,0 +1,140 @@
+import bisect
+import json
+import logging
+import os
+from datetime import date, time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Индекс активных броней в памяти (0 - все чтения идут в PostgreSQL)
+BOOKING_INDEX_ENABLED = os.getenv('BOOKING_INDEX_ENABLED', '1') == '1'
+# Канал LISTEN/NOTIFY, в который триггер bookings пишет изменения (migrations/006)
+BOOKING_CHANNEL = 'booking_changes'
+
+logger = logging.getLogger(__name__)
+
+# События Database.add_listener по статусу брони
+EVENTS_BY_STATUS = {
+    'active': 'added',
+    'cancelled': 'cancelled',
+    'expired': 'expired'
+}
+
+
+class BookingIndex:
+    """Активные брони в памяти: дата -> тип -> список (начало, id, бронь)
+
+    Списки отсортированы по началу, пересечения ищутся бинарным поиском.
+    Индекс заполняется Database.load_booking_index, изменения этого экземпляра
+    попадают в него через Database.add_listener, изменения других экземпляров -
+    через LISTEN/NOTIFY. Пока индекс не загружен (ready = False), Database
+    отвечает запросами к PostgreSQL. Чтения возвращают сами хранимые словари
+    (как записи asyncpg, их не изменяют).
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._days = {}
+        self._by_id = {}
+        self.reads = 0
+        self.updates = 0
+        self.remote_updates = 0
+
+    def load(self, bookings):
+        """Полностью заменяет содержимое индекса активными бронями"""
+        self._days.clear()
+        self._by_id.clear()
+        for booking in bookings:
+            self.add(booking)
+        self.ready = True
+        logger.info(f"Booking index loaded: {len(self._by_id)} active bookings")
+
+    def add(self, booking):
+        booking = dict(booking)
+        booking.setdefault('status', 'active')
+        booking.setdefault('full_name', None)
+
+        self.remove(booking['id'])
+        types = self._days.setdefault(booking['booking_date'], {})
+        bisect.insort(types.setdefault(booking['booking_type'], []), (booking['start_time'], booking['id'], booking))
+        self._by_id[booking['id']] = booking
+
+    def remove(self, booking_id):
+        booking = self._by_id.pop(booking_id, None)
+        if booking is None:
+            return
+        types = self._days[booking['booking_date']]
+        entries = types[booking['booking_type']]
+        position = bisect.bisect_left(entries, (booking['start_time'], booking_id))
+        del entries[position]
+        if not entries:
+            del types[booking['booking_type']]
+            if not types:
+                del self._days[booking['booking_date']]
+
+    def suspend(self):
+        """Уведомления не приходят - индекс может отстать, чтения уходят в PostgreSQL до загрузки"""
+        self.ready = False
+
+    def contains(self, booking_id):
+        return booking_id in self._by_id
+
+    def set_name(self, user_id, full_name):
+        """Новое имя пользователя во всех его бронях (смена имени - редкая операция)"""
+        for booking in self._by_id.values():
+            if booking['user_id'] == user_id:
+                booking['full_name'] = full_name
+
+    def _entries(self, booking_date, booking_type):
+        return self._days.get(booking_date, {}).get(booking_type, ())
+
+    def on_booking_event(self, event, booking):
+        self.updates += 1
+        if event == 'added':
+            self.add(booking)
+        else:
+            self.remove(booking['id'])
+
+    def get_conflicting_bookings(self, booking_date, start_time, end_time, booking_type):
+        """Брони типа, пересекающиеся с [start_time, end_time)"""
+        self.reads += 1
+        entries = self._entries(booking_date, booking_type)
+        # Брони, начавшиеся до конца интервала; из них - те, что заканчиваются после его начала
+        last = bisect.bisect_left(entries, (end_time,))
+        return [booking for _, _, booking in entries[:last] if booking['end_time'] > start_time]
+
+    def get_bookings_by_date_and_type(self, booking_date, booking_type=None):
+        """Брони даты по типу (None или "all" - все типы, по типу и началу)"""
+        self.reads += 1
+        if booking_type and booking_type != "all":
+            return [booking for _, _, booking in self._entries(booking_date, booking_type)]
+        types = self._days.get(booking_date, {})
+        return [booking for slot_type in sorted(types) for _, _, booking in types[slot_type]]
+
+    def has_booking_type_on_date(self, user_id, booking_type, booking_date):
+        self.reads += 1
+        return any(booking['user_id'] == user_id for _, _, booking in self._entries(booking_date, booking_type))
+
+    def stats(self):
+        return {
+            'ready': self.ready,
+            'bookings': len(self._by_id),
+            'days': len(self._days),
+            'reads': self.reads,
+            'updates': self.updates,
+            'remote_updates': self.remote_updates
+        }
+
+
+def parse_notification(payload):
+    """Бронь и событие из уведомления триггера bookings ((None, None) - неизвестный статус)"""
+    data = json.loads(payload)
+    event = EVENTS_BY_STATUS.get(data.pop('status'))
+    if event is None:
+        return None, None
+    data['booking_date'] = date.fromisoformat(data['booking_date'])
+    data['start_time'] = time.fromisoformat(data['start_time'])
+    data['end_time'] = time.fromisoformat(data['end_time'])
+    return event, data
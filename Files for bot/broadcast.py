@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from dotenv import load_dotenv
+
+from outbound import TokenBucket
+
+load_dotenv()
+
+# Рассылка занимает не весь общий лимит Bot API (~30 сообщений в секунду)
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', '8'))
+# Получатели читаются и сохраняются страницами: после падения повторно уйдет не больше страницы
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', '200'))
+# Аренда рассылки экземпляром бота; продлевается на каждой странице
+BROADCAST_LEASE_SECONDS = int(os.getenv('BROADCAST_LEASE_SECONDS', '300'))
+
+logger = logging.getLogger(__name__)
+
+
+def _is_blocked(error):
+    """Пользователь заблокировал бота или удалил аккаунт"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in str(error)
+
+
+class BroadcastEngine:
+    """Рассылка сообщения всем активным пользователям
+
+    Получатели читаются из users страницами по курсору user_id, каждая страница
+    отправляется пулом воркеров с общим token bucket на BROADCAST_RATE сообщений
+    в секунду. После страницы курсор, счетчики и отключение заблокировавших
+    бота сохраняются в broadcasts одной транзакцией. Фоновая задача run раз в
+    lease_seconds подбирает рассылки с истекшей арендой (экземпляр упал) и
+    продолжает их с сохраненного места; при штатной остановке release
+    освобождает аренду, чтобы рассылку сразу подхватил следующий запуск.
+    """
+
+    def __init__(self, db, bot, rate=BROADCAST_RATE, workers=BROADCAST_WORKERS, page_size=BROADCAST_PAGE_SIZE,
+                 lease_seconds=BROADCAST_LEASE_SECONDS):
+        self.db = db
+        self.bot = bot
+        self.workers = workers
+        self.page_size = page_size
+        self.lease_seconds = lease_seconds
+        self._limiter = TokenBucket(rate, rate)
+        self._tasks = {}
+
+    async def start(self, text, parse_mode=None, created_by=None):
+        """Запускает рассылку в фоне; возвращает ее ID"""
+        broadcast = await self.db.create_broadcast(text, parse_mode, created_by, self.lease_seconds)
+        self._spawn(dict(broadcast))
+        logger.info(f"Broadcast {broadcast['id']} started by {created_by}")
+        return broadcast['id']
+
+    async def resume(self):
+        """Продолжает рассылки, прерванные падением или перезапуском"""
+        for broadcast in await self.db.claim_running_broadcasts(self.lease_seconds):
+            if broadcast['id'] in self._tasks:
+                # Своя рассылка, аренда которой не продлилась вовремя (долгая страница)
+                continue
+            logger.info(f"Resuming broadcast {broadcast['id']} after user_id {broadcast['last_user_id']}")
+            self._spawn(dict(broadcast))
+
+    async def run(self):
+        """Фоновая задача: подбирает брошенные рассылки сразу и затем раз в lease_seconds"""
+        while True:
+            try:
+                await self.resume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error resuming broadcasts: {e}")
+            await asyncio.sleep(self.lease_seconds)
+
+    async def release(self):
+        """Штатная остановка: прерывает рассылки этого экземпляра и освобождает их аренду"""
+        tasks = dict(self._tasks)
+        if not tasks:
+            return
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        await self.db.release_broadcasts(list(tasks))
+        logger.info(f"Released broadcasts {sorted(tasks)} for the next start")
+
+    async def cancel(self, broadcast_id):
+        """Останавливает рассылку; оставшиеся получатели ее не получат"""
+        task = self._tasks.pop(broadcast_id, None)
+        if task is not None:
+            task.cancel()
+        return await self.db.finish_broadcast(broadcast_id, 'cancelled')
+
+    async def wait(self, broadcast_id):
+        """Дождаться окончания рассылки, запущенной этим экземпляром"""
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            await task
+
+    def _spawn(self, broadcast):
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast['id']] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast['id'], None))
+
+    async def _run(self, broadcast):
+        after = broadcast['last_user_id']
+        try:
+            while True:
+                user_ids = await self.db.get_broadcast_recipients(after, self.page_size)
+                if not user_ids:
+                    break
+                sent, failed, blocked = await self._send_page(broadcast, user_ids)
+                after = user_ids[-1]
+                await self.db.checkpoint_broadcast(
+                    broadcast['id'], after, sent, failed, blocked, self.lease_seconds
+                )
+
+            result = await self.db.finish_broadcast(broadcast['id'])
+            if result is not None:
+                logger.info(
+                    f"Broadcast {result['id']} done: sent={result['sent']}, "
+                    f"blocked={result['blocked']}, failed={result['failed']}"
+                )
+                await self._report(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Рассылка остается running и продолжится после истечения аренды при следующем запуске
+            logger.error(f"Error in broadcast {broadcast['id']}: {e}", exc_info=True)
+
+    async def _send_page(self, broadcast, user_ids):
+        queue = asyncio.Queue()
+        for user_id in user_ids:
+            queue.put_nowait(user_id)
+        counters = {'sent': 0, 'failed': 0}
+        blocked = []
+
+        async def worker():
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                await self._limiter.acquire()
+                try:
+                    await self.bot.send_message(user_id, broadcast['text'], parse_mode=broadcast['parse_mode'])
+                    counters['sent'] += 1
+                except Exception as e:
+                    if _is_blocked(e):
+                        blocked.append(user_id)
+                    else:
+                        counters['failed'] += 1
+                        logger.warning(f"Broadcast {broadcast['id']} to {user_id} failed: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(user_ids)))))
+        return counters['sent'], counters['failed'], blocked
+
+    async def _report(self, result):
+        if not result['created_by']:
+            return
+        try:
+            await self.bot.send_message(
+                result['created_by'],
+                f"📢 Рассылка #{result['id']} завершена\n\n"
+                f"✅ Доставлено: {result['sent']}\n"
+                f"🚫 Заблокировали бота: {result['blocked']}\n"
+                f"❌ Ошибок: {result['failed']}"
+            )
+        except Exception as e:
+            logger.error(f"Error reporting broadcast {result['id']}: {e}")
+
+    def stats(self):
+        return {'running': len(self._tasks)}
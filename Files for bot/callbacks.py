@@ -0,0 +1,236 @@
+import binascii
+import inspect
+import logging
+import struct
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Компактный формат данных inline-кнопок (Telegram ограничивает callback_data 64 байтами):
+#
+#     "#" + версия формата + символ вида кнопки + base64url(поля, упакованные struct)
+#
+# Например, выбор даты - "#1dJjo" (6 байт) вместо "select_date_2026-10-17".
+# Простые кнопки без параметров ("book_now", "back_to_main") не кодируются.
+# При несовместимом изменении полей или кодов типов версия увеличивается:
+# кнопки в старых сообщениях тогда распознаются как устаревшие.
+
+CALLBACK_MARK = "#"
+CALLBACK_VERSION = "1"
+
+# Даты передаются числом дней от этой даты (2 байта)
+DAY_EPOCH = date(2000, 1, 1)
+_EPOCH_ORDINAL = DAY_EPOCH.toordinal()
+
+# Коды типов бронирования в данных кнопок (0 - все типы в фильтре)
+BOOKING_TYPE_IDS = {
+    "Лекторий": 1,
+    "Плейстейшн": 2,
+    "Компьютеры": 3
+}
+BOOKING_TYPES_BY_ID = {type_id: booking_type for booking_type, type_id in BOOKING_TYPE_IDS.items()}
+
+# Шаги, к которым ведет кнопка "Назад" в мастере бронирования
+BACK_TO_DATE = 1
+BACK_TO_TYPE = 2
+BACK_TO_TIME = 3
+
+# Коды полей: struct-формат и преобразование значения
+_FIELD_CODES = {
+    'B': ('B', None, None),
+    'H': ('H', None, None),
+    'I': ('I', None, None),
+    'D': ('H', lambda value: value.toordinal() - _EPOCH_ORDINAL, lambda raw: date.fromordinal(_EPOCH_ORDINAL + raw))
+}
+
+# base64url через binascii: заметно быстрее модуля base64
+_PADDING = ('', '===', '==', '=')
+
+_KINDS = {}
+
+
+class StaleCallbackError(ValueError):
+    """Данные кнопки другой версии или повреждены"""
+
+
+class CompactCallback:
+    """Базовый класс данных кнопки
+
+    Подкласс задает символ вида и поля:
+
+        class BookingTime(CompactCallback, kind="h", fields=(("hour", "B"),)):
+            pass
+
+    B, H, I - беззнаковые целые 1, 2 и 4 байта, D - дата.
+    """
+
+    kind = None
+    fields = ()
+
+    def __init_subclass__(cls, kind, fields=(), **kwargs):
+        super().__init_subclass__(**kwargs)
+        if len(kind) != 1 or kind in _KINDS:
+            raise ValueError(f"Callback kind must be a unique character: {kind!r}")
+        cls.kind = kind
+        cls.fields = tuple(name for name, _ in fields)
+        cls._struct = struct.Struct('>' + ''.join(_FIELD_CODES[code][0] for _, code in fields))
+        cls._encoders = tuple(_FIELD_CODES[code][1] for _, code in fields)
+        cls._decoders = tuple(_FIELD_CODES[code][2] for _, code in fields)
+        cls._plain = not any(cls._decoders)
+        _KINDS[kind] = cls
+
+    def __init__(self, **values):
+        for name in self.fields:
+            setattr(self, name, values[name])
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.fields)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.fields)
+        return f"{type(self).__name__}({values})"
+
+    def pack(self):
+        raw = [
+            encode(getattr(self, name)) if encode else getattr(self, name)
+            for name, encode in zip(self.fields, self._encoders)
+        ]
+        payload = binascii.b2a_base64(self._struct.pack(*raw), newline=False).decode('ascii')
+        payload = payload.rstrip('=').replace('+', '-').replace('/', '_')
+        return f"{CALLBACK_MARK}{CALLBACK_VERSION}{self.kind}{payload}"
+
+    @classmethod
+    def _unpack(cls, payload):
+        payload = payload.replace('-', '+').replace('_', '/') + _PADDING[len(payload) % 4]
+        values = cls._struct.unpack(binascii.a2b_base64(payload))
+        if not cls._plain:
+            values = [decode(value) if decode else value for decode, value in zip(cls._decoders, values)]
+        callback_data = cls.__new__(cls)
+        callback_data.__dict__ = dict(zip(cls.fields, values))
+        return callback_data
+
+
+def decode_callback(data):
+    """Разбирает данные кнопки; None - если это не компактный формат"""
+    if not data or data[0] != CALLBACK_MARK:
+        return None
+    if len(data) < 3 or data[1] != CALLBACK_VERSION:
+        raise StaleCallbackError(data)
+    cls = _KINDS.get(data[2])
+    if cls is None:
+        raise StaleCallbackError(data)
+    try:
+        return cls._unpack(data[3:])
+    except (ValueError, struct.error, binascii.Error) as e:
+        raise StaleCallbackError(data) from e
+
+
+class CallbackRouter:
+    """Маршрутизация компактных кнопок по символу вида
+
+    Метод dispatch регистрируется в диспетчере одним обработчиком: данные кнопки
+    разбираются один раз, обработчик выбирается по словарю, а не перебором
+    фильтров. Обработчик получает разобранные данные в аргументе callback_data
+    и остальные аргументы (state, db и т.п.) так же, как от aiogram.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._signatures = {}
+        self.stale = 0
+
+    def register(self, callback_cls, handler):
+        if callback_cls in self._handlers:
+            raise ValueError(f"Handler for {callback_cls.__name__} is already registered")
+        self._handlers[callback_cls] = handler
+        parameters = inspect.signature(handler).parameters.values()
+        if any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters):
+            self._signatures[handler] = None
+        else:
+            self._signatures[handler] = frozenset(parameter.name for parameter in parameters)
+
+    def _decode(self, data):
+        try:
+            callback_data = decode_callback(data)
+        except StaleCallbackError:
+            callback_data = None
+        return callback_data, self._handlers.get(type(callback_data))
+
+    def resolve(self, data):
+        """Обработчик для данных кнопки или None (кнопка устарела)"""
+        return self._decode(data)[1]
+
+    async def dispatch(self, callback, **kwargs):
+        callback_data, handler = self._decode(callback.data)
+
+        if handler is None:
+            self.stale += 1
+            logger.info(f"Stale callback data from user {callback.from_user.id}: {callback.data!r}")
+            await callback.answer("⚠️ Кнопка устарела. Откройте меню заново: /start", show_alert=True)
+            return
+
+        kwargs['callback_data'] = callback_data
+        accepted = self._signatures[handler]
+        if accepted is not None:
+            kwargs = {name: value for name, value in kwargs.items() if name in accepted}
+        return await handler(callback, **kwargs)
+
+
+class BookingWeek(CompactCallback, kind="w", fields=(("offset", "B"),)):
+    pass
+
+
+class BookingDate(CompactCallback, kind="d", fields=(("day", "D"),)):
+    pass
+
+
+class BookingType(CompactCallback, kind="t", fields=(("type_id", "B"),)):
+    pass
+
+
+class BookingTime(CompactCallback, kind="h", fields=(("hour", "B"),)):
+    pass
+
+
+class BookingDuration(CompactCallback, kind="l", fields=(("hours", "B"),)):
+    pass
+
+
+class BookingBack(CompactCallback, kind="b", fields=(("step", "B"),)):
+    pass
+
+
+class WaitlistJoin(CompactCallback, kind="q", fields=(("hours", "B"),)):
+    pass
+
+
+class RecurringType(CompactCallback, kind="r", fields=(("type_id", "B"),)):
+    pass
+
+
+class RecurringWeekday(CompactCallback, kind="y", fields=(("weekday", "B"),)):
+    pass
+
+
+class RecurringTime(CompactCallback, kind="k", fields=(("hour", "B"),)):
+    pass
+
+
+class RecurringDuration(CompactCallback, kind="n", fields=(("hours", "B"),)):
+    pass
+
+
+class FilterWeek(CompactCallback, kind="W", fields=(("offset", "B"),)):
+    pass
+
+
+class FilterDate(CompactCallback, kind="D", fields=(("day", "D"),)):
+    pass
+
+
+class FilterType(CompactCallback, kind="T", fields=(("type_id", "B"),)):
+    pass
+
+
+class CancelBooking(CompactCallback, kind="c", fields=(("booking_id", "I"),)):
+    pass
@@ -0,0 +1,61 @@
+from datetime import time
+
+# Проверка вместимости по пиковой одновременной занятости.
+# Интервалы полуоткрытые [начало, конец): бронь до 19:00 и бронь с 19:00
+# одновременно не занимают место. Время - datetime.time в пределах одного дня.
+
+
+def peak_concurrency(intervals, start, end):
+    """Максимум одновременно активных интервалов внутри [start, end) (sweep-line)"""
+    events = []
+    for interval_start, interval_end in intervals:
+        interval_start = max(interval_start, start)
+        interval_end = min(interval_end, end)
+        if interval_start < interval_end:
+            events.append((interval_start, 1))
+            events.append((interval_end, -1))
+
+    # При равном времени -1 идет раньше +1: закончившаяся бронь освобождает место
+    events.sort()
+    running = peak = 0
+    for _, delta in events:
+        running += delta
+        if running > peak:
+            peak = running
+    return peak
+
+
+def hourly_headroom(intervals, capacity, start_hour, end_hour):
+    """{час: свободных мест} для часов [start_hour, end_hour) по пиковой занятости внутри часа"""
+    intervals = list(intervals)
+    return {
+        hour: max(0, capacity - peak_concurrency(intervals, time(hour), _hour_end(hour)))
+        for hour in range(start_hour, end_hour)
+    }
+
+
+def check_capacity(bookings, capacity, start_time, end_time):
+    """Проверяет, есть ли место для брони [start_time, end_time)
+
+    bookings - пересекающиеся активные брони того же типа (словари или записи
+    с ключами start_time и end_time), capacity - BOOKING_CAPACITY для типа
+    (None - без ограничения). Возвращает словарь fits, peak, capacity и
+    headroom ({час: свободных мест} в пределах запрошенного интервала).
+    """
+    intervals = [(booking['start_time'], booking['end_time']) for booking in bookings]
+    peak = peak_concurrency(intervals, start_time, end_time)
+    if capacity is None:
+        return {'fits': True, 'peak': peak, 'capacity': None, 'headroom': {}}
+
+    end_hour = end_time.hour + (1 if end_time.minute or end_time.second else 0)
+    return {
+        'fits': peak < capacity,
+        'peak': peak,
+        'capacity': capacity,
+        'headroom': hourly_headroom(intervals, capacity, start_time.hour, end_hour)
+    }
+
+
+def _hour_end(hour):
+    # Конец последнего часа суток - максимальное время дня
+    return time(hour + 1) if hour < 23 else time.max
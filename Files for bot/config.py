@@ -0,0 +1,29 @@
+import os
+from aiogram import Bot
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+
+if not BOT_TOKEN:
+    raise ValueError("BOT_TOKEN environment variable is not set")
+
+bot = Bot(token=BOT_TOKEN)
+
+BOOKING_TYPES = [
+    "Лекторий",
+    "Плейстейшн",
+    "Компьютеры"
+]
+
+# Максимальное число одновременных бронирований по типу (нет в словаре - без ограничения)
+BOOKING_CAPACITY = {
+    "Компьютеры": 16
+}
+
+# Активности, к которым можно присоединиться при пересечении по времени
+JOINABLE_ACTIVITIES = [
+    "Лекторий",
+    "Плейстейшн"
+]
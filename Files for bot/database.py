@@ -1,27 +1,72 @@
+import asyncio
 import asyncpg
 from datetime import datetime, timedelta, time
 import logging
 import os
 from dotenv import load_dotenv
 
+from user_cache import UserCache, USER_CACHE_CHANNEL
+from capacity import peak_concurrency
+from booking_index import BookingIndex, BOOKING_CHANNEL, parse_notification
+
 # Загружаем переменные окружения
 load_dotenv()
 
 # Получаем DATABASE_URL из переменных окружения
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Параметры пула соединений (один пул на весь процесс)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100'))
+DB_MAX_QUERIES = int(os.getenv('DB_MAX_QUERIES', '50000'))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv('DB_MAX_INACTIVE_CONNECTION_LIFETIME', '300'))
+# Пауза перед переподключением соединения LISTEN после обрыва
+DB_LISTEN_RECONNECT_DELAY = float(os.getenv('DB_LISTEN_RECONNECT_DELAY', '5'))
+
 logger = logging.getLogger(__name__)
 
 
+def _notification_handler(callback):
+    """Обработчик asyncpg для callback(payload): ошибки подписчика не рвут соединение"""
+    def handler(connection, pid, channel, payload):
+        try:
+            callback(payload)
+        except Exception as e:
+            logger.error(f"Error in notification listener for '{channel}': {e}")
+    return handler
+
+
 class Database:
     def __init__(self):
         self.pool = None
         self.database_url = DATABASE_URL
+        self._pool_lock = asyncio.Lock()
+        self.user_cache = UserCache()
+        self._listeners = []
+        # Индекс активных броней обновляется теми же событиями, что и остальные подписчики
+        self.booking_index = BookingIndex()
+        self.add_listener(self.booking_index.on_booking_event)
+        self._subscriptions = []
+        self._notify_connection = None
+        # Изменения профилей на других экземплярах сбрасывают локальный кэш пользователей
+        self.subscribe(USER_CACHE_CHANNEL, self._on_user_notification,
+                       on_connect=self._reset_user_cache, on_disconnect=self.user_cache.clear_local)
 
     async def create_pool(self):
         try:
-            self.pool = await asyncpg.create_pool(self.database_url)
-            logger.info("Database connection pool created successfully")
+            self.pool = await asyncpg.create_pool(
+                self.database_url,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                max_queries=DB_MAX_QUERIES,
+                max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONNECTION_LIFETIME
+            )
+            logger.info(
+                f"Database connection pool created successfully "
+                f"(min_size={DB_POOL_MIN_SIZE}, max_size={DB_POOL_MAX_SIZE})"
+            )
         except Exception as e:
             logger.error(f"Error creating database pool: {e}")
             raise
@@ -29,24 +74,136 @@ class Database:
     async def ensure_pool(self):
         """Убедиться, что пул соединений создан"""
         if self.pool is None:
-            await self.create_pool()
+            async with self._pool_lock:
+                if self.pool is None:
+                    await self.create_pool()
+
+    async def close(self):
+        """Закрыть пул соединений"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Database connection pool closed")
+        if self._notify_connection is not None:
+            await self._notify_connection.close()
+            self._notify_connection = None
+        await self.user_cache.close()
+
+    def add_listener(self, listener):
+        """Подписывает listener(event, booking) на события 'added', 'cancelled' и 'expired'"""
+        self._listeners.append(listener)
+
+    def _emit(self, event, booking):
+        for listener in self._listeners:
+            try:
+                listener(event, booking)
+            except Exception as e:
+                logger.error(f"Error in booking listener for '{event}': {e}")
+
+    async def load_booking_index(self):
+        """Загружает все активные брони в индекс в памяти"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            bookings = await connection.fetch('''
+                SELECT b.*, u.full_name
+                FROM bookings b
+                JOIN users u ON b.user_id = u.user_id
+                WHERE b.status = 'active'
+            ''')
+        self.booking_index.load(bookings)
+
+    def subscribe(self, channel, callback, on_connect=None, on_disconnect=None):
+        """Подписывает callback(payload) на канал LISTEN/NOTIFY (см. listen_notifications)
+
+        on_connect - корутина, вызывается после каждой подписки, в том числе после
+        переподключения, когда уведомления за время обрыва потеряны; on_disconnect -
+        при обрыве соединения.
+        """
+        self._subscriptions.append((channel, callback, on_connect, on_disconnect))
+
+    def enable_booking_index(self):
+        """Чтения броней - из индекса в памяти; загрузка и чужие изменения - через LISTEN/NOTIFY"""
+        self.subscribe(BOOKING_CHANNEL, self._on_booking_notification,
+                       on_connect=self.load_booking_index, on_disconnect=self.booking_index.suspend)
+
+    async def listen_notifications(self, reconnect_delay=DB_LISTEN_RECONNECT_DELAY):
+        """Фоновая задача: одно соединение LISTEN на все подписки subscribe
+
+        Подписка оформляется до on_connect (загрузки состояния), чтобы не потерять
+        изменения между ними.
+        """
+        while True:
+            closed = asyncio.Event()
+            try:
+                self._notify_connection = await asyncpg.connect(self.database_url)
+                self._notify_connection.add_termination_listener(lambda connection: closed.set())
+                for channel, callback, _, _ in self._subscriptions:
+                    await self._notify_connection.add_listener(channel, _notification_handler(callback))
+                for _, _, on_connect, _ in self._subscriptions:
+                    if on_connect is not None:
+                        await on_connect()
+                await closed.wait()
+                logger.warning("Notifications connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in notifications listener: {e}")
+            finally:
+                for _, _, _, on_disconnect in self._subscriptions:
+                    if on_disconnect is not None:
+                        on_disconnect()
+                if self._notify_connection is not None and not self._notify_connection.is_closed():
+                    await self._notify_connection.close()
+                self._notify_connection = None
+            await asyncio.sleep(reconnect_delay)
+
+    def _on_booking_notification(self, payload):
+        """Изменение брони из триггера: свои изменения уже в индексе, чужие рассылаются подписчикам"""
+        try:
+            event, booking = parse_notification(payload)
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid booking notification {payload!r}: {e}")
+            return
+        if event is None or self.booking_index.contains(booking['id']) == (event == 'added'):
+            return
+        self.booking_index.remote_updates += 1
+        self._emit(event, booking)
+
+    def _on_user_notification(self, payload):
+        try:
+            user_id = int(payload)
+        except ValueError:
+            logger.error(f"Invalid user cache notification {payload!r}")
+            return
+        self.user_cache.evict_local(user_id)
+
+    async def _reset_user_cache(self):
+        # Пока соединения LISTEN не было, уведомления терялись
+        self.user_cache.clear_local()
 
     def get_current_date(self):
         """Получить текущую дату"""
         return datetime.now().date()
 
     async def get_user(self, user_id):
-        """Получить пользователя по ID"""
+        """Получить пользователя по ID (через кэш пользователей)"""
+        user = await self.user_cache.get(user_id)
+        if user is not None:
+            return user
+
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
             user = await connection.fetchrow('SELECT * FROM users WHERE user_id = $1', user_id)
-            logger.info(f"Database.get_user: user_id={user_id}, found={user is not None}")
+            logger.debug(f"Database.get_user: user_id={user_id}, found={user is not None}")
             if user:
-                logger.info(f"User data: {dict(user)}")
+                user = dict(user)
+                await self.user_cache.set(user_id, user)
             return user
 
     async def get_bookings_by_date_and_type(self, booking_date, booking_type=None):
         """Получить бронирования по дате и типу (если тип не указан - все типы)"""
+        if self.booking_index.ready:
+            return self.booking_index.get_bookings_by_date_and_type(booking_date, booking_type)
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
             if booking_type and booking_type != "all":
@@ -74,8 +231,15 @@ class Database:
                 INSERT INTO users (user_id, full_name, phone, is_student)
                 VALUES ($1, $2, $3, $4)
                 ON CONFLICT (user_id) DO UPDATE SET
-                full_name = $2, phone = $3, is_student = $4
+                full_name = $2, phone = $3, is_student = $4, is_active = TRUE
             ''', user_id, full_name, phone, is_student)
+            await self._invalidate_user(connection, user_id)
+        self.booking_index.set_name(user_id, full_name)
+
+    async def _invalidate_user(self, connection, user_id):
+        """Сбрасывает пользователя в кэше этого и (через NOTIFY) остальных экземпляров"""
+        await connection.execute('SELECT pg_notify($1, $2)', USER_CACHE_CHANNEL, str(user_id))
+        await self.user_cache.invalidate(user_id)
 
     async def add_booking(self, user_id, booking_type, booking_date, start_time, end_time):
         """Добавляет бронирование - используем объекты времени напрямую"""
@@ -83,24 +247,108 @@ class Database:
         async with self.pool.acquire() as connection:
             try:
                 logger.info(f"Adding booking: {user_id}, {booking_type}, {booking_date}, {start_time}, {end_time}")
-                booking_id = await connection.fetchval('''
+                row = await connection.fetchrow('''
                     INSERT INTO bookings (user_id, booking_type, booking_date, start_time, end_time)
                     VALUES ($1, $2, $3, $4, $5)
-                    RETURNING id
+                    RETURNING id, (SELECT full_name FROM users WHERE user_id = $1) AS full_name
                 ''', user_id, booking_type, booking_date, start_time, end_time)
+                booking_id = row['id']
                 logger.info(f"Booking added successfully with ID: {booking_id}")
-                return booking_id
             except Exception as e:
                 logger.error(f"Error in add_booking: {e}")
                 raise
 
+        self._emit('added', {
+            'id': booking_id, 'user_id': user_id, 'booking_type': booking_type,
+            'booking_date': booking_date, 'start_time': start_time, 'end_time': end_time,
+            'full_name': row['full_name']
+        })
+        return booking_id
+
+    async def reserve_booking(self, user_id, booking_type, booking_date, start_time, end_time, capacity=None):
+        """Атомарно проверяет вместимость, создает бронирование и возвращает участников
+
+        Бронирования одного типа на одну дату сериализуются advisory-блокировкой,
+        поэтому два параллельных запроса не могут вместе превысить capacity.
+        Занятость - пиковое число одновременных броней внутри запрошенного
+        интервала (sweep-line по началам и концам), а не число пересечений:
+        брони 18-19 и 20-21 не мешают друг другу в окне 18-21.
+        Возвращает словарь с ключами booking_id (None, если бронь не создана),
+        occupied, duplicate и participants.
+        """
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext($1), $2::date - DATE '2000-01-01')",
+                    booking_type, booking_date
+                )
+                row = await connection.fetchrow('''
+                    WITH overlapping AS (
+                        SELECT b.user_id, u.full_name,
+                               b.slot * tsrange($3::date + $4::time, $3::date + $5::time, '[)') AS part
+                        FROM bookings b
+                        JOIN users u ON b.user_id = u.user_id
+                        WHERE b.booking_type = $2
+                        AND b.status = 'active'
+                        AND b.slot && tsrange($3::date + $4::time, $3::date + $5::time, '[)')
+                    ),
+                    events AS (
+                        SELECT lower(part) AS at, 1 AS delta FROM overlapping
+                        UNION ALL
+                        SELECT upper(part), -1 FROM overlapping
+                    ),
+                    peak AS (
+                        -- Концы раньше начал в одной точке: интервалы полуоткрытые
+                        SELECT COALESCE(MAX(running), 0) AS occupied
+                        FROM (
+                            SELECT SUM(delta) OVER (ORDER BY at, delta ROWS UNBOUNDED PRECEDING) AS running
+                            FROM events
+                        ) AS sweep
+                    ),
+                    duplicate AS (
+                        SELECT 1 FROM bookings
+                        WHERE user_id = $1 AND booking_type = $2 AND booking_date = $3 AND status = 'active'
+                    ),
+                    inserted AS (
+                        INSERT INTO bookings (user_id, booking_type, booking_date, start_time, end_time)
+                        SELECT $1, $2, $3, $4, $5
+                        WHERE NOT EXISTS (SELECT 1 FROM duplicate)
+                        AND ($6::int IS NULL OR (SELECT occupied FROM peak) < $6::int)
+                        RETURNING id
+                    )
+                    SELECT
+                        (SELECT id FROM inserted) AS booking_id,
+                        (SELECT occupied FROM peak) AS occupied,
+                        EXISTS (SELECT 1 FROM duplicate) AS duplicate,
+                        ARRAY(SELECT full_name FROM overlapping WHERE user_id <> $1) AS participants,
+                        (SELECT full_name FROM users WHERE user_id = $1) AS full_name
+                ''', user_id, booking_type, booking_date, start_time, end_time, capacity)
+
+        result = dict(row)
+        full_name = result.pop('full_name')
+        if result['booking_id'] is not None:
+            self._emit('added', {
+                'id': result['booking_id'], 'user_id': user_id, 'booking_type': booking_type,
+                'booking_date': booking_date, 'start_time': start_time, 'end_time': end_time,
+                'full_name': full_name
+            })
+        logger.info(
+            f"Reserve {booking_type} {booking_date} {start_time}-{end_time} for {user_id}: "
+            f"booking_id={result['booking_id']}, occupied={result['occupied']}, capacity={capacity}"
+        )
+        return result
+
     async def get_user_bookings(self, user_id, active_only=True):
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
             if active_only:
+                # Фильтр по времени окончания: брони, которые уже закончились, но еще
+                # не переведены планировщиком в expired, не показываются
                 return await connection.fetch('''
                     SELECT * FROM bookings 
                     WHERE user_id = $1 AND status = 'active' AND booking_date >= CURRENT_DATE
+                    AND upper(slot) > LOCALTIMESTAMP
                     ORDER BY booking_date, start_time
                 ''', user_id)
             else:
@@ -118,36 +366,56 @@ class Database:
                 FROM bookings b
                 JOIN users u ON b.user_id = u.user_id
                 WHERE b.status = 'active' AND b.booking_date >= CURRENT_DATE
+                AND upper(b.slot) > LOCALTIMESTAMP
                 ORDER BY b.booking_date, b.start_time
             ''')
 
-    async def get_all_users(self):
-        """Получить всех пользователей"""
+    async def export_users_csv(self, path):
+        """Выгружает пользователей в CSV-файл через COPY (память не зависит от размера таблицы)"""
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
-            return await connection.fetch('''
-                SELECT * FROM users ORDER BY created_at DESC
-            ''')
+            return await connection.copy_from_query('''
+                SELECT user_id, full_name, phone, is_student, created_at
+                FROM users
+                ORDER BY created_at DESC, user_id DESC
+            ''', output=path, format='csv', header=True)
 
-    async def get_all_bookings(self):
-        """Получить все бронирования"""
+    async def export_bookings_csv(self, path):
+        """Выгружает бронирования в CSV-файл через COPY (память не зависит от размера таблицы)"""
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
-            return await connection.fetch('''
-                SELECT b.*, u.full_name 
+            return await connection.copy_from_query('''
+                SELECT b.id, b.user_id, u.full_name, b.booking_type, b.booking_date,
+                       b.start_time, b.end_time, b.status, b.created_at
                 FROM bookings b
                 LEFT JOIN users u ON b.user_id = u.user_id
-                ORDER BY b.created_at DESC
+                ORDER BY b.created_at DESC, b.id DESC
+            ''', output=path, format='csv', header=True)
+
+    async def get_stats(self):
+        """Сводная статистика для администратора одним запросом"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            return await connection.fetchrow('''
+                SELECT
+                    (SELECT COUNT(*) FROM users) AS users,
+                    (SELECT COUNT(*) FROM bookings) AS bookings,
+                    (SELECT COUNT(*) FROM bookings WHERE status = 'active') AS active_bookings
             ''')
 
     async def cancel_booking(self, booking_id, user_id):
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
-            result = await connection.execute('''
+            booking = await connection.fetchrow('''
                 UPDATE bookings SET status = 'cancelled'
                 WHERE id = $1 AND user_id = $2 AND status = 'active'
+                RETURNING id, user_id, booking_type, booking_date, start_time, end_time
             ''', booking_id, user_id)
-            return result != 'UPDATE 0'
+
+        if booking is None:
+            return False
+        self._emit('cancelled', dict(booking))
+        return True
 
     async def get_booking_by_id(self, booking_id):
         await self.ensure_pool()
@@ -161,6 +429,8 @@ class Database:
 
     async def has_booking_type_on_date(self, user_id, booking_type, date):
         """Проверяет, есть ли у пользователя бронь данного типа на указанную дату"""
+        if self.booking_index.ready:
+            return self.booking_index.has_booking_type_on_date(user_id, booking_type, date)
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
             booking = await connection.fetchrow('''
@@ -173,35 +443,85 @@ class Database:
             return booking is not None
 
     async def cleanup_expired_bookings(self):
-        """Очищает просроченные бронирования"""
+        """Переводит в expired только брони, время окончания которых уже прошло
+
+        Возвращает количество обновленных строк.
+        """
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
-            result = await connection.execute('''
+            expired = await connection.fetch('''
                 UPDATE bookings 
                 SET status = 'expired' 
-                WHERE (booking_date < CURRENT_DATE 
-                OR (booking_date = CURRENT_DATE AND end_time < CURRENT_TIME))
-                AND status = 'active'
+                WHERE status = 'active' AND upper(slot) <= LOCALTIMESTAMP
+                RETURNING id, user_id, booking_type, booking_date, start_time, end_time
             ''')
-            logger.info(f"Expired bookings cleanup completed: {result}")
-            return result
 
-    async def get_user_active_booking_types_for_week(self, user_id, week_start_date):
-        """Получает типы бронирований пользователя на указанную неделю"""
+        for booking in expired:
+            self._emit('expired', dict(booking))
+        logger.info(f"Expired bookings cleanup completed: {len(expired)} rows")
+        return len(expired)
+
+    async def get_seconds_until_next_expiry(self):
+        """Сколько секунд осталось до окончания ближайшей активной брони (None, если броней нет)"""
         await self.ensure_pool()
-        week_end_date = week_start_date + timedelta(days=6)
+        async with self.pool.acquire() as connection:
+            return await connection.fetchval('''
+                SELECT EXTRACT(EPOCH FROM MIN(upper(slot)) - LOCALTIMESTAMP)::float
+                FROM bookings
+                WHERE status = 'active'
+            ''')
 
+    async def claim_due_reminders(self, lead_minutes, limit):
+        """Отмечает и возвращает брони, начинающиеся в ближайшие lead_minutes минут
+
+        Отметка reminder_sent_at ставится до отправки одним запросом (SKIP LOCKED
+        для нескольких экземпляров бота): после перезапуска напоминание не
+        уходит повторно.
+        """
+        await self.ensure_pool()
         async with self.pool.acquire() as connection:
             return await connection.fetch('''
-                SELECT DISTINCT booking_type, booking_date
+                UPDATE bookings b
+                SET reminder_sent_at = LOCALTIMESTAMP
+                FROM (
+                    SELECT id FROM bookings
+                    WHERE status = 'active' AND reminder_sent_at IS NULL
+                    AND lower(slot) > LOCALTIMESTAMP
+                    AND lower(slot) <= LOCALTIMESTAMP + $1 * INTERVAL '1 minute'
+                    ORDER BY lower(slot)
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE b.id = due.id
+                RETURNING b.id, b.user_id, b.booking_type, b.booking_date, b.start_time, b.end_time
+            ''', lead_minutes, limit)
+
+    async def get_user_booking_types(self, user_id, date_from, date_to=None):
+        """Возвращает типы активных бронирований пользователя по датам за период одним запросом"""
+        await self.ensure_pool()
+        if date_to is None:
+            date_to = date_from
+
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch('''
+                SELECT booking_date, array_agg(DISTINCT booking_type) AS booking_types
                 FROM bookings 
                 WHERE user_id = $1 
                 AND booking_date BETWEEN $2 AND $3
                 AND status = 'active'
-            ''', user_id, week_start_date, week_end_date)
+                GROUP BY booking_date
+            ''', user_id, date_from, date_to)
+            return {row['booking_date']: set(row['booking_types']) for row in rows}
+
+    async def get_user_active_booking_types_for_week(self, user_id, week_start_date):
+        """Получает типы бронирований пользователя на указанную неделю ({дата: {типы}})"""
+        week_end_date = week_start_date + timedelta(days=6)
+        return await self.get_user_booking_types(user_id, week_start_date, week_end_date)
 
     async def get_conflicting_bookings(self, booking_date, start_time, end_time, booking_type):
         """Проверяет пересекающиеся бронирования на указанное время для конкретного типа"""
+        if self.booking_index.ready:
+            return self.booking_index.get_conflicting_bookings(booking_date, start_time, end_time, booking_type)
         await self.ensure_pool()
         async with self.pool.acquire() as connection:
             logger.info(f"Checking conflicts for {booking_type} on {booking_date} from {start_time} to {end_time}")
@@ -212,15 +532,9 @@ class Database:
                     SELECT b.*, u.full_name 
                     FROM bookings b
                     JOIN users u ON b.user_id = u.user_id
-                    WHERE b.booking_date = $1 
-                    AND b.booking_type = $2
+                    WHERE b.booking_type = $2
                     AND b.status = 'active'
-                    AND (
-                        (b.start_time < $4 AND b.end_time > $3) OR
-                        (b.start_time >= $3 AND b.start_time < $4) OR
-                        (b.end_time > $3 AND b.end_time <= $4) OR
-                        (b.start_time <= $3 AND b.end_time >= $4)
-                    )
+                    AND b.slot && tsrange($1::date + $3::time, $1::date + $4::time, '[)')
                 ''', booking_date, booking_type, start_time, end_time)
 
                 logger.info(f"Found {len(result)} conflicting bookings")
@@ -230,6 +544,27 @@ class Database:
                 logger.error(f"Error in get_conflicting_bookings: {e}")
                 return []
 
+    async def get_hourly_occupancy(self, booking_date, booking_type, start_hour, end_hour):
+        """Число активных броней типа в каждом часе [start_hour, end_hour) даты ({час: число})"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            # Один запрос на всю сетку: каждый час - отдельный поиск по GiST-индексу (тип, slot)
+            rows = await connection.fetch('''
+                SELECT h.hour, COUNT(b.id) AS occupied
+                FROM generate_series($3::int, $4::int - 1) AS h(hour)
+                LEFT JOIN bookings b
+                    ON b.booking_type = $2
+                    AND b.status = 'active'
+                    AND b.slot && tsrange(
+                        $1::date + h.hour * INTERVAL '1 hour',
+                        $1::date + (h.hour + 1) * INTERVAL '1 hour',
+                        '[)'
+                    )
+                GROUP BY h.hour
+                ORDER BY h.hour
+            ''', booking_date, booking_type, start_hour, end_hour)
+        return {row['hour']: row['occupied'] for row in rows}
+
     async def get_booking_count_by_type_time(self, booking_date, start_time, end_time, booking_type):
         """Получает количество активных бронирований определенного типа в указанный промежуток времени"""
         await self.ensure_pool()
@@ -239,16 +574,337 @@ class Database:
                 return await connection.fetchval('''
                     SELECT COUNT(*) 
                     FROM bookings 
-                    WHERE booking_date = $1 
-                    AND booking_type = $2
+                    WHERE booking_type = $2
                     AND status = 'active'
-                    AND (
-                        (start_time < $4 AND end_time > $3) OR
-                        (start_time >= $3 AND start_time < $4) OR
-                        (end_time > $3 AND end_time <= $4) OR
-                        (start_time <= $3 AND end_time >= $4)
-                    )
+                    AND slot && tsrange($1::date + $3::time, $1::date + $4::time, '[)')
                 ''', booking_date, booking_type, start_time, end_time)
             except Exception as e:
                 logger.error(f"Error in get_booking_count_by_type_time: {e}")
-                return 0
\ No newline at end of file
+                return 0
+
+    async def add_to_waitlist(self, user_id, booking_type, booking_date, start_time, end_time):
+        """Ставит пользователя в лист ожидания; возвращает позицию в очереди на этот час
+
+        None - у пользователя уже есть заявка на этот тип и дату.
+        """
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            waitlist_id = await connection.fetchval('''
+                INSERT INTO waitlist (user_id, booking_type, booking_date, start_time, end_time)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (user_id, booking_date, booking_type) WHERE status = 'waiting' DO NOTHING
+                RETURNING id
+            ''', user_id, booking_type, booking_date, start_time, end_time)
+            if waitlist_id is None:
+                return None
+            return await connection.fetchval('''
+                SELECT COUNT(*) FROM waitlist
+                WHERE booking_date = $1 AND booking_type = $2 AND start_time = $3
+                AND status = 'waiting' AND id <= $4
+            ''', booking_date, booking_type, start_time, waitlist_id)
+
+    async def get_waitlist_slots(self):
+        """Пары (дата, тип), для которых есть ожидающие заявки"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch('''
+                SELECT DISTINCT booking_date, booking_type FROM waitlist WHERE status = 'waiting'
+            ''')
+        return [(row['booking_date'], row['booking_type']) for row in rows]
+
+    async def promote_waitlist(self, booking_date, booking_type, capacity=None):
+        """Переводит заявки листа ожидания в брони, пока хватает мест, одной транзакцией
+
+        Заявки рассматриваются по порядку поступления; каждая проверяется по
+        пиковой занятости с учетом уже продвинутых в этом проходе. Брони
+        вставляются одним запросом. Возвращает список созданных броней.
+        """
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                # Та же блокировка, что и в reserve_booking
+                await connection.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext($1), $2::date - DATE '2000-01-01')",
+                    booking_type, booking_date
+                )
+                await connection.execute('''
+                    UPDATE waitlist SET status = 'expired'
+                    WHERE booking_date = $1 AND booking_type = $2 AND status = 'waiting'
+                    AND booking_date + start_time <= LOCALTIMESTAMP
+                ''', booking_date, booking_type)
+                waiting = await connection.fetch('''
+                    SELECT id, user_id, start_time, end_time FROM waitlist
+                    WHERE booking_date = $1 AND booking_type = $2 AND status = 'waiting'
+                    ORDER BY id
+                ''', booking_date, booking_type)
+                if not waiting:
+                    return []
+
+                active = await connection.fetch('''
+                    SELECT user_id, start_time, end_time FROM bookings
+                    WHERE booking_date = $1 AND booking_type = $2 AND status = 'active'
+                ''', booking_date, booking_type)
+                intervals = [(booking['start_time'], booking['end_time']) for booking in active]
+                booked_users = {booking['user_id'] for booking in active}
+
+                promoted = []
+                dropped = []
+                for entry in waiting:
+                    if entry['user_id'] in booked_users:
+                        # Пользователь уже забронировал этот тип на дату другим способом
+                        dropped.append(entry['id'])
+                        continue
+                    if capacity is not None and peak_concurrency(
+                            intervals, entry['start_time'], entry['end_time']) >= capacity:
+                        continue
+                    promoted.append(entry)
+                    intervals.append((entry['start_time'], entry['end_time']))
+                    booked_users.add(entry['user_id'])
+
+                if dropped:
+                    await connection.execute(
+                        "UPDATE waitlist SET status = 'cancelled' WHERE id = ANY($1::int[])", dropped
+                    )
+                if not promoted:
+                    return []
+
+                rows = await connection.fetch('''
+                    WITH promoted AS (
+                        SELECT * FROM unnest($3::int[], $4::bigint[], $5::time[], $6::time[])
+                            AS p(waitlist_id, user_id, start_time, end_time)
+                    ),
+                    inserted AS (
+                        INSERT INTO bookings (user_id, booking_type, booking_date, start_time, end_time)
+                        SELECT user_id, $2, $1, start_time, end_time FROM promoted
+                        RETURNING id, user_id
+                    )
+                    UPDATE waitlist w
+                    SET status = 'promoted', booking_id = i.id
+                    FROM inserted i
+                    JOIN promoted p ON p.user_id = i.user_id
+                    JOIN users u ON u.user_id = i.user_id
+                    WHERE w.id = p.waitlist_id
+                    RETURNING i.id, i.user_id, p.start_time, p.end_time, u.full_name
+                ''', booking_date, booking_type,
+                    [entry['id'] for entry in promoted],
+                    [entry['user_id'] for entry in promoted],
+                    [entry['start_time'] for entry in promoted],
+                    [entry['end_time'] for entry in promoted])
+
+        bookings = [
+            dict(row, booking_type=booking_type, booking_date=booking_date)
+            for row in rows
+        ]
+        for booking in bookings:
+            self._emit('added', booking)
+        logger.info(f"Waitlist {booking_type} {booking_date}: promoted {len(bookings)}, dropped {len(dropped)}")
+        return bookings
+
+    async def set_user_active(self, user_id):
+        """Снова включает пользователя в рассылки (он написал боту после блокировки)"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            result = await connection.execute(
+                'UPDATE users SET is_active = TRUE WHERE user_id = $1 AND NOT is_active', user_id
+            )
+            if result != 'UPDATE 0':
+                await self._invalidate_user(connection, user_id)
+
+    async def create_broadcast(self, text, parse_mode=None, created_by=None, lease_seconds=300):
+        """Создает рассылку, сразу арендованную этим экземпляром; возвращает строку рассылки"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            return await connection.fetchrow('''
+                INSERT INTO broadcasts (text, parse_mode, created_by, locked_until)
+                VALUES ($1, $2, $3, LOCALTIMESTAMP + $4 * INTERVAL '1 second')
+                RETURNING *
+            ''', text, parse_mode, created_by, lease_seconds)
+
+    async def claim_running_broadcasts(self, lease_seconds=300):
+        """Берет незавершенные рассылки, аренда которых истекла (экземпляр упал)"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            return await connection.fetch('''
+                UPDATE broadcasts
+                SET locked_until = LOCALTIMESTAMP + $1 * INTERVAL '1 second'
+                WHERE status = 'running' AND (locked_until IS NULL OR locked_until < LOCALTIMESTAMP)
+                RETURNING *
+            ''', lease_seconds)
+
+    async def release_broadcasts(self, broadcast_ids):
+        """Снимает аренду с незавершенных рассылок: их сразу подхватит другой экземпляр"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            await connection.execute('''
+                UPDATE broadcasts SET locked_until = NULL
+                WHERE id = ANY($1::int[]) AND status = 'running'
+            ''', broadcast_ids)
+
+    async def get_broadcast_recipients(self, after_user_id, limit):
+        """Следующая страница активных пользователей по курсору user_id"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch('''
+                SELECT user_id FROM users
+                WHERE is_active AND user_id > $1
+                ORDER BY user_id
+                LIMIT $2
+            ''', after_user_id, limit)
+        return [row['user_id'] for row in rows]
+
+    async def checkpoint_broadcast(self, broadcast_id, last_user_id, sent, failed, blocked_user_ids,
+                                   lease_seconds=300):
+        """Сохраняет курсор и счетчики страницы и отключает заблокировавших бота - одной транзакцией"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                if blocked_user_ids:
+                    await connection.execute(
+                        'UPDATE users SET is_active = FALSE WHERE user_id = ANY($1::bigint[])', blocked_user_ids
+                    )
+                    for user_id in blocked_user_ids:
+                        await self._invalidate_user(connection, user_id)
+                await connection.execute('''
+                    UPDATE broadcasts
+                    SET last_user_id = $2, sent = sent + $3, failed = failed + $4, blocked = blocked + $5,
+                        locked_until = LOCALTIMESTAMP + $6 * INTERVAL '1 second'
+                    WHERE id = $1
+                ''', broadcast_id, last_user_id, sent, failed, len(blocked_user_ids), lease_seconds)
+
+    async def finish_broadcast(self, broadcast_id, status='done'):
+        """Завершает рассылку; возвращает итоговую строку"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            return await connection.fetchrow('''
+                UPDATE broadcasts
+                SET status = $2, finished_at = LOCALTIMESTAMP, locked_until = NULL
+                WHERE id = $1 AND status = 'running'
+                RETURNING *
+            ''', broadcast_id, status)
+
+    async def get_setting(self, key, default=None):
+        """Значение общей настройки из bot_settings"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            value = await connection.fetchval('SELECT value FROM bot_settings WHERE key = $1', key)
+        return default if value is None else value
+
+    async def set_setting(self, key, value):
+        """Сохраняет общую настройку; триггер уведомляет остальные экземпляры"""
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            await connection.execute('''
+                INSERT INTO bot_settings (key, value) VALUES ($1, $2)
+                ON CONFLICT (key) DO UPDATE SET value = $2, updated_at = CURRENT_TIMESTAMP
+            ''', key, value)
+
+    async def reserve_recurring(self, user_id, booking_type, dates, start_time, end_time, capacity=None):
+        """Бронирует одно и то же время на несколько дат одной транзакцией
+
+        Конфликты всех дат проверяются одним запросом с теми же правилами, что и
+        reserve_booking: дубликат (у пользователя уже есть бронь этого типа на дату)
+        и пиковая занятость по sweep-line для типов с capacity. Подходящие даты
+        вставляются одним INSERT ... SELECT FROM unnest. Возвращает словарь
+        booked ({дата: booking_id}), conflicts ({дата: 'duplicate' | 'full'}) и
+        participants ({дата: имена других участников пересекающихся броней}).
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return {'booked': {}, 'conflicts': {}, 'participants': {}}
+
+        await self.ensure_pool()
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                # Блокировки reserve_booking на каждую дату; по возрастанию, чтобы не было взаимоблокировок
+                await connection.execute('''
+                    SELECT pg_advisory_xact_lock(hashtext($1), d - DATE '2000-01-01')
+                    FROM unnest($2::date[]) AS d
+                    ORDER BY d
+                ''', booking_type, dates)
+                rows = await connection.fetch('''
+                    WITH dates AS (
+                        SELECT unnest($3::date[]) AS booking_date
+                    ),
+                    overlapping AS (
+                        SELECT d.booking_date, b.user_id, u.full_name,
+                               b.slot * tsrange(d.booking_date + $4::time, d.booking_date + $5::time, '[)') AS part
+                        FROM dates d
+                        JOIN bookings b
+                            ON b.booking_type = $2
+                            AND b.status = 'active'
+                            AND b.slot && tsrange(d.booking_date + $4::time, d.booking_date + $5::time, '[)')
+                        JOIN users u ON b.user_id = u.user_id
+                    ),
+                    participants AS (
+                        SELECT booking_date,
+                               array_agg(DISTINCT full_name) FILTER (WHERE user_id <> $1) AS names
+                        FROM overlapping
+                        GROUP BY booking_date
+                    ),
+                    events AS (
+                        SELECT booking_date, lower(part) AS at, 1 AS delta FROM overlapping
+                        UNION ALL
+                        SELECT booking_date, upper(part), -1 FROM overlapping
+                    ),
+                    peaks AS (
+                        SELECT booking_date, MAX(running) AS occupied
+                        FROM (
+                            SELECT booking_date,
+                                   SUM(delta) OVER (
+                                       PARTITION BY booking_date ORDER BY at, delta ROWS UNBOUNDED PRECEDING
+                                   ) AS running
+                            FROM events
+                        ) AS sweep
+                        GROUP BY booking_date
+                    ),
+                    duplicates AS (
+                        SELECT DISTINCT booking_date FROM bookings
+                        WHERE user_id = $1 AND booking_type = $2 AND status = 'active'
+                        AND booking_date = ANY($3::date[])
+                    )
+                    SELECT d.booking_date,
+                           COALESCE(p.occupied, 0) AS occupied,
+                           dup.booking_date IS NOT NULL AS duplicate,
+                           pt.names AS participants
+                    FROM dates d
+                    LEFT JOIN peaks p ON p.booking_date = d.booking_date
+                    LEFT JOIN duplicates dup ON dup.booking_date = d.booking_date
+                    LEFT JOIN participants pt ON pt.booking_date = d.booking_date
+                ''', user_id, booking_type, dates, start_time, end_time)
+
+                conflicts = {}
+                for row in rows:
+                    if row['duplicate']:
+                        conflicts[row['booking_date']] = 'duplicate'
+                    elif capacity is not None and row['occupied'] >= capacity:
+                        conflicts[row['booking_date']] = 'full'
+                free_dates = [booking_date for booking_date in dates if booking_date not in conflicts]
+
+                inserted = []
+                if free_dates:
+                    inserted = await connection.fetch('''
+                        INSERT INTO bookings (user_id, booking_type, booking_date, start_time, end_time)
+                        SELECT $1, $2, d, $4, $5 FROM unnest($3::date[]) AS d
+                        RETURNING id, booking_date, (SELECT full_name FROM users WHERE user_id = $1) AS full_name
+                    ''', user_id, booking_type, free_dates, start_time, end_time)
+
+        for row in inserted:
+            self._emit('added', {
+                'id': row['id'], 'user_id': user_id, 'booking_type': booking_type,
+                'booking_date': row['booking_date'], 'start_time': start_time, 'end_time': end_time,
+                'full_name': row['full_name']
+            })
+        logger.info(
+            f"Recurring {booking_type} {start_time}-{end_time} for {user_id}: "
+            f"booked {len(inserted)}, conflicts {len(conflicts)}"
+        )
+        return {
+            'booked': {row['booking_date']: row['id'] for row in inserted},
+            'conflicts': conflicts,
+            # Для типов без capacity (Лекторий, Плейстейшн) пересечение - присоединение к другим
+            'participants': {
+                row['booking_date']: row['participants']
+                for row in rows
+                if row['participants'] and row['booking_date'] not in conflicts
+            }
+        }
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Максимальный интервал сна, если активных броней нет
+MAX_SLEEP_SECONDS = 3600
+
+
+class ExpiryScheduler:
+    """Переводит брони в expired в момент окончания ближайшей брони
+
+    Вместо ежечасного обхода всей таблицы планировщик спрашивает у базы время
+    окончания ближайшей активной брони и спит до него. Новая бронь, которая
+    заканчивается раньше запланированного пробуждения, будит планировщик
+    через Database.add_listener.
+    """
+
+    def __init__(self, db, max_sleep=MAX_SLEEP_SECONDS):
+        self.db = db
+        self.max_sleep = max_sleep
+        self._wakeup = asyncio.Event()
+        self._planned_at = None
+        self.runs = 0
+        self.total_expired = 0
+        self.last_expired = 0
+        self.last_duration = 0.0
+        db.add_listener(self.on_booking_event)
+
+    def on_booking_event(self, event, booking):
+        if event != 'added':
+            return
+        ends_at = datetime.combine(booking['booking_date'], booking['end_time'])
+        if self._planned_at is None or ends_at < self._planned_at:
+            self._wakeup.set()
+
+    async def run_once(self):
+        """Одна итерация: истекшие брони -> expired; возвращает задержку до следующей"""
+        started = time.perf_counter()
+        expired = await self.db.cleanup_expired_bookings()
+        self.last_duration = time.perf_counter() - started
+        self.last_expired = expired
+        self.total_expired += expired
+        self.runs += 1
+        if expired:
+            logger.info(f"Expiry run: {expired} bookings expired in {self.last_duration * 1000:.1f} ms")
+
+        seconds = await self.db.get_seconds_until_next_expiry()
+        if seconds is None:
+            return self.max_sleep
+        return min(max(seconds, 0.0), self.max_sleep)
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                delay = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in expiry scheduler: {e}")
+                delay = 60
+
+            self._planned_at = datetime.now() + timedelta(seconds=delay)
+            logger.debug(f"Next expiry check in {delay:.0f} s")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'total_expired': self.total_expired,
+            'last_expired': self.last_expired,
+            'last_duration': self.last_duration
+        }
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, time as dtime
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# memory - в памяти процесса (один экземпляр бота), redis или postgres - общее хранилище
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+# Через сколько секунд брошенный сценарий (бронирование, регистрация) удаляется
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', '86400'))
+REDIS_URL = os.getenv('REDIS_URL')
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    """Компактное представление date/time/datetime в JSON"""
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, dtime):
+        return {'$t': value.strftime('%H:%M') if not value.second else value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        if '$d' in obj:
+            return date.fromisoformat(obj['$d'])
+        if '$t' in obj:
+            return dtime.fromisoformat(obj['$t'])
+        if '$dt' in obj:
+            return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def fsm_json_dumps(data):
+    """Сериализация данных FSM (state.update_data хранит date и time)"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_encode)
+
+
+def fsm_json_loads(raw):
+    return json.loads(raw, object_hook=_decode)
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_storage через общий пул Database
+
+    Каждая запись живет ttl секунд с последнего изменения; просроченные
+    записи не читаются и периодически удаляются.
+    """
+
+    def __init__(self, db, ttl=FSM_STATE_TTL, purge_interval=600):
+        self.db = db
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        self._last_purge = time.monotonic()
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        await self._upsert(key, 'state', state)
+
+    async def get_state(self, key):
+        row = await self._fetch(key)
+        return row['state'] if row else None
+
+    async def set_data(self, key, data):
+        await self._upsert(key, 'data', fsm_json_dumps(data))
+
+    async def get_data(self, key):
+        row = await self._fetch(key)
+        if not row or not row['data']:
+            return {}
+        return fsm_json_loads(row['data'])
+
+    async def close(self):
+        # Пул принадлежит Database и закрывается вместе с ним
+        pass
+
+    async def _fetch(self, key):
+        await self.db.ensure_pool()
+        async with self.db.pool.acquire() as connection:
+            return await connection.fetchrow('''
+                SELECT state, data FROM fsm_storage
+                WHERE key = $1 AND expires_at > LOCALTIMESTAMP
+            ''', self.key_builder.build(key))
+
+    async def _upsert(self, key, column, value):
+        # Просроченная, но еще не удаленная запись не должна вернуть старое значение второго столбца
+        other = 'data' if column == 'state' else 'state'
+        await self.db.ensure_pool()
+        async with self.db.pool.acquire() as connection:
+            await connection.execute(f'''
+                INSERT INTO fsm_storage (key, {column}, expires_at)
+                VALUES ($1, $2, LOCALTIMESTAMP + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE SET
+                {column} = EXCLUDED.{column},
+                {other} = CASE WHEN fsm_storage.expires_at <= LOCALTIMESTAMP THEN NULL ELSE fsm_storage.{other} END,
+                expires_at = EXCLUDED.expires_at
+            ''', self.key_builder.build(key), value, float(self.ttl))
+            await self._purge_expired(connection)
+
+    async def _purge_expired(self, connection):
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = time.monotonic()
+        result = await connection.execute('DELETE FROM fsm_storage WHERE expires_at <= LOCALTIMESTAMP')
+        logger.info(f"Expired FSM records purged: {result}")
+
+
+def create_fsm_storage(db):
+    """Создает хранилище FSM по переменной окружения FSM_STORAGE"""
+    if FSM_STORAGE == 'redis':
+        if not REDIS_URL:
+            raise ValueError("FSM_STORAGE=redis requires REDIS_URL")
+        # Требует пакет redis
+        from aiogram.fsm.storage.redis import RedisStorage
+        logger.info("FSM storage: Redis")
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=FSM_STATE_TTL,
+            data_ttl=FSM_STATE_TTL,
+            json_dumps=fsm_json_dumps,
+            json_loads=fsm_json_loads
+        )
+
+    if FSM_STORAGE == 'postgres':
+        logger.info("FSM storage: PostgreSQL")
+        return PostgresStorage(db)
+
+    logger.info("FSM storage: memory")
+    return MemoryStorage()
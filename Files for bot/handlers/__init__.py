@@ -1,15 +1,25 @@
+from aiogram import F
+
+from callbacks import CallbackRouter, CALLBACK_MARK
 from .start import register_start_handlers
 from .registration import register_registration_handlers
 from .booking import register_booking_handlers
+from .recurring import register_recurring_handlers
 from .common import register_common_handlers
 from .profile import register_profile_handlers
 from .admin import register_admin_handlers
 from .view_bookings import register_view_bookings_handlers
 
 def register_all_handlers(dp):
+    # Все кнопки с параметрами проходят через один обработчик и выбираются по виду
+    callback_router = CallbackRouter()
+    dp["callback_router"] = callback_router
+    dp.callback_query.register(callback_router.dispatch, F.data.startswith(CALLBACK_MARK))
+
     register_start_handlers(dp)
     register_registration_handlers(dp)
     register_booking_handlers(dp)
+    register_recurring_handlers(dp)
     register_common_handlers(dp)
     register_profile_handlers(dp)
     register_admin_handlers(dp)
@@ -0,0 +1,201 @@
+from aiogram import Dispatcher, F
+from aiogram.types import CallbackQuery, FSInputFile, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from datetime import datetime
+import logging
+import os
+import tempfile
+
+from broadcast import BroadcastEngine
+from database import Database
+from keyboards import ADMINS, get_admin_keyboard, get_back_to_main_keyboard, get_broadcast_confirm_keyboard
+from maintenance import MaintenanceMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class AdminStates(StatesGroup):
+    waiting_for_broadcast_text = State()
+    waiting_for_broadcast_confirm = State()
+
+
+async def admin_panel(callback: CallbackQuery):
+    """Панель администратора"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    await callback.message.answer(
+        "⚙️ *Панель администратора*",
+        parse_mode="Markdown",
+        reply_markup=get_admin_keyboard()
+    )
+    await callback.answer()
+
+
+async def admin_stats(callback: CallbackQuery, db: Database):
+    """Сводная статистика"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    stats = await db.get_stats()
+    await callback.message.answer(
+        f"📊 *Статистика:*\n\n"
+        f"👥 Пользователей: {stats['users']}\n"
+        f"📋 Всего бронирований: {stats['bookings']}\n"
+        f"✅ Активных бронирований: {stats['active_bookings']}",
+        parse_mode="Markdown",
+        reply_markup=get_back_to_main_keyboard()
+    )
+    await callback.answer()
+
+
+async def send_csv_export(callback: CallbackQuery, export, filename, caption):
+    """Выгружает таблицу во временный CSV-файл и отправляет его документом"""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        await export(path)
+        await callback.message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=caption,
+            reply_markup=get_back_to_main_keyboard()
+        )
+    finally:
+        os.remove(path)
+
+
+async def admin_users(callback: CallbackQuery, db: Database):
+    """Выгрузка всех пользователей"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    await callback.answer("⏳ Готовим выгрузку...")
+    try:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M')
+        await send_csv_export(callback, db.export_users_csv, f"users_{stamp}.csv", "👥 Все пользователи")
+    except Exception as e:
+        logger.error(f"Error in admin_users: {e}", exc_info=True)
+        await callback.message.answer("❌ Ошибка при выгрузке пользователей.")
+
+
+async def admin_all_bookings(callback: CallbackQuery, db: Database):
+    """Выгрузка всех бронирований"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    await callback.answer("⏳ Готовим выгрузку...")
+    try:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M')
+        await send_csv_export(callback, db.export_bookings_csv, f"bookings_{stamp}.csv", "📋 Все бронирования")
+    except Exception as e:
+        logger.error(f"Error in admin_all_bookings: {e}", exc_info=True)
+        await callback.message.answer("❌ Ошибка при выгрузке бронирований.")
+
+
+async def admin_cleanup(callback: CallbackQuery, db: Database):
+    """Принудительно переводит закончившиеся брони в expired"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    expired = await db.cleanup_expired_bookings()
+    await callback.message.answer(
+        f"🗑️ Завершено бронирований: {expired}",
+        reply_markup=get_back_to_main_keyboard()
+    )
+    await callback.answer()
+
+
+async def admin_maintenance(callback: CallbackQuery, maintenance: MaintenanceMiddleware):
+    """Включить или выключить режим техработ на всех экземплярах бота"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    enabled = not maintenance.enabled
+    await maintenance.set(enabled)
+    await callback.message.answer(
+        "🔧 Режим техработ включен: пользователи видят уведомление, администраторы работают как обычно."
+        if enabled else
+        "✅ Режим техработ выключен: бот снова доступен всем.",
+        reply_markup=get_back_to_main_keyboard()
+    )
+    await callback.answer()
+
+
+async def admin_broadcast(callback: CallbackQuery, state: FSMContext):
+    """Начать рассылку: запросить текст"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    await callback.message.answer("📢 Отправьте текст рассылки одним сообщением (форматирование сохранится):")
+    await state.set_state(AdminStates.waiting_for_broadcast_text)
+    await callback.answer()
+
+
+async def process_broadcast_text(message: Message, state: FSMContext):
+    """Показать текст рассылки и запросить подтверждение"""
+    if message.from_user.id not in ADMINS:
+        await state.clear()
+        return
+    if not message.text:
+        await message.answer("❌ Нужен текст. Отправьте текст рассылки:")
+        return
+
+    await state.update_data(broadcast_text=message.html_text)
+    await message.answer(
+        f"{message.html_text}\n\n— — —\nОтправить это сообщение всем пользователям?",
+        parse_mode="HTML",
+        reply_markup=get_broadcast_confirm_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_broadcast_confirm)
+
+
+async def process_broadcast_confirm(callback: CallbackQuery, state: FSMContext, broadcast: BroadcastEngine):
+    """Запустить подтвержденную рассылку"""
+    if callback.from_user.id not in ADMINS:
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    user_data = await state.get_data()
+    await state.clear()
+    text = user_data.get('broadcast_text')
+    if callback.data == "broadcast_cancel" or not text:
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer("❌ Рассылка отменена.", reply_markup=get_back_to_main_keyboard())
+        await callback.answer()
+        return
+
+    try:
+        broadcast_id = await broadcast.start(text, parse_mode="HTML", created_by=callback.from_user.id)
+    except Exception as e:
+        logger.error(f"Error starting broadcast: {e}", exc_info=True)
+        await callback.message.answer("❌ Не удалось запустить рассылку.")
+        await callback.answer()
+        return
+
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await callback.message.answer(
+        f"📢 Рассылка #{broadcast_id} запущена. Итог придет отдельным сообщением.",
+        reply_markup=get_back_to_main_keyboard()
+    )
+    await callback.answer()
+
+
+def register_admin_handlers(dp: Dispatcher):
+    dp.callback_query.register(admin_panel, F.data == "admin_panel")
+    dp.callback_query.register(admin_stats, F.data == "admin_stats")
+    dp.callback_query.register(admin_users, F.data == "admin_users")
+    dp.callback_query.register(admin_all_bookings, F.data == "admin_all_bookings")
+    dp.callback_query.register(admin_cleanup, F.data == "admin_cleanup")
+    dp.callback_query.register(admin_maintenance, F.data == "admin_maintenance")
+    dp.callback_query.register(admin_broadcast, F.data == "admin_broadcast")
+    dp.message.register(process_broadcast_text, AdminStates.waiting_for_broadcast_text)
+    dp.callback_query.register(process_broadcast_confirm, AdminStates.waiting_for_broadcast_confirm,
+                               F.data.in_({"broadcast_confirm", "broadcast_cancel"}))
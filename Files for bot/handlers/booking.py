@@ -1,19 +1,33 @@
 from aiogram import Dispatcher, F
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 import logging
 
 from states import BookingStates
 from database import Database
 from config import BOOKING_TYPES, BOOKING_CAPACITY, JOINABLE_ACTIVITIES
-from helpers import get_current_datetime
+from callbacks import (
+    BookingWeek, BookingDate, BookingType, BookingTime, BookingDuration, BookingBack, WaitlistJoin,
+    BOOKING_TYPES_BY_ID, BACK_TO_DATE, BACK_TO_TYPE, BACK_TO_TIME
+)
+from helpers import get_current_datetime, get_available_start_hours
+from keyboards import get_time_keyboard, get_weeks_keyboard, get_waitlist_keyboard
+from capacity import check_capacity
+from occupancy import OccupancyEngine, first_free_slot, free_run_length
+from outbound import edit_or_answer, edit_with_menu
+from waitlist import WaitlistEngine
 
 logger = logging.getLogger(__name__)
-db = Database()
 
+# Весь сценарий бронирования идет в одном сообщении: каждый шаг редактирует его
+# текст и inline-клавиатуру, ошибки выбора показываются всплывающим уведомлением.
 
-async def check_user_registration(user_id):
+NOT_REGISTERED_TEXT = "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
+RESTART_TEXT = "❌ Ошибка: данные бронирования не найдены. Начните заново."
+
+
+async def check_user_registration(db: Database, user_id):
     """Проверяет, зарегистрирован ли пользователь"""
     try:
         logger.info(f"Checking registration for user_id: {user_id}")
@@ -26,442 +40,348 @@ async def check_user_registration(user_id):
         return False
 
 
-async def start_booking(callback: CallbackQuery, state: FSMContext):
+async def ensure_registered(callback: CallbackQuery, state: FSMContext, db: Database):
+    """Пропускает только зарегистрированных пользователей, остальным отвечает уведомлением"""
+    if await check_user_registration(db, callback.from_user.id):
+        return True
+    await state.clear()
+    await callback.answer(NOT_REGISTERED_TEXT, show_alert=True)
+    return False
+
+
+async def show_booking_dates(callback: CallbackQuery, state: FSMContext, week_offset):
+    """Шаг выбора дня недели; возвращает текст ошибки или None"""
+    from keyboards import get_week_dates_keyboard
+    from helpers import get_week_dates, format_week_display
+
+    if not get_week_dates(week_offset):
+        return "❌ На выбранной неделе нет доступных дат."
+
+    await edit_or_answer(
+        callback,
+        f"📅 Неделя: {format_week_display(week_offset)}\n"
+        f"Выберите день для бронирования:",
+        get_week_dates_keyboard(week_offset)
+    )
+    await state.set_state(BookingStates.waiting_for_booking_date)
+    return None
+
+
+async def show_booking_types(callback: CallbackQuery, state: FSMContext, db: Database, booking_date):
+    """Шаг выбора типа бронирования; возвращает текст ошибки или None"""
+    from keyboards import get_booking_type_keyboard
+
+    # Получаем доступные типы бронирования для пользователя на эту дату
+    available_types = await get_available_booking_types(db, callback.from_user.id, booking_date)
+
+    if not available_types:
+        await edit_with_menu(
+            callback,
+            "❌ На выбранную дату у вас уже есть бронирования всех типов. "
+            "Вы можете забронировать каждый тип только один раз в день.\n\n"
+            "Выберите другую дату или отмените существующее бронирование."
+        )
+        await state.clear()
+        return None
+
+    await edit_or_answer(
+        callback,
+        f"📅 Выбрана дата: {booking_date.strftime('%d.%m.%Y')}\n"
+        f"🎯 Что вы хотите забронировать?",
+        get_booking_type_keyboard()
+    )
+    await state.set_state(BookingStates.waiting_for_booking_type)
+    return None
+
+
+async def show_booking_times(callback: CallbackQuery, state: FSMContext, occupancy: OccupancyEngine,
+                             booking_date, booking_type):
+    """Шаг выбора времени начала; возвращает текст ошибки или None"""
+    from helpers import get_working_hours_for_date
+
+    # Определяем рабочие часы для дня недели
+    if not get_working_hours_for_date(booking_date):
+        return "❌ В этот день коворкинг не работает. Выберите другую дату."
+
+    # Если выбран сегодняшний день, не показываем прошедшее время
+    available_hours = get_available_start_hours(booking_date)
+    if not available_hours:
+        return "❌ На сегодня больше нет доступного времени. Выберите другую дату."
+
+    # Загрузка по часам - на кнопках видно, сколько мест осталось
+    hourly = await occupancy.get_occupancy(booking_date, booking_type)
+    counts = tuple(hourly.get(hour, 0) for hour in available_hours)
+    capacity = BOOKING_CAPACITY.get(booking_type)
+
+    if capacity is None:
+        text = "🕒 Выберите время начала бронирования:"
+        keyboard = get_time_keyboard(available_hours.start, available_hours.stop, occupied=counts)
+    else:
+        text = "🕒 Выберите время начала бронирования (на кнопках - число свободных мест):"
+        free_seats = tuple(max(0, capacity - count) for count in counts)
+        keyboard = get_time_keyboard(available_hours.start, available_hours.stop, free_seats=free_seats)
+
+    await edit_or_answer(callback, text, keyboard)
+    await state.set_state(BookingStates.waiting_for_booking_time)
+    return None
+
+
+async def suggest_free_slot(occupancy: OccupancyEngine, booking_date, booking_type, duration):
+    """Подсказка с ближайшим временем, когда свободно duration часов подряд"""
+    free_seats = await occupancy.get_free_seats(booking_date, booking_type)
+    hour = first_free_slot(free_seats, duration, from_hour=get_available_start_hours(booking_date).start)
+    if hour is None:
+        return f"На эту дату нет свободного времени на {duration} ч."
+    return f"Ближайшее свободное время на {duration} ч: {hour:02d}:00."
+
+
+async def offer_waitlist(callback: CallbackQuery, state: FSMContext, start_time, duration, text):
+    """Мест нет - вместо повторных попыток предлагаем лист ожидания"""
+    await state.update_data(start_time=start_time)
+    await edit_or_answer(
+        callback,
+        f"{text}\n\n"
+        f"📝 Можно встать в лист ожидания: бронь создастся автоматически, "
+        f"как только освободится место, и бот пришлет уведомление.",
+        get_waitlist_keyboard(duration)
+    )
+
+
+async def start_booking(callback: CallbackQuery, state: FSMContext, db: Database):
     """Начало процесса бронирования - выбор недели"""
     logger.info("=== START BOOKING PROCESS ===")
 
-    user_id = callback.from_user.id
-    # Проверяем, зарегистрирован ли пользователь
-    if not await check_user_registration(user_id):
-        await callback.message.answer(
-            "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-        )
-        await callback.answer()
+    if not await ensure_registered(callback, state, db):
         return
 
     await state.clear()
 
-    from keyboards import get_weeks_keyboard
     from helpers import get_available_weeks
 
     weeks = get_available_weeks()
 
     if not weeks:
-        from keyboards import get_main_menu_keyboard
-        await callback.message.answer(
-            "❌ Нет доступных недель для бронирования.",
-            reply_markup=get_main_menu_keyboard(user_id)
-        )
+        await edit_with_menu(callback, "❌ Нет доступных недель для бронирования.")
         await callback.answer()
         return
 
     week_list = "\n".join([f"• {week['display']}" for week in weeks])
 
-    await callback.message.answer(
+    await edit_or_answer(
+        callback,
         f"📅 Выберите неделю для бронирования:\n\n{week_list}",
-        reply_markup=get_weeks_keyboard()
+        get_weeks_keyboard()
     )
     await state.set_state(BookingStates.waiting_for_booking_week)
     await callback.answer()
 
 
-async def process_booking_week(callback: CallbackQuery, state: FSMContext):
+async def process_booking_week(callback: CallbackQuery, callback_data: BookingWeek, state: FSMContext,
+                               db: Database):
     """Обработка выбора недели"""
     try:
-        logger.info(f"=== PROCESS BOOKING WEEK: {callback.data} ===")
+        logger.info(f"=== PROCESS BOOKING WEEK: {callback_data.offset} ===")
 
-        user_id = callback.from_user.id
-        # Проверяем, зарегистрирован ли пользователь
-        if not await check_user_registration(user_id):
-            await callback.message.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-            )
-            await state.clear()
-            await callback.answer()
+        if not await ensure_registered(callback, state, db):
             return
 
-        week_offset = int(callback.data.replace('select_week_', ''))
-
-        await state.update_data(week_offset=week_offset)
-        logger.info(f"Week offset saved: {week_offset}")
-
-        from keyboards import get_week_dates_keyboard
-        from helpers import get_week_dates, format_week_display
-
-        dates = get_week_dates(week_offset)
-
-        if not dates:
-            await callback.message.answer(
-                "❌ На выбранной неделе нет доступных дат.",
-                reply_markup=get_weeks_keyboard()
-            )
-            await callback.answer()
-            return
+        await state.update_data(week_offset=callback_data.offset)
 
-        await callback.message.answer(
-            f"📅 Неделя: {format_week_display(week_offset)}\n"
-            f"Выберите день для бронирования:",
-            reply_markup=get_week_dates_keyboard(week_offset)
-        )
-        await state.set_state(BookingStates.waiting_for_booking_date)
+        error = await show_booking_dates(callback, state, callback_data.offset)
+        await callback.answer(error, show_alert=bool(error))
 
     except Exception as e:
         logger.error(f"Error in process_booking_week: {e}", exc_info=True)
-        await callback.message.answer("❌ Ошибка при выборе недели. Попробуйте снова.")
+        await edit_with_menu(callback, "❌ Ошибка при выборе недели. Попробуйте снова.")
         await state.clear()
-    finally:
         await callback.answer()
 
 
-async def process_booking_date(callback: CallbackQuery, state: FSMContext):
+async def process_booking_date(callback: CallbackQuery, callback_data: BookingDate, state: FSMContext,
+                               db: Database):
     """Обработка выбора даты"""
     try:
-        logger.info(f"=== PROCESS BOOKING DATE: {callback.data} ===")
+        logger.info(f"=== PROCESS BOOKING DATE: {callback_data.day} ===")
 
-        user_id = callback.from_user.id
-        # Проверяем, зарегистрирован ли пользователь
-        if not await check_user_registration(user_id):
-            await callback.message.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-            )
-            await state.clear()
-            await callback.answer()
+        if not await ensure_registered(callback, state, db):
             return
 
-        date_str = callback.data.replace('select_date_', '')
-        booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        booking_date = callback_data.day
 
         # Проверяем, что дата не в прошлом
-        today = datetime.now().date()
-        if booking_date < today:
-            await callback.message.answer(
-                "❌ Нельзя выбрать прошедшую дату. Пожалуйста, выберите другую дату.",
-                reply_markup=get_weeks_keyboard()
-            )
-            await state.clear()
-            await callback.answer()
+        if booking_date < get_current_datetime().date():
+            await callback.answer("❌ Нельзя выбрать прошедшую дату. Пожалуйста, выберите другую дату.",
+                                  show_alert=True)
             return
 
         await state.update_data(booking_date=booking_date)
         logger.info(f"Date saved: {booking_date}")
 
-        # Получаем доступные типы бронирования для пользователя на эту дату
-        available_types = await get_available_booking_types(user_id, booking_date)
-
-        if not available_types:
-            from keyboards import get_main_menu_keyboard
-
-            await callback.message.answer(
-                "❌ На выбранную дату у вас уже есть бронирования всех типов. "
-                "Вы можете забронировать каждый тип только один раз в день.\n\n"
-                "Выберите другую дату или отмените существующее бронирование.",
-                reply_markup=get_main_menu_keyboard(user_id)
-            )
-            await state.clear()
-            await callback.answer()
-            return
-
-        from keyboards import get_booking_type_keyboard
-
-        await callback.message.answer(
-            f"📅 Выбрана дата: {booking_date.strftime('%d.%m.%Y')}\n"
-            f"🎯 Что вы хотите забронировать?",
-            reply_markup=get_booking_type_keyboard()
-        )
-        await state.set_state(BookingStates.waiting_for_booking_type)
+        error = await show_booking_types(callback, state, db, booking_date)
+        await callback.answer(error, show_alert=bool(error))
 
     except Exception as e:
         logger.error(f"Error in process_booking_date: {e}", exc_info=True)
-        await callback.message.answer("❌ Ошибка при выборе даты. Попробуйте снова.")
+        await edit_with_menu(callback, "❌ Ошибка при выборе даты. Попробуйте снова.")
         await state.clear()
-    finally:
         await callback.answer()
 
 
-async def get_available_booking_types(user_id, booking_date):
+async def get_available_booking_types(db: Database, user_id, booking_date):
     """Возвращает доступные типы бронирования для пользователя на указанную дату"""
     try:
-        available_types = []
-        for booking_type in BOOKING_TYPES:
-            has_booking = await db.has_booking_type_on_date(user_id, booking_type, booking_date)
-            if not has_booking:
-                available_types.append(booking_type)
-        return available_types
+        booked_types = await db.get_user_booking_types(user_id, booking_date)
+        taken = booked_types.get(booking_date, set())
+        return [booking_type for booking_type in BOOKING_TYPES if booking_type not in taken]
     except Exception as e:
         logger.error(f"Error getting available types: {e}")
         return BOOKING_TYPES[:]
 
 
-async def process_booking_type(message: Message, state: FSMContext):
+async def process_booking_type(callback: CallbackQuery, callback_data: BookingType, state: FSMContext,
+                               db: Database, occupancy: OccupancyEngine):
     """Обработка выбора типа бронирования"""
     try:
-        logger.info(f"=== PROCESS BOOKING TYPE: '{message.text}' ===")
+        logger.info(f"=== PROCESS BOOKING TYPE: {callback_data.type_id} ===")
 
-        user_id = message.from_user.id
-        # Проверяем, зарегистрирован ли пользователь
-        if not await check_user_registration(user_id):
-            await message.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-            )
-            await state.clear()
-            return
-
-        if message.text == "🔙 Назад к выбору даты":
-            from keyboards import get_weeks_keyboard
-            await message.answer(
-                "📅 Выберите неделю для бронирования:",
-                reply_markup=get_weeks_keyboard()
-            )
-            await state.set_state(BookingStates.waiting_for_booking_week)
+        user_id = callback.from_user.id
+        if not await ensure_registered(callback, state, db):
             return
 
-        booking_type = message.text
+        booking_type = BOOKING_TYPES_BY_ID.get(callback_data.type_id)
         if booking_type not in BOOKING_TYPES:
-            await message.answer("❌ Пожалуйста, выберите тип бронирования из предложенных вариантов:")
+            await callback.answer("❌ Пожалуйста, выберите тип бронирования из предложенных вариантов.",
+                                  show_alert=True)
             return
 
         user_data = await state.get_data()
         booking_date = user_data.get('booking_date')
 
         if not booking_date:
-            await message.answer("❌ Ошибка: дата не выбрана. Начните заново.")
+            await edit_with_menu(callback, RESTART_TEXT)
             await state.clear()
+            await callback.answer()
             return
 
         # Проверяем, не забронировал ли пользователь уже этот тип на выбранную дату
-        has_booking = await db.has_booking_type_on_date(user_id, booking_type, booking_date)
-        if has_booking:
-            await message.answer(
-                "❌ У вас уже есть бронь этого типа на выбранную дату. "
-                "Выберите другой тип или дату."
+        if await db.has_booking_type_on_date(user_id, booking_type, booking_date):
+            await callback.answer(
+                "❌ У вас уже есть бронь этого типа на выбранную дату. Выберите другой тип или дату.",
+                show_alert=True
             )
             return
 
         await state.update_data(booking_type=booking_type)
         logger.info(f"Booking type saved: {booking_type}")
 
-        from helpers import get_working_hours_for_date
-
-        # Определяем рабочие часы для дня недели
-        working_hours = get_working_hours_for_date(booking_date)
-        if not working_hours:
-            await message.answer("❌ В этот день коворкинг не работает. Выберите другую дату.")
-            await state.clear()
-            return
-
-        start_hour = working_hours['start']
-        end_hour = working_hours['end']
-
-        # Если выбран сегодняшний день, не показываем прошедшее время
-        today = datetime.now().date()
-        current_time = datetime.now().time()
-        current_hour = current_time.hour
-
-        available_times = []
-        for hour in range(start_hour, end_hour):
-            # Для сегодняшнего дня пропускаем прошедшие часы
-            if today == booking_date:
-                if hour < current_hour:
-                    continue
-                # Если текущий час, проверяем минуты
-                if hour == current_hour and current_time.minute > 0:
-                    continue
-            available_times.append(f"{hour:02d}:00")
-
-        if not available_times:
-            await message.answer("❌ На сегодня больше нет доступного времени. Выберите другую дату.")
-            await state.clear()
-            return
-
-        # Создаем клавиатуру с временами
-        time_rows = []
-        for i in range(0, len(available_times), 4):
-            time_rows.append([KeyboardButton(text=time) for time in available_times[i:i + 4]])
-        time_rows.append([KeyboardButton(text="🔙 Назад к выбору типа")])
-
-        keyboard = ReplyKeyboardMarkup(
-            keyboard=time_rows,
-            resize_keyboard=True
-        )
-
-        await message.answer(
-            "🕒 Выберите время начала бронирования:",
-            reply_markup=keyboard
-        )
-        await state.set_state(BookingStates.waiting_for_booking_time)
+        error = await show_booking_times(callback, state, occupancy, booking_date, booking_type)
+        await callback.answer(error, show_alert=bool(error))
 
     except Exception as e:
         logger.error(f"Error in process_booking_type: {e}", exc_info=True)
-        await message.answer("❌ Ошибка при выборе типа бронирования. Попробуйте снова.")
+        await edit_with_menu(callback, "❌ Ошибка при выборе типа бронирования. Попробуйте снова.")
         await state.clear()
+        await callback.answer()
 
 
-async def process_booking_time(message: Message, state: FSMContext):
+async def process_booking_time(callback: CallbackQuery, callback_data: BookingTime, state: FSMContext,
+                               db: Database, occupancy: OccupancyEngine):
     """Обработка выбора времени"""
     try:
-        logger.info(f"=== PROCESS BOOKING TIME: '{message.text}' ===")
+        logger.info(f"=== PROCESS BOOKING TIME: {callback_data.hour} ===")
 
-        user_id = message.from_user.id
-        # Проверяем, зарегистрирован ли пользователь
-        if not await check_user_registration(user_id):
-            await message.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-            )
-            await state.clear()
-            return
-
-        if message.text == "🔙 Назад к выбору типа":
-            user_data = await state.get_data()
-            booking_date = user_data.get('booking_date')
-
-            if not booking_date:
-                await message.answer("❌ Ошибка: дата не найдена. Начните заново.")
-                await state.clear()
-                return
-
-            from keyboards import get_booking_type_keyboard
-
-            await message.answer(
-                f"📅 Дата: {booking_date.strftime('%d.%m.%Y')}\n"
-                f"🎯 Что вы хотите забронировать?",
-                reply_markup=get_booking_type_keyboard()
-            )
-            await state.set_state(BookingStates.waiting_for_booking_type)
-            return
-
-        try:
-            start_time = datetime.strptime(message.text, "%H:%M").time()
-            logger.info(f"Time parsed: {start_time}")
-        except ValueError:
-            await message.answer("❌ Пожалуйста, выберите время из предложенных вариантов:")
+        if not await ensure_registered(callback, state, db):
             return
 
         user_data = await state.get_data()
         booking_date = user_data.get('booking_date')
+        booking_type = user_data.get('booking_type')
 
-        if not booking_date:
-            await message.answer("❌ Ошибка: дата не найдена. Начните заново.")
+        if not booking_date or not booking_type:
+            await edit_with_menu(callback, RESTART_TEXT)
             await state.clear()
+            await callback.answer()
             return
 
-        from helpers import can_book_at_time
+        start_time = time(hour=callback_data.hour)
+
+        from helpers import can_book_at_time, get_available_end_times
 
         # Проверяем, доступно ли время для бронирования
         if not can_book_at_time(booking_date, start_time):
-            await message.answer("❌ Выбранное время недоступно для бронирования. Выберите другое время:")
+            await callback.answer("❌ Выбранное время недоступно для бронирования. Выберите другое время.",
+                                  show_alert=True)
             return
 
-        await state.update_data(start_time=start_time)
-
-        from helpers import get_available_end_times
+        # Все места на этот час заняты - ближайшее свободное время и лист ожидания
+        free_seats = await occupancy.get_free_seats(booking_date, booking_type)
+        if free_seats.get(callback_data.hour) == 0:
+            suggestion = await suggest_free_slot(occupancy, booking_date, booking_type, 1)
+            await offer_waitlist(callback, state, start_time, 1,
+                                 f"❌ На {start_time.strftime('%H:%M')} все места заняты.\n{suggestion}")
+            await callback.answer()
+            return
 
-        # Получаем доступные длительности для выбранного времени (без ограничений)
-        available_durations = get_available_end_times(booking_date, start_time)
+        # Длительность - до конца рабочего дня, но не дальше первого часа без свободных мест
+        free_hours = free_run_length(free_seats, callback_data.hour)
+        available_durations = [
+            hours for hours in get_available_end_times(booking_date, start_time) if hours <= free_hours
+        ]
 
         if not available_durations:
-            await message.answer("❌ Для выбранного времени нет доступных длительностей бронирования.")
+            await callback.answer("❌ Для выбранного времени нет доступных длительностей бронирования.",
+                                  show_alert=True)
             return
 
+        await state.update_data(start_time=start_time)
+
         from keyboards import get_duration_keyboard
 
-        await message.answer(
+        await edit_or_answer(
+            callback,
+            f"🕒 Начало: {start_time.strftime('%H:%M')}\n"
             f"⏱ Выберите длительность бронирования (доступно до {max(available_durations)} часа):",
-            reply_markup=get_duration_keyboard(available_durations)
+            get_duration_keyboard(available_durations)
         )
         await state.set_state(BookingStates.waiting_for_duration)
+        await callback.answer()
 
     except Exception as e:
         logger.error(f"Error in process_booking_time: {e}", exc_info=True)
-        await message.answer("❌ Ошибка при выборе времени. Попробуйте снова.")
+        await edit_with_menu(callback, "❌ Ошибка при выборе времени. Попробуйте снова.")
         await state.clear()
+        await callback.answer()
 
 
-async def process_duration(message: Message, state: FSMContext):
+async def process_duration(callback: CallbackQuery, callback_data: BookingDuration, state: FSMContext,
+                           db: Database, occupancy: OccupancyEngine):
     """Обработка выбора длительности с проверкой пересечений"""
     try:
-        logger.info(f"=== PROCESS DURATION: '{message.text}' ===")
+        logger.info(f"=== PROCESS DURATION: {callback_data.hours} ===")
 
-        user_id = message.from_user.id
-        # Проверяем, зарегистрирован ли пользователь
-        if not await check_user_registration(user_id):
-            await message.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-            )
-            await state.clear()
-            return
-
-        if message.text == "🔙 Назад к выбору времени":
-            user_data = await state.get_data()
-            booking_date = user_data.get('booking_date')
-
-            if not booking_date:
-                await message.answer("❌ Ошибка: дата не найдена. Начните заново.")
-                await state.clear()
-                return
-
-            from helpers import get_working_hours_for_date
-
-            working_hours = get_working_hours_for_date(booking_date)
-            if not working_hours:
-                await message.answer("❌ Ошибка: рабочие часы не найдены.")
-                await state.clear()
-                return
-
-            available_times = []
-            today = datetime.now().date()
-            current_time = datetime.now().time()
-            current_hour = current_time.hour
-
-            for hour in range(working_hours['start'], working_hours['end']):
-                if today == booking_date:
-                    if hour < current_hour:
-                        continue
-                    if hour == current_hour and current_time.minute > 0:
-                        continue
-                available_times.append(f"{hour:02d}:00")
-
-            # Группируем времена по 4 в строке
-            time_rows = []
-            for i in range(0, len(available_times), 4):
-                time_rows.append([KeyboardButton(text=time) for time in available_times[i:i + 4]])
-            time_rows.append([KeyboardButton(text="🔙 Назад к выбору типа")])
-
-            # Создаем клавиатуру для возврата
-            keyboard = ReplyKeyboardMarkup(
-                keyboard=time_rows,
-                resize_keyboard=True
-            )
-
-            await message.answer(
-                "🕒 Выберите время начала бронирования:",
-                reply_markup=keyboard
-            )
-            await state.set_state(BookingStates.waiting_for_booking_time)
+        user_id = callback.from_user.id
+        if not await ensure_registered(callback, state, db):
             return
 
-        try:
-            # Извлекаем число из текста (например, "2 час(а)" -> 2)
-            duration = int(''.join(filter(str.isdigit, message.text)))
-            logger.info(f"Duration parsed: {duration}")
-        except (ValueError, IndexError):
-            await message.answer("❌ Пожалуйста, выберите длительность из предложенных вариантов:")
-            return
+        duration = callback_data.hours
 
         user_data = await state.get_data()
         booking_date = user_data.get('booking_date')
         start_time = user_data.get('start_time')
         booking_type = user_data.get('booking_type')
 
-        if not booking_date or not start_time:
-            await message.answer("❌ Ошибка: данные бронирования не найдены. Начните заново.")
+        if not booking_date or not start_time or not booking_type:
+            await edit_with_menu(callback, RESTART_TEXT)
             await state.clear()
+            await callback.answer()
             return
 
         from helpers import is_booking_within_working_hours
 
         # Проверяем, что бронирование полностью в пределах рабочих часов
         if not is_booking_within_working_hours(booking_date, start_time, duration):
-            await message.answer("❌ Бронирование выходит за рамки рабочего времени. Выберите меньшую длительность:")
+            await callback.answer("❌ Бронирование выходит за рамки рабочего времени. Выберите меньшую длительность.",
+                                  show_alert=True)
             return
 
         # Вычисляем время окончания
@@ -472,20 +392,19 @@ async def process_duration(message: Message, state: FSMContext):
         # Проверяем пересечения с другими бронированиями ТОГО ЖЕ ТИПА
         conflicting_bookings = await db.get_conflicting_bookings(booking_date, start_time, end_time, booking_type)
 
-        # Для компьютеров проверяем емкость (16 мест)
-        if booking_type == "Компьютеры":
-            capacity = BOOKING_CAPACITY.get("Компьютеры", 16)
-            current_count = len(conflicting_bookings)
-
-            if current_count >= capacity:
-                # Достигнут лимит для компьютеров
-                await message.answer(
-                    f"❌ На это время уже достигнут лимит бронирований для '{booking_type}'.\n"
-                    f"Доступно мест: {capacity}, уже забронировано: {current_count}\n\n"
-                    f"Пожалуйста, выберите другое время.",
-                    parse_mode="Markdown"
-                )
-                return
+        # Вместимость - по пиковой одновременной занятости в интервале, а не по числу пересечений
+        check = check_capacity(conflicting_bookings, BOOKING_CAPACITY.get(booking_type), start_time, end_time)
+        if not check['fits']:
+            headroom = ", ".join(f"{hour:02d}:00 - {free}" for hour, free in check['headroom'].items())
+            suggestion = await suggest_free_slot(occupancy, booking_date, booking_type, duration)
+            await offer_waitlist(
+                callback, state, start_time, duration,
+                f"❌ На это время уже достигнут лимит бронирований для '{booking_type}'.\n"
+                f"Свободно мест по часам: {headroom}\n\n"
+                f"{suggestion}"
+            )
+            await callback.answer()
+            return
 
         # Для социальных активностей (не компьютеры) проверяем, можно ли присоединиться
         if booking_type in JOINABLE_ACTIVITIES and conflicting_bookings:
@@ -501,40 +420,97 @@ async def process_duration(message: Message, state: FSMContext):
 
             from keyboards import get_join_decision_keyboard
 
-            await message.answer(
+            await edit_or_answer(
+                callback,
                 f"👥 На это время уже есть бронирования *{booking_type}*:\n\n"
                 f"📋 Имена: {users_list}\n\n"
                 f"Хотите присоединиться к ним?",
-                reply_markup=get_join_decision_keyboard(),
+                get_join_decision_keyboard(),
                 parse_mode="Markdown"
             )
             await state.set_state(BookingStates.waiting_for_join_decision)
+            await callback.answer()
             return
 
         # Нет пересечений или нельзя присоединиться - создаем бронирование
-        await create_booking(message, user_id, state, booking_date, start_time, end_time, booking_type)
+        await create_booking(callback, user_id, state, db, occupancy, booking_date, start_time, end_time,
+                             booking_type)
+        await callback.answer()
 
     except Exception as e:
         logger.error(f"Error in process_duration: {e}", exc_info=True)
-        await message.answer("❌ Ошибка при завершении бронирования. Попробуйте снова.")
+        await edit_with_menu(callback, "❌ Ошибка при завершении бронирования. Попробуйте снова.")
         await state.clear()
+        await callback.answer()
 
 
-async def process_join_decision(callback: CallbackQuery, state: FSMContext):
-    """Обработка решения о присоединении"""
+async def process_waitlist_join(callback: CallbackQuery, callback_data: WaitlistJoin, state: FSMContext,
+                                db: Database, waitlist: WaitlistEngine):
+    """Запись в лист ожидания на выбранное время"""
     try:
         user_id = callback.from_user.id
-        logger.info(f"Processing join decision for user_id: {user_id}")
+        if not await ensure_registered(callback, state, db):
+            return
 
-        # Проверяем, зарегистрирован ли пользователь
-        if not await check_user_registration(user_id):
-            await callback.message.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start"
-            )
+        user_data = await state.get_data()
+        booking_date = user_data.get('booking_date')
+        start_time = user_data.get('start_time')
+        booking_type = user_data.get('booking_type')
+
+        if not booking_date or not start_time or not booking_type:
+            await edit_with_menu(callback, RESTART_TEXT)
             await state.clear()
             await callback.answer()
             return
 
+        from helpers import is_booking_within_working_hours, format_date_display
+
+        if not is_booking_within_working_hours(booking_date, start_time, callback_data.hours):
+            await callback.answer("❌ Бронирование выходит за рамки рабочего времени.", show_alert=True)
+            return
+
+        if await db.has_booking_type_on_date(user_id, booking_type, booking_date):
+            await callback.answer("❌ У вас уже есть бронь этого типа на выбранную дату.", show_alert=True)
+            return
+
+        end_time = (datetime.combine(booking_date, start_time) + timedelta(hours=callback_data.hours)).time()
+        position = await db.add_to_waitlist(user_id, booking_type, booking_date, start_time, end_time)
+        if position is None:
+            await callback.answer("❌ Вы уже в листе ожидания на этот тип и дату.", show_alert=True)
+            return
+
+        # Место могло освободиться, пока пользователь читал сообщение
+        waitlist.enqueue(booking_date, booking_type)
+
+        await edit_with_menu(
+            callback,
+            f"📝 Вы в листе ожидания!\n\n"
+            f"🎯 Тип: {booking_type}\n"
+            f"📅 Дата: {format_date_display(booking_date)}\n"
+            f"🕒 Время: {start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}\n"
+            f"🔢 Позиция в очереди: {position}\n\n"
+            f"Когда место освободится, бронь будет создана автоматически."
+        )
+        await state.clear()
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error in process_waitlist_join: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка при записи в лист ожидания. Попробуйте снова.")
+        await state.clear()
+        await callback.answer()
+
+
+async def process_join_decision(callback: CallbackQuery, state: FSMContext, db: Database,
+                                occupancy: OccupancyEngine):
+    """Обработка решения о присоединении"""
+    try:
+        user_id = callback.from_user.id
+        logger.info(f"Processing join decision for user_id: {user_id}")
+
+        if not await ensure_registered(callback, state, db):
+            return
+
         user_data = await state.get_data()
         logger.info(f"User data in join decision: {user_data}")
 
@@ -546,113 +522,104 @@ async def process_join_decision(callback: CallbackQuery, state: FSMContext):
         # Проверяем наличие всех необходимых данных
         if not all([booking_date, start_time, end_time, booking_type]):
             logger.error("Missing required data for booking creation")
-            await callback.message.answer(
-                "❌ Ошибка: недостаточно данных для создания бронирования. Начните заново.",
-                reply_markup=ReplyKeyboardRemove()
-            )
+            await edit_with_menu(callback, RESTART_TEXT)
             await state.clear()
             await callback.answer()
             return
 
         if callback.data == "join_yes":
             # Пользователь согласился присоединиться
-            # Для компьютеров еще раз проверяем доступность (на случай, если места закончились)
-            if booking_type == "Компьютеры":
-                conflicting_bookings = await db.get_conflicting_bookings(booking_date, start_time, end_time,
-                                                                         booking_type)
-                capacity = BOOKING_CAPACITY.get("Компьютеры", 16)
-
-                if len(conflicting_bookings) >= capacity:
-                    await callback.message.answer(
-                        "❌ К сожалению, все места уже заняты. Пожалуйста, выберите другое время.",
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                    await state.clear()
-                    await callback.answer()
-                    return
-
-            # Создаем бронирование
-            await create_booking(callback.message, user_id, state, booking_date, start_time, end_time, booking_type)
+            # Вместимость повторно проверяется атомарно при создании брони
+            await create_booking(callback, user_id, state, db, occupancy, booking_date, start_time, end_time,
+                                 booking_type)
+            await callback.answer()
         else:
-            # Пользователь отказался присоединяться
-            await callback.message.answer(
-                "🕒 Выберите другое время для бронирования:",
-                reply_markup=ReplyKeyboardRemove()
-            )
+            # Пользователь отказался присоединяться - возвращаем к выбору времени
+            error = await show_booking_times(callback, state, occupancy, booking_date, booking_type)
+            await callback.answer(error, show_alert=bool(error))
 
-            # Возвращаем к выбору времени
-            from helpers import get_working_hours_for_date
-
-            working_hours = get_working_hours_for_date(booking_date)
-            available_times = []
-            today = datetime.now().date()
-            current_time = datetime.now().time()
-            current_hour = current_time.hour
-
-            for hour in range(working_hours['start'], working_hours['end']):
-                if today == booking_date:
-                    if hour < current_hour:
-                        continue
-                    if hour == current_hour and current_time.minute > 0:
-                        continue
-                available_times.append(f"{hour:02d}:00")
-
-            time_rows = []
-            for i in range(0, len(available_times), 4):
-                time_rows.append([KeyboardButton(text=time) for time in available_times[i:i + 4]])
-            time_rows.append([KeyboardButton(text="🔙 Назад к выбору типа")])
-
-            keyboard = ReplyKeyboardMarkup(
-                keyboard=time_rows,
-                resize_keyboard=True
-            )
+    except Exception as e:
+        logger.error(f"Error in process_join_decision: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка при обработке решения. Попробуйте снова.")
+        await state.clear()
+        await callback.answer()
 
-            await callback.message.answer(
-                "🕒 Выберите время начала бронирования:",
-                reply_markup=keyboard
-            )
-            await state.set_state(BookingStates.waiting_for_booking_time)
 
-        await callback.answer()
+async def process_booking_back(callback: CallbackQuery, callback_data: BookingBack, state: FSMContext,
+                               db: Database, occupancy: OccupancyEngine):
+    """Возврат к предыдущему шагу бронирования"""
+    try:
+        if not await ensure_registered(callback, state, db):
+            return
+
+        user_data = await state.get_data()
+        week_offset = user_data.get('week_offset')
+        booking_date = user_data.get('booking_date')
+        booking_type = user_data.get('booking_type')
+
+        if callback_data.step == BACK_TO_DATE and week_offset is not None:
+            error = await show_booking_dates(callback, state, week_offset)
+        elif callback_data.step == BACK_TO_TYPE and booking_date:
+            error = await show_booking_types(callback, state, db, booking_date)
+        elif callback_data.step == BACK_TO_TIME and booking_date and booking_type:
+            error = await show_booking_times(callback, state, occupancy, booking_date, booking_type)
+        else:
+            # Данных сценария уже нет (например, истек срок хранения) - начинаем с недели
+            await start_booking(callback, state, db)
+            return
+
+        await callback.answer(error, show_alert=bool(error))
 
     except Exception as e:
-        logger.error(f"Error in process_join_decision: {e}", exc_info=True)
-        await callback.message.answer("❌ Ошибка при обработке решения. Попробуйте снова.")
+        logger.error(f"Error in process_booking_back: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка. Попробуйте снова.")
         await state.clear()
+        await callback.answer()
 
 
-async def create_booking(message_source, user_id, state, booking_date, start_time, end_time, booking_type):
+async def create_booking(callback: CallbackQuery, user_id, state, db: Database, occupancy: OccupancyEngine,
+                         booking_date, start_time, end_time, booking_type):
     """Создание бронирования (общая функция)"""
     try:
         logger.info(
             f"Creating booking: user_id={user_id}, type={booking_type}, date={booking_date}, time={start_time}-{end_time}")
 
         # Финальная проверка регистрации
-        if not await check_user_registration(user_id):
-            await message_source.answer(
-                "❌ Вы не зарегистрированы в системе. Пожалуйста, начните с команды /start",
-                reply_markup=ReplyKeyboardRemove()
-            )
+        if not await check_user_registration(db, user_id):
+            await edit_with_menu(callback, NOT_REGISTERED_TEXT)
             await state.clear()
             return
 
-        # Сохраняем бронирование
-        booking_id = await db.add_booking(
+        # Проверка вместимости, сохранение и список участников - одной транзакцией
+        reservation = await db.reserve_booking(
             user_id=user_id,
             booking_type=booking_type,
             booking_date=booking_date,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            capacity=BOOKING_CAPACITY.get(booking_type)
         )
+        booking_id = reservation['booking_id']
+
+        if booking_id is None:
+            if reservation['duplicate']:
+                text = "❌ У вас уже есть бронь этого типа на выбранную дату."
+            else:
+                # Сетка в кэше могла отстать от других экземпляров бота - перечитываем
+                occupancy.invalidate(booking_date, booking_type)
+                duration = end_time.hour - start_time.hour
+                suggestion = await suggest_free_slot(occupancy, booking_date, booking_type, duration)
+                text = (
+                    f"❌ К сожалению, все места для '{booking_type}' на это время уже заняты.\n"
+                    f"{suggestion}"
+                )
+            await edit_with_menu(callback, text)
+            await state.clear()
+            return
 
         logger.info(f"Booking created with ID: {booking_id}")
 
-        # Получаем информацию о других бронированиях того же времени и типа
-        conflicting_bookings = await db.get_conflicting_bookings(booking_date, start_time, end_time, booking_type)
-        other_users = [booking for booking in conflicting_bookings if booking['user_id'] != user_id]
-
         from helpers import format_date_display
-        from keyboards import get_main_menu_keyboard
 
         booking_info = (
             f"✅ Бронирование подтверждено!\n\n"
@@ -663,31 +630,29 @@ async def create_booking(message_source, user_id, state, booking_date, start_tim
         )
 
         # Добавляем информацию о других участниках, если есть
-        if other_users:
-            other_names = [booking['full_name'] for booking in other_users]
-            booking_info += f"\n\n👥 Участники: {', '.join(other_names)}"
+        if reservation['participants']:
+            booking_info += f"\n\n👥 Участники: {', '.join(reservation['participants'])}"
 
-        await message_source.answer(booking_info, reply_markup=ReplyKeyboardRemove())
-
-        # Предлагаем посмотреть бронирования
-        await message_source.answer(
-            "🏠 Главное меню:",
-            reply_markup=get_main_menu_keyboard(user_id)
-        )
+        # Итог и главное меню заменяют сообщение сценария
+        await edit_with_menu(callback, booking_info)
 
         await state.clear()
 
     except Exception as e:
         logger.error(f"Error creating booking: {e}", exc_info=True)
-        await message_source.answer("❌ Ошибка при создании бронирования. Попробуйте снова.")
+        await edit_with_menu(callback, "❌ Ошибка при создании бронирования. Попробуйте снова.")
         await state.clear()
 
 
 def register_booking_handlers(dp: Dispatcher):
     dp.callback_query.register(start_booking, F.data == "book_now")
-    dp.callback_query.register(process_booking_week, F.data.startswith('select_week_'))
-    dp.callback_query.register(process_booking_date, F.data.startswith('select_date_'))
-    dp.message.register(process_booking_type, BookingStates.waiting_for_booking_type)
-    dp.message.register(process_booking_time, BookingStates.waiting_for_booking_time)
-    dp.message.register(process_duration, BookingStates.waiting_for_duration)
-    dp.callback_query.register(process_join_decision, BookingStates.waiting_for_join_decision)
\ No newline at end of file
+    callback_router = dp["callback_router"]
+    callback_router.register(BookingWeek, process_booking_week)
+    callback_router.register(BookingDate, process_booking_date)
+    callback_router.register(BookingType, process_booking_type)
+    callback_router.register(BookingTime, process_booking_time)
+    callback_router.register(BookingDuration, process_duration)
+    callback_router.register(BookingBack, process_booking_back)
+    callback_router.register(WaitlistJoin, process_waitlist_join)
+    dp.callback_query.register(process_join_decision, BookingStates.waiting_for_join_decision,
+                               F.data.in_({"join_yes", "join_no"}))
@@ -1,14 +1,14 @@
 from aiogram import Dispatcher, F
 from aiogram.types import CallbackQuery
 from database import Database
-from keyboards import get_main_menu_keyboard, get_cancel_booking_keyboard
+from keyboards import get_cancel_booking_keyboard
 from helpers import format_date_display
+from outbound import edit_with_menu
+from callbacks import CancelBooking
 
-db = Database()
 
-async def view_my_bookings(callback: CallbackQuery):
+async def view_my_bookings(callback: CallbackQuery, db: Database):
     """Показывает активные бронирования пользователя"""
-    await db.cleanup_expired_bookings()  # Очищаем просроченные брони
     bookings = await db.get_user_bookings(callback.from_user.id, active_only=True)
 
     if not bookings:
@@ -30,9 +30,8 @@ async def view_my_bookings(callback: CallbackQuery):
     await callback.message.answer(response)
     await callback.answer()
 
-async def start_cancel_booking(callback: CallbackQuery):
+async def start_cancel_booking(callback: CallbackQuery, db: Database):
     """Начинает процесс отмены бронирования"""
-    await db.cleanup_expired_bookings()  # Очищаем просроченные брони
     bookings = await db.get_user_bookings(callback.from_user.id, active_only=True)
 
     if not bookings:
@@ -46,18 +45,14 @@ async def start_cancel_booking(callback: CallbackQuery):
     )
     await callback.answer()
 
-async def cancel_specific_booking(callback: CallbackQuery):
+async def cancel_specific_booking(callback: CallbackQuery, callback_data: CancelBooking, db: Database):
     """Отменяет конкретное бронирование"""
-    booking_id = int(callback.data.split('_')[1])
+    booking_id = callback_data.booking_id
 
     success = await db.cancel_booking(booking_id, callback.from_user.id)
 
     if success:
-        await callback.message.answer("✅ Бронирование успешно отменено!")
-        await callback.message.answer(
-            "🏠 Главное меню:",
-            reply_markup=get_main_menu_keyboard(callback.from_user.id)
-        )
+        await edit_with_menu(callback, "✅ Бронирование успешно отменено!")
     else:
         await callback.message.answer(
             "❌ Не удалось отменить бронирование. Возможно, оно уже отменено или не существует.")
@@ -67,4 +62,4 @@ async def cancel_specific_booking(callback: CallbackQuery):
 def register_common_handlers(dp: Dispatcher):
     dp.callback_query.register(view_my_bookings, F.data == "view_my_bookings")
     dp.callback_query.register(start_cancel_booking, F.data == "cancel_booking")
-    dp.callback_query.register(cancel_specific_booking, F.data.startswith("cancel_"))
\ No newline at end of file
+    dp["callback_router"].register(CancelBooking, cancel_specific_booking)
\ No newline at end of file
@@ -4,9 +4,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from database import Database
-from keyboards import get_main_menu_keyboard, get_profile_keyboard, get_contact_keyboard
-
-db = Database()
+from keyboards import get_profile_keyboard, get_contact_keyboard
+from outbound import answer_with_menu
 
 
 class ProfileStates(StatesGroup):
@@ -14,7 +13,7 @@ class ProfileStates(StatesGroup):
     waiting_for_new_phone = State()
 
 
-async def view_profile(callback: CallbackQuery):
+async def view_profile(callback: CallbackQuery, db: Database):
     """Показать профиль пользователя"""
     user_id = callback.from_user.id
 
@@ -71,7 +70,7 @@ async def edit_name_start(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-async def process_new_name(message: Message, state: FSMContext):
+async def process_new_name(message: Message, state: FSMContext, db: Database):
     """Обработать новое имя"""
     new_name = message.text.strip()
     if len(new_name.split()) < 2:
@@ -88,12 +87,7 @@ async def process_new_name(message: Message, state: FSMContext):
             is_student=user['is_student']
         )
 
-    await message.answer(f"✅ Имя успешно изменено на: {new_name}")
-
-    await message.answer(
-        "🏠 Главное меню:",
-        reply_markup=get_main_menu_keyboard(message.from_user.id)
-    )
+    await answer_with_menu(message, f"✅ Имя успешно изменено на: {new_name}", message.from_user.id)
     await state.clear()
 
 
@@ -107,7 +101,7 @@ async def edit_phone_start(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-async def process_new_phone(message: Message, state: FSMContext):
+async def process_new_phone(message: Message, state: FSMContext, db: Database):
     """Обработать новый телефон"""
     if message.contact:
         new_phone = message.contact.phone_number
@@ -122,15 +116,7 @@ async def process_new_phone(message: Message, state: FSMContext):
                 is_student=user['is_student']
             )
 
-        await message.answer(
-            f"✅ Номер телефона успешно изменен на: {new_phone}",
-            reply_markup=ReplyKeyboardRemove()
-        )
-
-        await message.answer(
-            "🏠 Главное меню:",
-            reply_markup=get_main_menu_keyboard(message.from_user.id)
-        )
+        await answer_with_menu(message, f"✅ Номер телефона успешно изменен на: {new_phone}", message.from_user.id)
         await state.clear()
     else:
         await message.answer("❌ Пожалуйста, поделитесь контактом используя кнопку:")
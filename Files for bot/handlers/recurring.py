@@ -0,0 +1,256 @@
+from aiogram import Dispatcher, F
+from aiogram.types import CallbackQuery
+from aiogram.fsm.context import FSMContext
+from datetime import datetime, time, timedelta
+import logging
+
+from states import RecurringBookingStates
+from database import Database
+from config import BOOKING_TYPES, BOOKING_CAPACITY
+from callbacks import RecurringType, RecurringWeekday, RecurringTime, RecurringDuration, BOOKING_TYPES_BY_ID
+from helpers import (
+    get_available_weeks, can_book_at_time, get_working_hours_for_date, is_booking_within_working_hours,
+    format_date_display
+)
+from keyboards import (
+    get_recurring_type_keyboard, get_recurring_weekday_keyboard, get_recurring_time_keyboard,
+    get_recurring_duration_keyboard
+)
+from booking_calendar import DAYS_RU
+from outbound import edit_or_answer, edit_with_menu
+from .booking import ensure_registered, RESTART_TEXT
+
+logger = logging.getLogger(__name__)
+
+# Регулярная бронь: тип, день недели, время и длительность выбираются один раз,
+# бронируются все такие дни в окне бронирования. Итог - одно сообщение со
+# списком созданных броней и дат, которые не удалось занять.
+
+CONFLICT_REASONS = {
+    'duplicate': "у вас уже есть бронь этого типа",
+    'full': "все места заняты"
+}
+
+
+def get_weekday_sample_date(weekday):
+    """Ближайшая дата с этим днем недели: рабочие часы зависят только от дня недели"""
+    today = datetime.now().date()
+    return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+
+def get_recurring_dates(weekday, start_time):
+    """Даты окна бронирования с выбранным днем недели, на которые еще можно записаться"""
+    return [
+        day['date']
+        for week in get_available_weeks()
+        for day in week['dates']
+        if day['date'].weekday() == weekday and can_book_at_time(day['date'], start_time)
+    ]
+
+
+def format_recurring_summary(booking_type, start_time, end_time, result):
+    """Итоговое сообщение регулярной брони"""
+    lines = [f"🔁 Регулярная бронь: {booking_type}, {start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}"]
+    if result['booked']:
+        lines.append("\n✅ Забронировано:")
+        for booking_date, booking_id in sorted(result['booked'].items()):
+            line = f"• {format_date_display(booking_date)} (ID: {booking_id})"
+            # Как и в обычном бронировании: на это время уже есть брони, вы присоединяетесь к ним
+            participants = result['participants'].get(booking_date)
+            if participants:
+                line += f"\n   👥 Участники: {', '.join(participants)}"
+            lines.append(line)
+    if result['conflicts']:
+        lines.append("\n❌ Не удалось забронировать:")
+        lines.extend(
+            f"• {format_date_display(booking_date)} - {CONFLICT_REASONS[reason]}"
+            for booking_date, reason in sorted(result['conflicts'].items())
+        )
+    return "\n".join(lines)
+
+
+async def start_recurring_booking(callback: CallbackQuery, state: FSMContext, db: Database):
+    """Начало регулярного бронирования - выбор типа"""
+    try:
+        await state.clear()
+        if not await ensure_registered(callback, state, db):
+            return
+
+        await edit_or_answer(
+            callback,
+            "🔁 Регулярная бронь\n\n"
+            "Бронь создается на один и тот же день недели и время на все доступные недели.\n"
+            "Выберите тип бронирования:",
+            get_recurring_type_keyboard()
+        )
+        await state.set_state(RecurringBookingStates.waiting_for_type)
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error in start_recurring_booking: {e}", exc_info=True)
+        await callback.answer("❌ Ошибка при начале бронирования. Попробуйте позже.", show_alert=True)
+
+
+async def process_recurring_type(callback: CallbackQuery, callback_data: RecurringType, state: FSMContext):
+    """Обработка выбора типа регулярной брони"""
+    try:
+        booking_type = BOOKING_TYPES_BY_ID.get(callback_data.type_id)
+        if booking_type not in BOOKING_TYPES:
+            await callback.answer("❌ Пожалуйста, выберите тип бронирования из предложенных вариантов.",
+                                  show_alert=True)
+            return
+
+        await state.update_data(booking_type=booking_type)
+        await edit_or_answer(
+            callback,
+            f"🎯 Тип: {booking_type}\n"
+            f"Выберите день недели:",
+            get_recurring_weekday_keyboard()
+        )
+        await state.set_state(RecurringBookingStates.waiting_for_weekday)
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error in process_recurring_type: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка при выборе типа бронирования. Попробуйте снова.")
+        await state.clear()
+        await callback.answer()
+
+
+async def process_recurring_weekday(callback: CallbackQuery, callback_data: RecurringWeekday, state: FSMContext):
+    """Обработка выбора дня недели"""
+    try:
+        weekday = callback_data.weekday
+        working_hours = get_working_hours_for_date(get_weekday_sample_date(weekday))
+        if not working_hours:
+            await callback.answer("❌ В этот день коворкинг не работает.", show_alert=True)
+            return
+
+        user_data = await state.get_data()
+        booking_type = user_data.get('booking_type')
+        if not booking_type:
+            await edit_with_menu(callback, RESTART_TEXT)
+            await state.clear()
+            await callback.answer()
+            return
+
+        await state.update_data(weekday=weekday)
+        await edit_or_answer(
+            callback,
+            f"🎯 Тип: {booking_type}\n"
+            f"📅 День: {DAYS_RU[weekday]}\n"
+            f"Выберите время начала:",
+            get_recurring_time_keyboard(working_hours['start'], working_hours['end'])
+        )
+        await state.set_state(RecurringBookingStates.waiting_for_time)
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error in process_recurring_weekday: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка при выборе дня недели. Попробуйте снова.")
+        await state.clear()
+        await callback.answer()
+
+
+async def process_recurring_time(callback: CallbackQuery, callback_data: RecurringTime, state: FSMContext):
+    """Обработка выбора времени начала"""
+    try:
+        user_data = await state.get_data()
+        booking_type = user_data.get('booking_type')
+        weekday = user_data.get('weekday')
+        if not booking_type or weekday is None:
+            await edit_with_menu(callback, RESTART_TEXT)
+            await state.clear()
+            await callback.answer()
+            return
+
+        working_hours = get_working_hours_for_date(get_weekday_sample_date(weekday))
+        hour = callback_data.hour
+        if not working_hours or not working_hours['start'] <= hour < working_hours['end']:
+            await callback.answer("❌ Выберите время из предложенных вариантов.", show_alert=True)
+            return
+
+        await state.update_data(start_hour=hour)
+        await edit_or_answer(
+            callback,
+            f"🎯 Тип: {booking_type}\n"
+            f"📅 День: {DAYS_RU[weekday]}\n"
+            f"🕒 Начало: {hour:02d}:00\n"
+            f"Выберите длительность:",
+            get_recurring_duration_keyboard(working_hours['end'] - hour)
+        )
+        await state.set_state(RecurringBookingStates.waiting_for_duration)
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error in process_recurring_time: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка при выборе времени. Попробуйте снова.")
+        await state.clear()
+        await callback.answer()
+
+
+async def process_recurring_duration(callback: CallbackQuery, callback_data: RecurringDuration, state: FSMContext,
+                                     db: Database):
+    """Обработка выбора длительности: бронирует все подходящие даты одной транзакцией"""
+    try:
+        user_id = callback.from_user.id
+        if not await ensure_registered(callback, state, db):
+            return
+
+        user_data = await state.get_data()
+        booking_type = user_data.get('booking_type')
+        weekday = user_data.get('weekday')
+        start_hour = user_data.get('start_hour')
+        if not booking_type or weekday is None or start_hour is None:
+            await edit_with_menu(callback, RESTART_TEXT)
+            await state.clear()
+            await callback.answer()
+            return
+
+        # Бронирование должно полностью укладываться в рабочие часы
+        duration = callback_data.hours
+        start_time = time(start_hour)
+        if not is_booking_within_working_hours(get_weekday_sample_date(weekday), start_time, duration):
+            await callback.answer("❌ Бронирование выходит за рамки рабочего времени. Выберите меньшую длительность.",
+                                  show_alert=True)
+            return
+
+        end_time = time(start_hour + duration)
+        dates = get_recurring_dates(weekday, start_time)
+        if not dates:
+            await edit_with_menu(callback, f"❌ В окне бронирования не осталось дней ({DAYS_RU[weekday]}) на это время.")
+            await state.clear()
+            await callback.answer()
+            return
+
+        logger.info(
+            f"Recurring booking: user_id={user_id}, type={booking_type}, dates={len(dates)}, "
+            f"time={start_time}-{end_time}"
+        )
+        result = await db.reserve_recurring(
+            user_id=user_id,
+            booking_type=booking_type,
+            dates=dates,
+            start_time=start_time,
+            end_time=end_time,
+            capacity=BOOKING_CAPACITY.get(booking_type)
+        )
+
+        await edit_with_menu(callback, format_recurring_summary(booking_type, start_time, end_time, result))
+        await state.clear()
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error in process_recurring_duration: {e}", exc_info=True)
+        await edit_with_menu(callback, "❌ Ошибка при создании регулярной брони. Попробуйте снова.")
+        await state.clear()
+        await callback.answer()
+
+
+def register_recurring_handlers(dp: Dispatcher):
+    dp.callback_query.register(start_recurring_booking, F.data == "book_recurring")
+    callback_router = dp["callback_router"]
+    callback_router.register(RecurringType, process_recurring_type)
+    callback_router.register(RecurringWeekday, process_recurring_weekday)
+    callback_router.register(RecurringTime, process_recurring_time)
+    callback_router.register(RecurringDuration, process_recurring_duration)
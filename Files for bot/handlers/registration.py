@@ -1,15 +1,13 @@
 from aiogram import Dispatcher
-from aiogram.types import Message, ReplyKeyboardRemove
+from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 from states import RegistrationStates
-from keyboards import get_main_menu_keyboard
 from database import Database
+from outbound import answer_with_menu
 
-db = Database()
 
-
-async def process_contact(message: Message, state: FSMContext):
+async def process_contact(message: Message, state: FSMContext, db: Database):
     """Обработка контакта и завершение регистрации"""
     if message.contact:
         phone = message.contact.phone_number
@@ -22,14 +20,11 @@ async def process_contact(message: Message, state: FSMContext):
             is_student=user_data.get('is_student', False)
         )
 
-        await message.answer(
+        # Клавиатура контакта одноразовая, поэтому итог и меню уходят одним сообщением
+        await answer_with_menu(
+            message,
             "✅ Регистрация завершена! Теперь вы можете забронировать оборудование.",
-            reply_markup=ReplyKeyboardRemove()
-        )
-
-        await message.answer(
-            "🏠 Главное меню:",
-            reply_markup=get_main_menu_keyboard(message.from_user.id)
+            message.from_user.id
         )
 
         await state.clear()
@@ -6,12 +6,10 @@ from aiogram.fsm.context import FSMContext
 from keyboards import get_student_keyboard, get_main_menu_keyboard, get_yes_no_keyboard, get_contact_keyboard
 from database import Database
 from states import RegistrationStates
+from outbound import edit_with_menu
 
-db = Database()
 
-
-
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, db: Database):
     """Обработчик команды /start с проверкой регистрации"""
     await state.clear()
 
@@ -19,7 +17,8 @@ async def cmd_start(message: Message, state: FSMContext):
     user = await db.get_user(message.from_user.id)
 
     if user:
-        # Пользователь уже зарегистрирован
+        # Пользователь уже зарегистрирован; заблокировавший бота раньше снова получает рассылки
+        await db.set_user_active(message.from_user.id)
         await message.answer(
             "✅ Вы уже зарегистрированы в системе!\n\n"
             "🏠 Главное меню:",
@@ -138,10 +137,7 @@ async def process_name_confirmation_no(callback: CallbackQuery, state: FSMContex
 
 async def back_to_main(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.answer(
-        "🏠 Главное меню:",
-        reply_markup=get_main_menu_keyboard(callback.from_user.id)
-    )
+    await edit_with_menu(callback)
     await callback.answer()
 
 
@@ -2,9 +2,14 @@ from aiogram import Dispatcher, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime, timedelta
+from datetime import timedelta
+from functools import lru_cache
 import logging
 
+from database import Database
+from callbacks import FilterWeek, FilterDate, FilterType, BOOKING_TYPE_IDS, BOOKING_TYPES_BY_ID
+from outbound import edit_or_answer, edit_with_menu
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +28,13 @@ BOOKING_TYPES = [
 
 def get_filter_weeks_keyboard():
     """Клавиатура для выбора недели в фильтре"""
-    from helpers import get_available_weeks, format_week_display
+    from helpers import booking_calendar
+    return _filter_weeks_keyboard(booking_calendar.today())
+
+
+@lru_cache(maxsize=4)
+def _filter_weeks_keyboard(today):
+    from helpers import get_available_weeks
 
     weeks = get_available_weeks()
     buttons = []
@@ -37,7 +48,7 @@ def get_filter_weeks_keyboard():
         buttons.append([
             InlineKeyboardButton(
                 text=display_text,
-                callback_data=f"filter_week_{week['offset']}"
+                callback_data=FilterWeek(offset=week['offset']).pack()
             )
         ])
 
@@ -48,37 +59,45 @@ def get_filter_weeks_keyboard():
 
 def get_filter_dates_keyboard(week_offset):
     """Клавиатура с датами выбранной недели для фильтра"""
-    from helpers import get_week_dates, format_date_display
+    from helpers import booking_calendar
+    return _filter_dates_keyboard(booking_calendar.today(), week_offset)
+
 
-    dates = get_week_dates(week_offset)
+@lru_cache(maxsize=16)
+def _filter_dates_keyboard(today, week_offset):
+    from helpers import get_week_days
+
+    days = get_week_days(week_offset)
     buttons = []
 
     # Группируем даты по 3 в строке
-    for i in range(0, len(dates), 3):
-        row = []
-        for j in range(3):
-            if i + j < len(dates):
-                date = dates[i + j]
-                button_text = format_date_display(date)
-                callback_data = f"filter_date_{date.strftime('%Y-%m-%d')}"
-                row.append(InlineKeyboardButton(text=button_text, callback_data=callback_data))
-        if row:
-            buttons.append(row)
+    for i in range(0, len(days), 3):
+        row = [
+            InlineKeyboardButton(text=day['display'], callback_data=FilterDate(day=day['date']).pack())
+            for day in days[i:i + 3]
+        ]
+        buttons.append(row)
 
     buttons.append([InlineKeyboardButton(text="🔙 Назад к выбору недели", callback_data="view_bookings_filter")])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_filter_types_keyboard():
+@lru_cache(maxsize=8)
+def get_filter_types_keyboard(week_offset):
     """Клавиатура для выбора типа в фильтре"""
     buttons = []
-    buttons.append([InlineKeyboardButton(text="📋 Все типы", callback_data="filter_type_all")])
+    buttons.append([InlineKeyboardButton(text="📋 Все типы", callback_data=FilterType(type_id=0).pack())])
 
     for booking_type in BOOKING_TYPES:
-        buttons.append([InlineKeyboardButton(text=booking_type, callback_data=f"filter_type_{booking_type}")])
+        buttons.append([
+            InlineKeyboardButton(text=booking_type,
+                                 callback_data=FilterType(type_id=BOOKING_TYPE_IDS[booking_type]).pack())
+        ])
 
-    buttons.append([InlineKeyboardButton(text="🔙 Назад к выбору даты", callback_data="view_bookings_filter")])
+    buttons.append([
+        InlineKeyboardButton(text="🔙 Назад к выбору даты", callback_data=FilterWeek(offset=week_offset).pack())
+    ])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
@@ -86,9 +105,10 @@ async def start_view_bookings_filter(callback: CallbackQuery, state: FSMContext)
     """Начало процесса фильтрации бронирований"""
     try:
         await state.clear()
-        await callback.message.answer(
+        await edit_or_answer(
+            callback,
             "📅 Выберите неделю для просмотра бронирований:",
-            reply_markup=get_filter_weeks_keyboard()
+            get_filter_weeks_keyboard()
         )
         await state.set_state(ViewBookingsStates.waiting_for_filter_week)
         await callback.answer()
@@ -97,10 +117,10 @@ async def start_view_bookings_filter(callback: CallbackQuery, state: FSMContext)
         await callback.message.answer("❌ Ошибка при запуске фильтрации бронирований.")
 
 
-async def process_filter_week(callback: CallbackQuery, state: FSMContext):
+async def process_filter_week(callback: CallbackQuery, callback_data: FilterWeek, state: FSMContext):
     """Обработка выбора недели в фильтре"""
     try:
-        week_offset = int(callback.data.replace('filter_week_', ''))
+        week_offset = callback_data.offset
 
         from helpers import get_week_dates, format_week_display
 
@@ -109,72 +129,70 @@ async def process_filter_week(callback: CallbackQuery, state: FSMContext):
         dates = get_week_dates(week_offset)
 
         if not dates:
-            await callback.message.answer("❌ На выбранной неделе нет доступных дат.")
-            await callback.answer()
+            await callback.answer("❌ На выбранной неделе нет доступных дат.", show_alert=True)
             return
 
-        await callback.message.answer(
+        await edit_or_answer(
+            callback,
             f"📅 Неделя: {format_week_display(week_offset)}\n"
             f"Выберите день для просмотра бронирований:",
-            reply_markup=get_filter_dates_keyboard(week_offset)
+            get_filter_dates_keyboard(week_offset)
         )
         await state.set_state(ViewBookingsStates.waiting_for_filter_date)
         await callback.answer()
     except Exception as e:
         logger.error(f"Error in process_filter_week: {e}")
-        await callback.message.answer("❌ Ошибка при выборе недели.")
+        await edit_with_menu(callback, "❌ Ошибка при выборе недели.")
+        await callback.answer()
 
 
-async def process_filter_date(callback: CallbackQuery, state: FSMContext):
+async def process_filter_date(callback: CallbackQuery, callback_data: FilterDate, state: FSMContext):
     """Обработка выбора даты в фильтре"""
     try:
-        date_str = callback.data.replace('filter_date_', '')
-        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        selected_date = callback_data.day
 
         await state.update_data(filter_date=selected_date)
+        user_data = await state.get_data()
 
         from helpers import format_date_display
 
-        await callback.message.answer(
+        await edit_or_answer(
+            callback,
             f"📅 Выбрана дата: {format_date_display(selected_date)}\n"
             f"🎯 Выберите тип бронирования для просмотра:",
-            reply_markup=get_filter_types_keyboard()
+            get_filter_types_keyboard(user_data.get('filter_week_offset', 0))
         )
         await state.set_state(ViewBookingsStates.waiting_for_filter_type)
         await callback.answer()
     except Exception as e:
         logger.error(f"Error in process_filter_date: {e}")
-        await callback.message.answer("❌ Ошибка при выборе даты.")
+        await edit_with_menu(callback, "❌ Ошибка при выборе даты.")
+        await callback.answer()
 
 
-async def process_filter_type(callback: CallbackQuery, state: FSMContext):
+async def process_filter_type(callback: CallbackQuery, callback_data: FilterType, state: FSMContext,
+                              db: Database):
     """Обработка выбора типа и отображение результатов"""
     try:
-        from database import Database
-        db = Database()
-
         user_data = await state.get_data()
         selected_date = user_data.get('filter_date')
 
         if not selected_date:
-            await callback.message.answer("❌ Ошибка: дата не выбрана. Начните заново.")
+            await edit_with_menu(callback, "❌ Ошибка: дата не выбрана. Начните заново.")
             await state.clear()
             await callback.answer()
             return
 
-        if callback.data == "filter_type_all":
-            booking_type = None
-            display_type = "Все типы"
-        else:
-            booking_type = callback.data.replace("filter_type_", "")
-            display_type = booking_type
+        booking_type = BOOKING_TYPES_BY_ID.get(callback_data.type_id)
+        display_type = booking_type or "Все типы"
 
         # Получаем бронирования для выбранной даты и типа
         bookings = await db.get_bookings_by_date_and_type(selected_date, booking_type)
 
         if not bookings:
             from helpers import format_date_display
-            await callback.message.answer(
+            await edit_with_menu(
+                callback,
                 f"📭 На {format_date_display(selected_date)} для типа '{display_type}' бронирований не найдено."
             )
             await state.clear()
@@ -211,29 +229,23 @@ async def process_filter_type(callback: CallbackQuery, state: FSMContext):
         unique_users = len(set(booking['user_id'] for booking in bookings))
         response += f"📊 *Статистика:* {total_bookings} бронирований, {unique_users} пользователей"
 
-        from keyboards import get_main_menu_keyboard
-        await callback.message.answer(response, parse_mode="Markdown")
-        await callback.message.answer(
-            "🏠 Главное меню:",
-            reply_markup=get_main_menu_keyboard(callback.from_user.id)
-        )
+        await edit_with_menu(callback, response, parse_mode="Markdown")
         await state.clear()
         await callback.answer()
 
     except Exception as e:
         logger.error(f"Error in process_filter_type: {e}")
-        await callback.message.answer("❌ Ошибка при отображении бронирований.")
+        await edit_with_menu(callback, "❌ Ошибка при отображении бронирований.")
         await state.clear()
+        await callback.answer()
 
 
 def register_view_bookings_handlers(dp: Dispatcher):
     """Регистрация обработчиков"""
     dp.callback_query.register(start_view_bookings_filter, F.data == "view_bookings_filter")
-    dp.callback_query.register(process_filter_week, ViewBookingsStates.waiting_for_filter_week,
-                               F.data.startswith("filter_week_"))
-    dp.callback_query.register(process_filter_date, ViewBookingsStates.waiting_for_filter_date,
-                               F.data.startswith("filter_date_"))
-    dp.callback_query.register(process_filter_type, ViewBookingsStates.waiting_for_filter_type,
-                               F.data.startswith("filter_type_"))
+    callback_router = dp["callback_router"]
+    callback_router.register(FilterWeek, process_filter_week)
+    callback_router.register(FilterDate, process_filter_date)
+    callback_router.register(FilterType, process_filter_type)
 
 
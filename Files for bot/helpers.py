@@ -1,6 +1,8 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import calendar
 
+from booking_calendar import BookingCalendar, format_date
+
 WORKING_HOURS = {
     'mon-thu': {'start': 18, 'end': 23},
     'fri': {'start': 17, 'end': 23},
@@ -10,76 +12,32 @@ WORKING_HOURS = {
 
 def get_available_weeks():
     """Возвращает список доступных недель для бронирования (4 недели)"""
-    today = datetime.now().date()
-    weeks = []
-
-    for week_offset in range(0, 4):  # 4 недели вперед
-        start_date, end_date = get_week_range(week_offset)
-        # Проверяем, что неделя не в прошлом
-        if end_date >= today:
-            weeks.append({
-                'offset': week_offset,
-                'start_date': start_date,
-                'end_date': end_date,
-                'display': format_week_display(week_offset)
-            })
-
-    return weeks
+    return booking_calendar.available_weeks()
 
 
 def get_week_dates(week_offset=0):
     """Возвращает даты для указанной недели (исключая воскресенья)"""
-    start_date, end_date = get_week_range(week_offset)
-    today = datetime.now().date()
-
-    dates = []
-    current = start_date
+    return booking_calendar.week_dates(week_offset)
 
-    while current <= end_date:
-        # Исключаем воскресенья и даты в прошлом
-        if current.weekday() != 6 and current >= today:
-            dates.append(current)
-        current += timedelta(days=1)
 
-    return dates
+def get_week_days(week_offset=0):
+    """Возвращает дни недели с готовыми подписями для кнопок ('date', 'display', 'working_hours')"""
+    return booking_calendar.week_days(week_offset)
 
 
 def get_week_range(week_offset=0):
     """Возвращает диапазон дат для указанной недели (пн-сб)"""
-    today = datetime.now().date()
-
-    # Находим понедельник текущей недели
-    current_weekday = today.weekday()
-    monday = today - timedelta(days=current_weekday)
-
-    # Смещаем на нужное количество недель
-    start_date = monday + timedelta(weeks=week_offset)
-    end_date = start_date + timedelta(days=5)  # до субботы
-
-    return start_date, end_date
+    return booking_calendar.week_range(week_offset)
 
 
 def format_date_display(date):
     """Форматирует дату для отображения"""
-    days_ru = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-    months_ru = ['янв', 'фев', 'мар', 'апр', 'май', 'июн',
-                 'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
-
-    day_name = days_ru[date.weekday()]
-    return f"{day_name}, {date.day} {months_ru[date.month - 1]}"
+    return format_date(date)
 
 
 def format_week_display(week_offset=0):
     """Форматирует отображение недели"""
-    start_date, end_date = get_week_range(week_offset)
-
-    months_ru = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
-                 'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
-
-    if start_date.month == end_date.month:
-        return f"{start_date.day}-{end_date.day} {months_ru[start_date.month - 1]}"
-    else:
-        return f"{start_date.day} {months_ru[start_date.month - 1]} - {end_date.day} {months_ru[end_date.month - 1]}"
+    return booking_calendar.week_display(week_offset)
 
 
 def is_working_day(date):
@@ -157,6 +115,26 @@ def get_available_end_times(date, start_time):
     return available_durations
 
 
+def get_available_start_hours(date):
+    """Возвращает диапазон часов начала брони для даты (для сегодня - без прошедших часов)"""
+    working_hours = get_working_hours_for_date(date)
+    if not working_hours:
+        return range(0)
+
+    start_hour = working_hours['start']
+    now = datetime.now()
+    if date == now.date():
+        # Текущий час доступен, только если он еще не начался
+        next_hour = now.hour + (1 if now.minute > 0 else 0)
+        start_hour = max(start_hour, next_hour)
+
+    return range(start_hour, working_hours['end'])
+
+
 def get_current_datetime():
     """Возвращает текущие дату и время"""
-    return datetime.now()
\ No newline at end of file
+    return datetime.now()
+
+
+# Окно бронирования пересобирается раз в сутки (при смене локальной даты)
+booking_calendar = BookingCalendar(working_hours=get_working_hours_for_date)
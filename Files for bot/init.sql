@@ -1,3 +1,6 @@
+-- Расширение для GiST-индекса по (booking_type, slot)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Создание таблицы пользователей
 CREATE TABLE IF NOT EXISTS users (
     user_id BIGINT PRIMARY KEY,
@@ -16,15 +19,22 @@ CREATE TABLE IF NOT EXISTS bookings (
     start_time TIME NOT NULL,
     end_time TIME NOT NULL,
     status TEXT DEFAULT 'active',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Интервал брони (дата + время) для проверки пересечений оператором &&
+    slot TSRANGE GENERATED ALWAYS AS (
+        tsrange(booking_date + start_time, booking_date + end_time, '[)')
+    ) STORED
 );
 
--- Индексы для оптимизации
-CREATE INDEX IF NOT EXISTS idx_bookings_user_id ON bookings(user_id);
-CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(status);
-CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(booking_date);
-CREATE INDEX IF NOT EXISTS idx_bookings_type ON bookings(booking_type);
-CREATE INDEX IF NOT EXISTS idx_bookings_user_type_date ON bookings(user_id, booking_type, booking_date);
-CREATE INDEX IF NOT EXISTS idx_bookings_date_status ON bookings(booking_date, status);
-
--
\ No newline at end of file
+-- Индексы для оптимизации (частичные - по активным бронированиям, см. migrations/)
+CREATE INDEX IF NOT EXISTS idx_bookings_user_history ON bookings(user_id, booking_date DESC, start_time DESC);
+CREATE INDEX IF NOT EXISTS idx_bookings_active_user_date ON bookings(user_id, booking_date, start_time)
+    WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_bookings_active_date_type ON bookings(booking_date, booking_type, start_time)
+    WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_bookings_type_slot ON bookings USING gist (booking_type, slot)
+    WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_bookings_active_end ON bookings((upper(slot)))
+    WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_bookings_created ON bookings(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at DESC, user_id DESC);
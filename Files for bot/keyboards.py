@@ -1,5 +1,12 @@
+from functools import lru_cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from helpers import get_available_weeks, get_week_dates, format_date_display, format_week_display
+from helpers import get_available_weeks, get_week_days, format_date_display, booking_calendar
+from booking_calendar import DAYS_RU
+from callbacks import (
+    BookingWeek, BookingDate, BookingType, BookingTime, BookingDuration, BookingBack, CancelBooking,
+    WaitlistJoin, RecurringType, RecurringWeekday, RecurringTime, RecurringDuration, BOOKING_TYPE_IDS, BACK_TO_DATE, BACK_TO_TYPE, BACK_TO_TIME
+)
 
 BOOKING_TYPES = [
     "Лекторий",
@@ -9,7 +16,12 @@ BOOKING_TYPES = [
 
 ADMINS = [123456789]
 
+# Клавиатуры, которые зависят только от небольшого набора параметров, строятся один
+# раз и переиспользуются (lru_cache). Возвращаемые объекты общие - их нельзя изменять.
+# Клавиатуры, зависящие от даты, кэшируются по текущему дню и меняются в полночь.
+
 
+@lru_cache(maxsize=None)
 def get_student_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -21,6 +33,11 @@ def get_student_keyboard():
 
 def get_weeks_keyboard():
     """Клавиатура для выбора недели"""
+    return _weeks_keyboard(booking_calendar.today())
+
+
+@lru_cache(maxsize=4)
+def _weeks_keyboard(today):
     weeks = get_available_weeks()
     buttons = []
 
@@ -33,7 +50,7 @@ def get_weeks_keyboard():
         buttons.append([
             InlineKeyboardButton(
                 text=display_text,
-                callback_data=f"select_week_{week['offset']}"
+                callback_data=BookingWeek(offset=week['offset']).pack()
             )
         ])
 
@@ -44,41 +61,43 @@ def get_weeks_keyboard():
 
 def get_week_dates_keyboard(week_offset):
     """Клавиатура с датами выбранной недели"""
-    dates = get_week_dates(week_offset)
+    return _week_dates_keyboard(booking_calendar.today(), week_offset)
+
+
+@lru_cache(maxsize=16)
+def _week_dates_keyboard(today, week_offset):
+    days = get_week_days(week_offset)
     buttons = []
 
     # Группируем даты по 3 в строке
-    for i in range(0, len(dates), 3):
-        row = []
-        for j in range(3):
-            if i + j < len(dates):
-                date = dates[i + j]
-                button_text = format_date_display(date)
-                callback_data = f"select_date_{date.strftime('%Y-%m-%d')}"
-                row.append(InlineKeyboardButton(text=button_text, callback_data=callback_data))
-        if row:
-            buttons.append(row)
+    for i in range(0, len(days), 3):
+        row = [
+            InlineKeyboardButton(text=day['display'], callback_data=BookingDate(day=day['date']).pack())
+            for day in days[i:i + 3]
+        ]
+        buttons.append(row)
 
     buttons.append([InlineKeyboardButton(text="🔙 Назад к выбору недели", callback_data="book_now")])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_booking_type_keyboard():
     """Клавиатура с 3 типами бронирования"""
     buttons = [
-        [KeyboardButton(text="Лекторий")],
-        [KeyboardButton(text="Плейстейшн")],
-        [KeyboardButton(text="Компьютеры")],
-        [KeyboardButton(text="🔙 Назад к выбору даты")]
+        [InlineKeyboardButton(text=booking_type,
+                              callback_data=BookingType(type_id=BOOKING_TYPE_IDS[booking_type]).pack())]
+        for booking_type in BOOKING_TYPES
     ]
+    buttons.append([
+        InlineKeyboardButton(text="🔙 Назад к выбору даты", callback_data=BookingBack(step=BACK_TO_DATE).pack())
+    ])
 
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True
-    )
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_contact_keyboard():
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -91,12 +110,18 @@ def get_contact_keyboard():
 
 def get_main_menu_keyboard(user_id):
     """Главное меню с учетом прав администратора"""
+    return _main_menu_keyboard(user_id in ADMINS)
+
+
+@lru_cache(maxsize=2)
+def _main_menu_keyboard(is_admin):
     buttons = [
         [
             InlineKeyboardButton(text="📅 Забронировать", callback_data="book_now"),
             InlineKeyboardButton(text="📋 Мои брони", callback_data="view_my_bookings")
         ],
         [
+            InlineKeyboardButton(text="🔁 Регулярная бронь", callback_data="book_recurring"),
             InlineKeyboardButton(text="❌ Отменить бронь", callback_data="cancel_booking")
         ],
         [
@@ -109,7 +134,7 @@ def get_main_menu_keyboard(user_id):
     ]
 
     # Добавляем кнопку администраторов
-    if user_id in ADMINS:
+    if is_admin:
         buttons.append([
             InlineKeyboardButton(text="⚙️ Администратор", callback_data="admin_panel")
         ])
@@ -117,6 +142,7 @@ def get_main_menu_keyboard(user_id):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_profile_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -129,6 +155,7 @@ def get_profile_keyboard():
     ])
 
 
+@lru_cache(maxsize=None)
 def get_admin_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -139,22 +166,34 @@ def get_admin_keyboard():
             InlineKeyboardButton(text="📋 Все бронирования", callback_data="admin_all_bookings"),
             InlineKeyboardButton(text="🗑️ Очистить старые", callback_data="admin_cleanup")
         ],
+        [
+            InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast"),
+            InlineKeyboardButton(text="🔧 Техработы вкл/выкл", callback_data="admin_maintenance")
+        ],
         [
             InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_main")
         ]
     ])
 
 
-def get_cancel_booking_keyboard(bookings):
-    from helpers import format_date_display
+@lru_cache(maxsize=None)
+def get_broadcast_confirm_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Отправить всем", callback_data="broadcast_confirm"),
+            InlineKeyboardButton(text="❌ Отмена", callback_data="broadcast_cancel")
+        ]
+    ])
 
+
+def get_cancel_booking_keyboard(bookings):
     buttons = []
     for booking in bookings:
         display_date = format_date_display(booking['booking_date'])
         buttons.append([
             InlineKeyboardButton(
                 text=f"{booking['booking_type']} - {display_date} {booking['start_time']}",
-                callback_data=f"cancel_{booking['id']}"
+                callback_data=CancelBooking(booking_id=booking['id']).pack()
             )
         ])
     buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")])
@@ -162,53 +201,126 @@ def get_cancel_booking_keyboard(bookings):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_back_to_main_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_main")]
     ])
 
 
-def get_time_keyboard(available_times):
+def _time_button_text(hour, free_seats, occupied):
+    if free_seats is not None:
+        return f"⛔ {hour:02d}:00" if free_seats == 0 else f"{hour:02d}:00 · {free_seats}"
+    if occupied:
+        return f"{hour:02d}:00 👥{occupied}"
+    return f"{hour:02d}:00"
+
+
+@lru_cache(maxsize=256)
+def get_time_keyboard(start_hour, end_hour, free_seats=None, occupied=None):
+    """Сетка времени начала с start_hour до end_hour (не включая)
+
+    free_seats - кортеж свободных мест по часам (для типов с ограниченной вместимостью),
+    occupied - кортеж числа броней по часам (для остальных типов).
+    """
+    hours = list(range(start_hour, end_hour))
+    free_seats = free_seats or (None,) * len(hours)
+    occupied = occupied or (0,) * len(hours)
     buttons = []
 
-    for i in range(0, len(available_times), 4):
-        row = []
-        for j in range(4):
-            if i + j < len(available_times):
-                row.append(KeyboardButton(text=available_times[i + j]))
-        if row:
-            buttons.append(row)
+    for i in range(0, len(hours), 4):
+        buttons.append([
+            InlineKeyboardButton(
+                text=_time_button_text(hour, free_seats[j], occupied[j]),
+                callback_data=BookingTime(hour=hour).pack()
+            )
+            for j, hour in enumerate(hours[i:i + 4], start=i)
+        ])
 
-    buttons.append([KeyboardButton(text="🔙 Назад к выбору типа")])
+    buttons.append([
+        InlineKeyboardButton(text="🔙 Назад к выбору типа", callback_data=BookingBack(step=BACK_TO_TYPE).pack())
+    ])
 
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True
-    )
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
 def get_duration_keyboard(available_durations):
     """Клавиатура для выбора длительности бронирования"""
+    return _duration_keyboard(max(available_durations))
+
+
+@lru_cache(maxsize=16)
+def _duration_keyboard(max_duration):
+    available_durations = list(range(1, max_duration + 1))
     buttons = []
 
     # Группируем длительности по 3 в строке
     for i in range(0, len(available_durations), 3):
-        row = []
-        for j in range(3):
-            if i + j < len(available_durations):
-                hours = available_durations[i + j]
-                row.append(KeyboardButton(text=f"{hours} час(а)"))
-        if row:
-            buttons.append(row)
+        buttons.append([
+            InlineKeyboardButton(text=f"{hours} час(а)", callback_data=BookingDuration(hours=hours).pack())
+            for hours in available_durations[i:i + 3]
+        ])
 
-    buttons.append([KeyboardButton(text="🔙 Назад к выбору времени")])
+    buttons.append([
+        InlineKeyboardButton(text="🔙 Назад к выбору времени", callback_data=BookingBack(step=BACK_TO_TIME).pack())
+    ])
 
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True
-    )
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@lru_cache(maxsize=None)
+def get_recurring_type_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=booking_type, callback_data=RecurringType(type_id=type_id).pack())]
+        for booking_type, type_id in BOOKING_TYPE_IDS.items()
+    ] + [[InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_main")]])
+
+
+@lru_cache(maxsize=None)
+def get_recurring_weekday_keyboard():
+    # Воскресенье - выходной
+    buttons = [
+        InlineKeyboardButton(text=DAYS_RU[weekday], callback_data=RecurringWeekday(weekday=weekday).pack())
+        for weekday in range(6)
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        buttons[:3],
+        buttons[3:],
+        [InlineKeyboardButton(text="🔙 Назад к выбору типа", callback_data="book_recurring")]
+    ])
+
+
+@lru_cache(maxsize=16)
+def get_recurring_time_keyboard(start_hour, end_hour):
+    buttons = [
+        InlineKeyboardButton(text=f"{hour:02d}:00", callback_data=RecurringTime(hour=hour).pack())
+        for hour in range(start_hour, end_hour)
+    ]
+    rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    rows.append([InlineKeyboardButton(text="🔙 Назад к выбору типа", callback_data="book_recurring")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@lru_cache(maxsize=16)
+def get_recurring_duration_keyboard(max_duration):
+    buttons = [
+        InlineKeyboardButton(text=f"{hours} час(а)", callback_data=RecurringDuration(hours=hours).pack())
+        for hours in range(1, max_duration + 1)
+    ]
+    rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    rows.append([InlineKeyboardButton(text="🔙 Назад к выбору типа", callback_data="book_recurring")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@lru_cache(maxsize=16)
+def get_waitlist_keyboard(hours):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📝 Встать в лист ожидания", callback_data=WaitlistJoin(hours=hours).pack())],
+        [InlineKeyboardButton(text="🔙 Назад к выбору времени", callback_data=BookingBack(step=BACK_TO_TIME).pack())]
+    ])
 
 
+@lru_cache(maxsize=None)
 def get_yes_no_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -218,6 +330,7 @@ def get_yes_no_keyboard():
     ])
 
 
+@lru_cache(maxsize=None)
 def get_join_decision_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -0,0 +1,80 @@
+import json
+import logging
+
+from aiogram import BaseMiddleware
+from aiogram.types import ReplyKeyboardRemove
+
+from keyboards import ADMINS
+
+logger = logging.getLogger(__name__)
+
+# Канал и ключ настройки в bot_settings (migrations/010)
+SETTINGS_CHANNEL = 'bot_settings'
+MAINTENANCE_KEY = 'maintenance'
+
+# Сообщение о технических работах
+MAINTENANCE_MESSAGE = """
+🔧 *Бот временно не работает*
+
+В настоящее время проводятся технические работы.
+Приносим извинения за временные неудобства.
+
+⏰ *Примерное время восстановления:*
+уточняется
+
+📞 *По всем вопросам обращайтесь к администраторам.*
+"""
+
+MAINTENANCE_ALERT = "🔧 Бот временно не работает: идут технические работы. Попробуйте позже."
+
+
+class MaintenanceMiddleware(BaseMiddleware):
+    """Режим техработ внутри основного бота
+
+    Подключается как outer-middleware обновлений. Флаг хранится в памяти, поэтому
+    проверка каждого обновления не обращается к базе; источник флага - настройка
+    maintenance в bot_settings, изменения которой приходят через LISTEN/NOTIFY
+    (Database.subscribe). Администраторы (ADMINS) работают как обычно, остальным
+    бот отвечает сообщением о техработах. Состояния FSM не сбрасываются.
+    """
+
+    def __init__(self, db, admins=ADMINS):
+        self.db = db
+        self.admins = frozenset(admins)
+        self.enabled = False
+        self.refused = 0
+        db.subscribe(SETTINGS_CHANNEL, self.on_setting_notification, on_connect=self.refresh)
+
+    async def __call__(self, handler, event, data):
+        if not self.enabled:
+            return await handler(event, data)
+        user = data.get('event_from_user')
+        if user is not None and user.id in self.admins:
+            return await handler(event, data)
+
+        self.refused += 1
+        if event.message is not None:
+            await event.message.answer(MAINTENANCE_MESSAGE, parse_mode="Markdown", reply_markup=ReplyKeyboardRemove())
+        elif event.callback_query is not None:
+            await event.callback_query.answer(MAINTENANCE_ALERT, show_alert=True)
+        return None
+
+    def _apply(self, value):
+        enabled = value == 'on'
+        if enabled != self.enabled:
+            logger.warning(f"Maintenance mode {'enabled' if enabled else 'disabled'}")
+        self.enabled = enabled
+
+    async def refresh(self):
+        """Перечитывает флаг из базы (при подключении LISTEN)"""
+        self._apply(await self.db.get_setting(MAINTENANCE_KEY, 'off'))
+
+    def on_setting_notification(self, payload):
+        data = json.loads(payload)
+        if data['key'] == MAINTENANCE_KEY:
+            self._apply(data['value'])
+
+    async def set(self, enabled):
+        """Включает или выключает техработы на всех экземплярах"""
+        self._apply('on' if enabled else 'off')
+        await self.db.set_setting(MAINTENANCE_KEY, 'on' if enabled else 'off')
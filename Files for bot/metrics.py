@@ -0,0 +1,275 @@
+import functools
+import inspect
+import logging
+import os
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Порт HTTP-эндпоинта /metrics для Prometheus; не задан - метрики выключены
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PATH = '/metrics'
+
+# Методы Database, которые не измеряются: служебные и бесконечный цикл LISTEN
+UNTIMED_DB_METHODS = {'create_pool', 'ensure_pool', 'close', 'listen_notifications'}
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Метрики Prometheus бота в отдельном реестре
+
+    Обработчики (HandlerMetricsMiddleware), методы Database (instrument_database),
+    переходы FSM (MetricsStorage) и запросы к Bot API (BotApiMetricsMiddleware)
+    пишут сюда; run_metrics_server отдает реестр по METRICS_PATH.
+    """
+
+    def __init__(self, db):
+        # Требует пакет prometheus_client
+        from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+        self.db = db
+        self.registry = CollectorRegistry()
+        self.handler_seconds = Histogram(
+            'bot_handler_seconds', "Время обработчика", ['handler', 'status'], registry=self.registry
+        )
+        self.db_query_seconds = Histogram(
+            'bot_db_query_seconds', "Время метода Database", ['method', 'status'], registry=self.registry
+        )
+        self.db_rows = Histogram(
+            'bot_db_rows', "Строк вернул метод Database", ['method'], buckets=ROW_BUCKETS, registry=self.registry
+        )
+        self.db_pool_wait_seconds = Histogram(
+            'bot_db_pool_wait_seconds', "Ожидание соединения из пула", registry=self.registry
+        )
+        pool_size = Gauge('bot_db_pool_size', "Соединений в пуле", ['state'], registry=self.registry)
+        pool_size.labels('total').set_function(lambda: self._pool_size('get_size'))
+        pool_size.labels('idle').set_function(lambda: self._pool_size('get_idle_size'))
+        pool_size.labels('max').set_function(lambda: self._pool_size('get_max_size'))
+        self.fsm_transitions = Counter(
+            'bot_fsm_transitions', "Переходы в состояния FSM", ['state'], registry=self.registry
+        )
+        self.booking_events = Counter(
+            'bot_booking_events', "События броней", ['event', 'booking_type'], registry=self.registry
+        )
+        self.bot_api_seconds = Histogram(
+            'bot_api_request_seconds', "Время запроса к Bot API", ['method'], registry=self.registry
+        )
+        self.bot_api_errors = Counter(
+            'bot_api_errors', "Ошибки запросов к Bot API", ['method', 'error'], registry=self.registry
+        )
+        # Конец воронки: созданные брони по типам
+        db.add_listener(self.on_booking_event)
+
+    def _pool_size(self, getter):
+        pool = self.db.pool
+        return getattr(pool, getter)() if pool is not None else 0
+
+    def on_booking_event(self, event, booking):
+        self.booking_events.labels(event, booking['booking_type']).inc()
+
+    def render(self):
+        from prometheus_client import generate_latest
+        return generate_latest(self.registry)
+
+
+def create_metrics(db):
+    """Создает Metrics, если задан METRICS_PORT и установлен prometheus_client"""
+    if not METRICS_PORT:
+        return None
+    try:
+        return Metrics(db)
+    except ImportError:
+        logger.warning("METRICS_PORT is set but prometheus_client package is not installed, metrics are disabled")
+        return None
+
+
+async def run_metrics_server(metrics, host=METRICS_HOST, port=METRICS_PORT):
+    """Запускает HTTP-сервер с METRICS_PATH; возвращает runner для остановки"""
+    from prometheus_client import CONTENT_TYPE_LATEST
+
+    async def handle_metrics(request):
+        return web.Response(body=metrics.render(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint: http://{host}:{port}{METRICS_PATH}")
+    return runner
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время обработчиков сообщений и кнопок (inner-middleware)
+
+    Кнопки, которые проходят через CallbackRouter, учитываются по конечному
+    обработчику, а не по CallbackRouter.dispatch.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    @staticmethod
+    def handler_name(event, data):
+        callback = data['handler'].callback
+        callback_router = data.get('callback_router')
+        if callback_router is not None and callback == callback_router.dispatch:
+            callback = callback_router.resolve(event.data) or callback
+        return getattr(callback, '__name__', type(callback).__name__)
+
+    async def __call__(self, handler, event, data):
+        name = self.handler_name(event, data)
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            status = 'ok'
+            return result
+        finally:
+            self.metrics.handler_seconds.labels(name, status).observe(time.perf_counter() - started)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки запросов к Bot API
+
+    Подключается после RateLimitMiddleware: измеряется сам запрос, без
+    ожидания лимитов, каждый повтор после RetryAfter - отдельно.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, '__api_method__', type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.bot_api_errors.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            self.metrics.bot_api_seconds.labels(name).observe(time.perf_counter() - started)
+
+
+class MetricsStorage(BaseStorage):
+    """Хранилище FSM, которое считает переходы в состояния (воронка сценариев)
+
+    Все операции передаются исходному хранилищу без дополнительных запросов.
+    """
+
+    def __init__(self, storage, metrics):
+        self.storage = storage
+        self.metrics = metrics
+
+    async def set_state(self, key, state=None):
+        state_name = state.state if isinstance(state, State) else state
+        if state_name is not None:
+            self.metrics.fsm_transitions.labels(state_name).inc()
+        await self.storage.set_state(key, state)
+
+    async def get_state(self, key):
+        return await self.storage.get_state(key)
+
+    async def set_data(self, key, data):
+        await self.storage.set_data(key, data)
+
+    async def get_data(self, key):
+        return await self.storage.get_data(key)
+
+    async def update_data(self, key, data):
+        return await self.storage.update_data(key, data)
+
+    async def close(self):
+        await self.storage.close()
+
+
+class _TimedAcquire:
+    def __init__(self, context, histogram):
+        self._context = context
+        self._histogram = histogram
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        connection = await self._context.__aenter__()
+        self._histogram.observe(time.perf_counter() - started)
+        return connection
+
+    async def __aexit__(self, *exc_info):
+        return await self._context.__aexit__(*exc_info)
+
+
+class TimedPool:
+    """Пул asyncpg, который измеряет ожидание свободного соединения"""
+
+    def __init__(self, pool, histogram):
+        self._pool = pool
+        self._histogram = histogram
+
+    def acquire(self, *, timeout=None):
+        return _TimedAcquire(self._pool.acquire(timeout=timeout), self._histogram)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def _row_count(result):
+    """Число строк результата; None - для скалярных результатов
+
+    Словарь с ключами-строками - одна строка (get_user, итог reserve_booking),
+    словарь с другими ключами - набор строк (get_user_booking_types: {дата: типы}).
+    """
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    if isinstance(result, dict):
+        return 1 if all(isinstance(key, str) for key in result) and result else len(result)
+    if hasattr(result, 'keys'):
+        return 1
+    return None
+
+
+def _timed_method(method, name, metrics):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+            status = 'ok'
+        finally:
+            metrics.db_query_seconds.labels(name, status).observe(time.perf_counter() - started)
+        rows = _row_count(result)
+        if rows is not None:
+            metrics.db_rows.labels(name).observe(rows)
+        return result
+    return wrapper
+
+
+def instrument_database(db, metrics):
+    """Подменяет методы экземпляра Database на измеряемые и оборачивает пул в TimedPool"""
+    for name, method in inspect.getmembers(db, inspect.iscoroutinefunction):
+        if name.startswith('_') or name in UNTIMED_DB_METHODS:
+            continue
+        setattr(db, name, _timed_method(method, name, metrics))
+
+    create_pool = db.create_pool
+
+    @functools.wraps(create_pool)
+    async def create_timed_pool():
+        await create_pool()
+        db.pool = TimedPool(db.pool, metrics.db_pool_wait_seconds)
+
+    db.create_pool = create_timed_pool
+    if db.pool is not None and not isinstance(db.pool, TimedPool):
+        db.pool = TimedPool(db.pool, metrics.db_pool_wait_seconds)
@@ -0,0 +1,10 @@
+-- Интервальная колонка slot для существующих баз.
+-- ADD COLUMN ... STORED вычисляет значение для всех уже сохраненных строк.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS slot TSRANGE GENERATED ALWAYS AS (
+    tsrange(booking_date + start_time, booking_date + end_time, '[)')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_bookings_type_slot ON bookings USING gist (booking_type, slot)
+    WHERE status = 'active';
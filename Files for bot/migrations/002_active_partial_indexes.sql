@@ -0,0 +1,23 @@
+-- Почти все запросы Database фильтруют status = 'active', а таблица со временем
+-- состоит в основном из отмененных и завершенных броней. Заменяем пересекающиеся
+-- одноколоночные индексы частичными, совпадающими с предикатами и сортировкой запросов.
+DROP INDEX IF EXISTS idx_bookings_status;
+DROP INDEX IF EXISTS idx_bookings_type;
+DROP INDEX IF EXISTS idx_bookings_date;
+DROP INDEX IF EXISTS idx_bookings_date_status;
+DROP INDEX IF EXISTS idx_bookings_user_type_date;
+DROP INDEX IF EXISTS idx_bookings_user_id;
+
+-- get_user_bookings(active_only=False): история пользователя; заодно покрывает ON DELETE CASCADE
+CREATE INDEX IF NOT EXISTS idx_bookings_user_history
+    ON bookings (user_id, booking_date DESC, start_time DESC);
+
+-- get_user_bookings, has_booking_type_on_date, get_user_booking_types, reserve_booking
+CREATE INDEX IF NOT EXISTS idx_bookings_active_user_date
+    ON bookings (user_id, booking_date, start_time)
+    WHERE status = 'active';
+
+-- get_bookings_by_date_and_type, get_all_active_bookings, cleanup_expired_bookings
+CREATE INDEX IF NOT EXISTS idx_bookings_active_date_type
+    ON bookings (booking_date, booking_type, start_time)
+    WHERE status = 'active';
@@ -0,0 +1,5 @@
+-- Планировщик истечения броней ищет ближайшее время окончания активной брони
+-- и переводит в expired только брони, пересекшие эту границу.
+CREATE INDEX IF NOT EXISTS idx_bookings_active_end
+    ON bookings ((upper(slot)))
+    WHERE status = 'active';
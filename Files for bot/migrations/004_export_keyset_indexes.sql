@@ -0,0 +1,3 @@
+-- Keyset-пагинация и потоковая выгрузка для администратора идут по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_bookings_created ON bookings (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at DESC, user_id DESC);
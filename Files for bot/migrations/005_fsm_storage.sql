@@ -0,0 +1,9 @@
+-- Состояния FSM для запуска нескольких экземпляров бота (FSM_STORAGE=postgres)
+CREATE TABLE IF NOT EXISTS fsm_storage (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires ON fsm_storage (expires_at);
@@ -0,0 +1,22 @@
+-- Уведомления об изменении броней для индекса в памяти (booking_index.py).
+-- Каждый экземпляр бота слушает канал booking_changes и применяет чужие изменения.
+CREATE OR REPLACE FUNCTION notify_booking_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('booking_changes', json_build_object(
+        'id', NEW.id,
+        'user_id', NEW.user_id,
+        'booking_type', NEW.booking_type,
+        'booking_date', NEW.booking_date,
+        'start_time', NEW.start_time,
+        'end_time', NEW.end_time,
+        'status', NEW.status,
+        'full_name', (SELECT full_name FROM users WHERE user_id = NEW.user_id)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_notify_change ON bookings;
+CREATE TRIGGER bookings_notify_change
+    AFTER INSERT OR UPDATE OF status ON bookings
+    FOR EACH ROW EXECUTE FUNCTION notify_booking_change();
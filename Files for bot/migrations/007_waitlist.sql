@@ -0,0 +1,20 @@
+-- Лист ожидания: очередь на занятое время по (дата, тип, час начала), FIFO по id
+CREATE TABLE IF NOT EXISTS waitlist (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    booking_type TEXT NOT NULL,
+    booking_date DATE NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    -- waiting, promoted, cancelled (уже есть бронь этого типа), expired (время прошло)
+    status TEXT NOT NULL DEFAULT 'waiting',
+    booking_id INT REFERENCES bookings(id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_waitlist_waiting ON waitlist (booking_date, booking_type, id)
+    WHERE status = 'waiting';
+
+-- Одна заявка пользователя на тип и дату
+CREATE UNIQUE INDEX IF NOT EXISTS idx_waitlist_user_waiting ON waitlist (user_id, booking_date, booking_type)
+    WHERE status = 'waiting';
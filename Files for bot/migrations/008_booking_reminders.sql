@@ -0,0 +1,6 @@
+-- Состояние доставки напоминаний: время, когда напоминание о брони было взято в отправку.
+-- Частичный индекс по началу брони - для выборки ближайших неотправленных напоминаний.
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS reminder_sent_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_bookings_reminder_due ON bookings((lower(slot)))
+    WHERE status = 'active' AND reminder_sent_at IS NULL;
@@ -0,0 +1,22 @@
+-- Рассылки администраторов: курсор по user_id и счетчики сохраняются после каждой
+-- страницы получателей, чтобы после падения продолжить с того же места.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    text TEXT NOT NULL,
+    parse_mode TEXT,
+    created_by BIGINT,
+    -- running, done, cancelled
+    status TEXT NOT NULL DEFAULT 'running',
+    last_user_id BIGINT NOT NULL DEFAULT 0,
+    sent INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    blocked INT NOT NULL DEFAULT 0,
+    -- Экземпляр бота, который ведет рассылку, продлевает аренду на каждой странице
+    locked_until TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_broadcasts_running ON broadcasts (id) WHERE status = 'running';
@@ -0,0 +1,20 @@
+-- Общие настройки экземпляров бота (например, режим техработ).
+-- Изменение рассылается в канал bot_settings: экземпляры применяют его без перезапуска,
+-- в том числе при ручном UPDATE из psql.
+CREATE TABLE IF NOT EXISTS bot_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION notify_bot_setting_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('bot_settings', json_build_object('key', NEW.key, 'value', NEW.value)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bot_settings_notify_change ON bot_settings;
+CREATE TRIGGER bot_settings_notify_change
+    AFTER INSERT OR UPDATE ON bot_settings
+    FOR EACH ROW EXECUTE FUNCTION notify_bot_setting_change();
@@ -0,0 +1,61 @@
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Ключ advisory-блокировки, чтобы несколько экземпляров бота не применяли миграции одновременно
+MIGRATIONS_LOCK_KEY = 7_310_001
+
+MIGRATION_FILE_RE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Возвращает список миграций (версия, имя, путь), отсортированный по версии"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return sorted(migrations)
+
+
+async def apply_migrations(db, directory=MIGRATIONS_DIR):
+    """Применяет еще не примененные миграции (идемпотентно, каждая - в своей транзакции)"""
+    await db.ensure_pool()
+    applied_now = []
+
+    async with db.pool.acquire() as connection:
+        await connection.execute('SELECT pg_advisory_lock($1)', MIGRATIONS_LOCK_KEY)
+        try:
+            await connection.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            rows = await connection.fetch('SELECT version FROM schema_migrations')
+            applied = {row['version'] for row in rows}
+
+            for version, name, path in list_migrations(directory):
+                if version in applied:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    sql = f.read()
+
+                logger.info(f"Applying migration {version:03d}_{name}")
+                async with connection.transaction():
+                    await connection.execute(sql)
+                    await connection.execute(
+                        'INSERT INTO schema_migrations (version, name) VALUES ($1, $2)',
+                        version, name
+                    )
+                applied_now.append(version)
+        finally:
+            await connection.execute('SELECT pg_advisory_unlock($1)', MIGRATIONS_LOCK_KEY)
+
+    logger.info(f"Migrations are up to date (applied now: {applied_now or 'none'})")
+    return applied_now
@@ -0,0 +1,119 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from config import BOOKING_CAPACITY
+from helpers import get_working_hours_for_date
+
+load_dotenv()
+
+# Сколько секунд сетка загрузки считается актуальной. Свои изменения сбрасывают
+# кэш сразу, TTL ограничивает отставание от изменений других экземпляров бота.
+OCCUPANCY_CACHE_TTL = float(os.getenv('OCCUPANCY_CACHE_TTL', '30'))
+OCCUPANCY_CACHE_SIZE = int(os.getenv('OCCUPANCY_CACHE_SIZE', '256'))
+
+logger = logging.getLogger(__name__)
+
+
+class OccupancyEngine:
+    """Загрузка по часам для пары (дата, тип бронирования)
+
+    Сетка считается одним запросом Database.get_hourly_occupancy на все рабочие
+    часы дня и кэшируется; создание, отмена и истечение брони сбрасывают
+    запись через Database.add_listener.
+    """
+
+    def __init__(self, db, ttl=OCCUPANCY_CACHE_TTL, max_size=OCCUPANCY_CACHE_SIZE, capacity=BOOKING_CAPACITY):
+        self.db = db
+        self.ttl = ttl
+        self.max_size = max_size
+        self.capacity = capacity
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        db.add_listener(self.on_booking_event)
+
+    async def get_occupancy(self, booking_date, booking_type):
+        """{час: число активных броней} для рабочих часов даты"""
+        working_hours = get_working_hours_for_date(booking_date)
+        if not working_hours:
+            return {}
+
+        key = (booking_date, booking_type)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        occupancy = await self.db.get_hourly_occupancy(
+            booking_date, booking_type, working_hours['start'], working_hours['end']
+        )
+        self._cache[key] = (time.monotonic() + self.ttl, occupancy)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return occupancy
+
+    async def get_free_seats(self, booking_date, booking_type):
+        """{час: свободных мест}; None вместо числа - у типа нет ограничения вместимости"""
+        occupancy = await self.get_occupancy(booking_date, booking_type)
+        capacity = self.capacity.get(booking_type)
+        if capacity is None:
+            return {hour: None for hour in occupancy}
+        return {hour: max(0, capacity - occupied) for hour, occupied in occupancy.items()}
+
+    def invalidate(self, booking_date, booking_type):
+        if self._cache.pop((booking_date, booking_type), None) is not None:
+            self.invalidations += 1
+
+    def on_booking_event(self, event, booking):
+        self.invalidate(booking['booking_date'], booking['booking_type'])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+def _is_free(seats):
+    return seats is None or seats > 0
+
+
+def first_free_slot(free_seats, duration, from_hour=0):
+    """Первый час, с которого duration часов подряд есть свободное место (за один проход)
+
+    free_seats - сетка get_free_seats: часы идут подряд по возрастанию.
+    """
+    run_start = None
+    run_length = 0
+    for hour, seats in free_seats.items():
+        if hour < from_hour:
+            continue
+        if not _is_free(seats):
+            run_length = 0
+            continue
+        if run_length == 0:
+            run_start = hour
+        run_length += 1
+        if run_length >= duration:
+            return run_start
+    return None
+
+
+def free_run_length(free_seats, start_hour):
+    """Сколько часов подряд с start_hour есть свободное место"""
+    length = 0
+    while _is_free(free_seats.get(start_hour + length, 0)):
+        length += 1
+    return length
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from dotenv import load_dotenv
+
+from keyboards import get_main_menu_keyboard
+
+load_dotenv()
+
+# Лимиты Telegram: ~30 сообщений в секунду всего, ~1 в секунду в личный чат, 20 в минуту в группу
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+OUTBOUND_GROUP_RATE = float(os.getenv('OUTBOUND_GROUP_RATE', str(20 / 60)))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+MAIN_MENU_TEXT = "🏠 Главное меню:"
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity накопленных"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        # Блокировка сохраняет порядок ожидающих
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Ограничивает исходящие запросы к Bot API и повторяет их после RetryAfter
+
+    Ограничиваются только методы, адресованные чату (sendMessage,
+    editMessageText, sendDocument и т.п.); getUpdates и answerCallbackQuery
+    проходят без ожидания.
+    """
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                 chat_burst=OUTBOUND_CHAT_BURST, group_rate=OUTBOUND_GROUP_RATE,
+                 max_retries=OUTBOUND_MAX_RETRIES, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chat_buckets = {}
+        self.retries = 0
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_chats:
+                # Удаляем чаты, которые давно ничего не получали
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.is_full()
+                }
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Flood control on {type(method).__name__}, retry in {e.retry_after} s")
+                await asyncio.sleep(e.retry_after)
+
+
+async def answer_with_menu(message, text, user_id, parse_mode=None):
+    """Отправляет результат и главное меню одним сообщением"""
+    await message.answer(
+        f"{text}\n\n{MAIN_MENU_TEXT}",
+        parse_mode=parse_mode,
+        reply_markup=get_main_menu_keyboard(user_id)
+    )
+
+
+async def edit_or_answer(callback, text, reply_markup=None, parse_mode=None):
+    """Редактирует сообщение, на кнопку которого нажали; если нельзя - отправляет новое"""
+    try:
+        await callback.message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        # Повторное нажатие той же кнопки - сообщение уже в нужном виде
+        if "message is not modified" in str(e):
+            return
+        # Сообщение слишком старое, это документ и т.п.
+        logger.debug(f"edit_or_answer fallback to new message: {e}")
+        await callback.message.answer(text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+
+async def edit_with_menu(callback, text=None, parse_mode=None):
+    """Заменяет сообщение, на кнопку которого нажали, результатом с главным меню"""
+    full_text = f"{text}\n\n{MAIN_MENU_TEXT}" if text else MAIN_MENU_TEXT
+    await edit_or_answer(callback, full_text, get_main_menu_keyboard(callback.from_user.id), parse_mode)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from helpers import format_date_display
+from outbound import TokenBucket
+
+load_dotenv()
+
+# За сколько минут до начала брони напоминать
+REMINDER_LEAD_MINUTES = int(os.getenv('REMINDER_LEAD_MINUTES', '60'))
+REMINDER_POLL_INTERVAL = float(os.getenv('REMINDER_POLL_INTERVAL', '60'))
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '500'))
+REMINDER_WORKERS = int(os.getenv('REMINDER_WORKERS', '4'))
+# Доля общего лимита Bot API для напоминаний: остальное остается ответам пользователям
+REMINDER_RATE = float(os.getenv('REMINDER_RATE', '20'))
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderDispatcher:
+    """Напоминания о бронях, которые скоро начнутся
+
+    Раз в REMINDER_POLL_INTERVAL секунд одним запросом (Database.claim_due_reminders)
+    берет брони, начинающиеся в ближайшие REMINDER_LEAD_MINUTES минут, и
+    раскладывает их по очередям воркеров по user_id: сообщения одному
+    пользователю уходят по порядку, разным - параллельно. Все воркеры делят
+    один token bucket на REMINDER_RATE сообщений в секунду.
+    """
+
+    def __init__(self, db, bot, lead_minutes=REMINDER_LEAD_MINUTES, poll_interval=REMINDER_POLL_INTERVAL,
+                 batch_size=REMINDER_BATCH_SIZE, workers=REMINDER_WORKERS, rate=REMINDER_RATE):
+        self.db = db
+        self.bot = bot
+        self.lead_minutes = lead_minutes
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._queues = [asyncio.Queue() for _ in range(workers)]
+        self._limiter = TokenBucket(rate, rate)
+        self.claimed = 0
+        self.sent = 0
+        self.failed = 0
+
+    def shard(self, user_id):
+        return user_id % len(self._queues)
+
+    async def run_once(self):
+        """Один проход: взять ближайшие напоминания и дождаться их отправки"""
+        bookings = await self.db.claim_due_reminders(self.lead_minutes, self.batch_size)
+        self.claimed += len(bookings)
+        for booking in bookings:
+            self._queues[self.shard(booking['user_id'])].put_nowait(booking)
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+        if bookings:
+            logger.info(f"Reminders: {len(bookings)} claimed, {self.sent} sent, {self.failed} failed in total")
+        return len(bookings)
+
+    async def run(self):
+        workers = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        try:
+            while True:
+                try:
+                    claimed = await self.run_once()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in reminder dispatcher: {e}")
+                    claimed = 0
+                # Полная пачка - вероятно, есть еще: следующий проход сразу
+                if claimed < self.batch_size:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _worker(self, queue):
+        while True:
+            booking = await queue.get()
+            try:
+                await self._limiter.acquire()
+                await self.send(booking)
+            finally:
+                queue.task_done()
+
+    async def send(self, booking):
+        text = (
+            f"⏰ Напоминание: скоро начинается ваше бронирование\n\n"
+            f"🎯 Тип: {booking['booking_type']}\n"
+            f"📅 Дата: {format_date_display(booking['booking_date'])}\n"
+            f"🕒 Время: {booking['start_time'].strftime('%H:%M')} - {booking['end_time'].strftime('%H:%M')}\n\n"
+            f"Если планы изменились, отмените бронь, чтобы место досталось другим."
+        )
+        try:
+            await self.bot.send_message(booking['user_id'], text)
+            self.sent += 1
+        except Exception as e:
+            # Отметка уже стоит: повторной отправки не будет
+            self.failed += 1
+            logger.error(f"Error sending reminder for booking {booking['id']} to {booking['user_id']}: {e}")
+
+    def stats(self):
+        return {
+            'claimed': self.claimed,
+            'sent': self.sent,
+            'failed': self.failed,
+            'queued': sum(queue.qsize() for queue in self._queues)
+        }
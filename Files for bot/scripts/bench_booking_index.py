@@ -0,0 +1,89 @@
+"""Микробенчмарк индекса активных броней в памяти
+
+Заполняет BookingIndex окном бронирования (4 недели x 3 типа, --per-day броней
+в день на тип), сверяет ответы с прямым перебором и печатает время одного
+чтения для get_conflicting_bookings, get_bookings_by_date_and_type и
+has_booking_type_on_date.
+
+    python scripts/bench_booking_index.py --per-day 40 --reads 100000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_index import BookingIndex  # noqa: E402
+
+BOOKING_TYPES = ["Лекторий", "Плейстейшн", "Компьютеры"]
+
+
+def generate(per_day, start_day):
+    bookings = []
+    booking_id = 0
+    for offset in range(28):
+        day = start_day + timedelta(days=offset)
+        for booking_type in BOOKING_TYPES:
+            for _ in range(per_day):
+                booking_id += 1
+                start_hour = random.randrange(14, 23)
+                end_hour = random.randrange(start_hour + 1, 24)
+                bookings.append({
+                    'id': booking_id, 'user_id': random.randrange(1, 500), 'booking_type': booking_type,
+                    'booking_date': day, 'start_time': time(start_hour), 'end_time': time(end_hour),
+                    'status': 'active', 'full_name': f"User {booking_id}"
+                })
+    return bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--per-day', type=int, default=40)
+    parser.add_argument('--reads', type=int, default=100000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    start_day = date.today()
+    bookings = generate(args.per_day, start_day)
+    index = BookingIndex()
+    index.load(bookings)
+
+    # Сверка с перебором
+    for _ in range(1000):
+        day = start_day + timedelta(days=random.randrange(28))
+        booking_type = random.choice(BOOKING_TYPES)
+        start = time(random.randrange(14, 23))
+        end = time(random.randrange(start.hour + 1, 24))
+        expected = sorted(
+            b['id'] for b in bookings
+            if b['booking_date'] == day and b['booking_type'] == booking_type
+            and b['start_time'] < end and b['end_time'] > start
+        )
+        actual = sorted(b['id'] for b in index.get_conflicting_bookings(day, start, end, booking_type))
+        assert actual == expected, (day, booking_type, start, end)
+
+        user_id = random.randrange(1, 500)
+        expected_has = any(
+            b['user_id'] == user_id and b['booking_type'] == booking_type and b['booking_date'] == day
+            for b in bookings
+        )
+        assert index.has_booking_type_on_date(user_id, booking_type, day) == expected_has
+
+    day = start_day + timedelta(days=3)
+    calls = {
+        "get_conflicting_bookings": lambda: index.get_conflicting_bookings(day, time(18), time(21), "Компьютеры"),
+        "get_bookings_by_date_and_type (type)": lambda: index.get_bookings_by_date_and_type(day, "Компьютеры"),
+        "get_bookings_by_date_and_type (all)": lambda: index.get_bookings_by_date_and_type(day),
+        "has_booking_type_on_date": lambda: index.has_booking_type_on_date(42, "Компьютеры", day),
+    }
+    print(f"index: {index.stats()['bookings']} active bookings")
+    for label, call in calls.items():
+        seconds = timeit.timeit(call, number=args.reads)
+        print(f"{label:40s} {seconds / args.reads * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Микробенчмарк календаря: данные для одной отрисовки клавиатур недель и дат
+
+Сравнивает пересчет окна на каждый вызов (как было до BookingCalendar)
+с кэшированным окном, которое пересобирается раз в сутки.
+
+    python scripts/bench_calendar.py --renders 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_calendar import BookingCalendar  # noqa: E402
+from helpers import get_working_hours_for_date  # noqa: E402
+
+
+def render(calendar):
+    """То, что нужно клавиатурам: список недель и дни выбранной недели"""
+    weeks = calendar.available_weeks()
+    days = calendar.week_days(1)
+    return [week['display'] for week in weeks], [(day['display'], day['date']) for day in days]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--renders', type=int, default=20000)
+    args = parser.parse_args()
+
+    cached = BookingCalendar(working_hours=get_working_hours_for_date)
+    render(cached)
+
+    uncached_time = timeit.timeit(
+        lambda: render(BookingCalendar(working_hours=get_working_hours_for_date)), number=args.renders)
+    cached_time = timeit.timeit(lambda: render(cached), number=args.renders)
+
+    per_uncached = uncached_time / args.renders * 1e6
+    per_cached = cached_time / args.renders * 1e6
+    print(f"rebuild per render: {per_uncached:.2f} us")
+    print(f"cached per render:  {per_cached:.2f} us")
+    print(f"speedup: x{per_uncached / per_cached:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Микробенчмарк разбора данных inline-кнопок
+
+Сравнивает прежний способ (перебор фильтров startswith по порядку регистрации,
+затем replace/split и strptime в обработчике) с компактным форматом callbacks.py
+(один разбор и выбор обработчика по словарю). Печатает стоимость разбора одного
+обновления и размер данных кнопок.
+
+    python scripts/bench_callbacks.py --updates 200000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from callbacks import (  # noqa: E402
+    BookingWeek, BookingDate, BookingType, BookingTime, BookingDuration, BookingBack,
+    FilterWeek, FilterDate, FilterType, CancelBooking, BOOKING_TYPE_IDS, decode_callback
+)
+
+BOOKING_TYPES = list(BOOKING_TYPE_IDS)
+STEPS = ["date", "type", "time"]
+
+
+def legacy_payloads(day):
+    return [
+        f"select_week_{random.randrange(4)}",
+        f"select_date_{day.isoformat()}",
+        random.choice(BOOKING_TYPES),
+        f"{random.randrange(14, 23):02d}:00",
+        f"{random.randrange(1, 6)} час(а)",
+        f"back_{random.choice(STEPS)}",
+        f"filter_week_{random.randrange(4)}",
+        f"filter_date_{day.isoformat()}",
+        f"filter_type_{random.choice(BOOKING_TYPES)}",
+        f"cancel_{random.randrange(1, 10 ** 6)}",
+    ]
+
+
+def compact_payloads(day):
+    return [
+        BookingWeek(offset=random.randrange(4)).pack(),
+        BookingDate(day=day).pack(),
+        BookingType(type_id=random.choice(list(BOOKING_TYPE_IDS.values()))).pack(),
+        BookingTime(hour=random.randrange(14, 23)).pack(),
+        BookingDuration(hours=random.randrange(1, 6)).pack(),
+        BookingBack(step=random.randrange(1, 4)).pack(),
+        FilterWeek(offset=random.randrange(4)).pack(),
+        FilterDate(day=day).pack(),
+        FilterType(type_id=random.randrange(4)).pack(),
+        CancelBooking(booking_id=random.randrange(1, 10 ** 6)).pack(),
+    ]
+
+
+# Прежняя маршрутизация: фильтры проверяются по очереди, обработчик разбирает строку сам
+LEGACY_ROUTES = [
+    (lambda data: data == "book_now", lambda data: None),
+    (lambda data: data.startswith("select_week_"), lambda data: int(data.replace("select_week_", ""))),
+    (lambda data: data.startswith("select_date_"),
+     lambda data: datetime.strptime(data.replace("select_date_", ""), '%Y-%m-%d').date()),
+    (lambda data: data in BOOKING_TYPES, lambda data: data),
+    (lambda data: data.startswith("back_"), lambda data: data.split("_")[1]),
+    (lambda data: data.startswith("filter_week_"), lambda data: int(data.replace("filter_week_", ""))),
+    (lambda data: data.startswith("filter_date_"),
+     lambda data: datetime.strptime(data.replace("filter_date_", ""), '%Y-%m-%d').date()),
+    (lambda data: data.startswith("filter_type_"), lambda data: data.replace("filter_type_", "")),
+    (lambda data: data.startswith("cancel_"), lambda data: int(data.split("_")[1])),
+    (lambda data: ":" in data, lambda data: datetime.strptime(data, "%H:%M").time()),
+    (lambda data: data.endswith("час(а)"), lambda data: int(''.join(filter(str.isdigit, data)))),
+]
+
+
+def legacy_route(data):
+    for matches, parse in LEGACY_ROUTES:
+        if matches(data):
+            return parse(data)
+    return None
+
+
+COMPACT_ROUTES = {
+    cls: cls for cls in (BookingWeek, BookingDate, BookingType, BookingTime, BookingDuration, BookingBack,
+                         FilterWeek, FilterDate, FilterType, CancelBooking)
+}
+
+
+def compact_route(data):
+    callback_data = decode_callback(data)
+    return COMPACT_ROUTES[type(callback_data)], callback_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=200000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    day = date.today() + timedelta(days=3)
+    legacy = [payload for _ in range(100) for payload in legacy_payloads(day)]
+    compact = [payload for _ in range(100) for payload in compact_payloads(day)]
+    # Каждый компактный формат должен разбираться обратно
+    assert all(compact_route(payload) for payload in compact)
+
+    rounds = max(1, args.updates // len(legacy))
+    legacy_time = timeit.timeit(lambda: [legacy_route(payload) for payload in legacy], number=rounds)
+    compact_time = timeit.timeit(lambda: [compact_route(payload) for payload in compact], number=rounds)
+
+    updates = rounds * len(legacy)
+    per_legacy = legacy_time / updates * 1e6
+    per_compact = compact_time / updates * 1e6
+    print(f"legacy parse per update:  {per_legacy:.2f} us")
+    print(f"compact parse per update: {per_compact:.2f} us")
+    print(f"speedup: x{per_legacy / per_compact:.1f}")
+
+    legacy_bytes = [len(payload.encode()) for payload in legacy]
+    compact_bytes = [len(payload.encode()) for payload in compact]
+    print(f"legacy payload bytes:  avg {sum(legacy_bytes) / len(legacy_bytes):.1f}, max {max(legacy_bytes)}")
+    print(f"compact payload bytes: avg {sum(compact_bytes) / len(compact_bytes):.1f}, max {max(compact_bytes)}")
+
+
+if __name__ == "__main__":
+    main()
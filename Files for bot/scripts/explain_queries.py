@@ -0,0 +1,228 @@
+"""EXPLAIN (ANALYZE, BUFFERS) для каждого запроса Database
+
+Скрипт заполняет базу синтетическими данными внутри транзакции, вызывает
+методы Database через прокси-соединение, которое перед каждым запросом
+печатает его план, и в конце откатывает транзакцию. EXPLAIN ANALYZE
+выполняет запрос, поэтому план снимается в точке сохранения, которая
+откатывается, а методы, изменяющие данные, целиком выполняются в своей
+точке сохранения: следующие запросы измеряются на исходных данных.
+Каждый новый метод Database с запросом добавляется в список calls.
+
+    python scripts/explain_queries.py --users 2000 --bookings 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from migrator import apply_migrations  # noqa: E402
+
+BOOKING_TYPES = ["Лекторий", "Плейстейшн", "Компьютеры"]
+
+
+class ExplainConnection:
+    """Обертка над соединением: печатает план запроса и затем выполняет его"""
+
+    def __init__(self, connection, label):
+        self._connection = connection
+        self._label = label
+
+    async def _explain(self, query, args):
+        if query.lstrip().upper().startswith(('SELECT PG_ADVISORY', 'SELECT PG_NOTIFY')):
+            return
+        savepoint = self._connection.transaction()
+        await savepoint.start()
+        try:
+            plan = await self._connection.fetch(f'EXPLAIN (ANALYZE, BUFFERS) {query}', *args)
+        finally:
+            await savepoint.rollback()
+        print(f"\n=== {self._label} ===")
+        print("\n".join(row[0] for row in plan))
+
+    async def fetch(self, query, *args):
+        await self._explain(query, args)
+        return await self._connection.fetch(query, *args)
+
+    async def fetchrow(self, query, *args):
+        await self._explain(query, args)
+        return await self._connection.fetchrow(query, *args)
+
+    async def fetchval(self, query, *args):
+        await self._explain(query, args)
+        return await self._connection.fetchval(query, *args)
+
+    async def execute(self, query, *args):
+        await self._explain(query, args)
+        return await self._connection.execute(query, *args)
+
+    async def copy_from_query(self, query, *args, **kwargs):
+        await self._explain(query, args)
+        return await self._connection.copy_from_query(query, *args, **kwargs)
+
+    def transaction(self):
+        return self._connection.transaction()
+
+
+class ExplainPool:
+    """Пул, который всегда выдает одно соединение внутри общей транзакции"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.label = ''
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield ExplainConnection(self._connection, self.label)
+
+
+async def seed(connection, users, bookings):
+    """Синтетические данные: большая часть броней - прошедшие (expired/cancelled)"""
+    await connection.execute('''
+        INSERT INTO users (user_id, full_name, phone, is_student)
+        SELECT 8000000000 + g, 'User ' || g, '+7000' || g, g % 2 = 0
+        FROM generate_series(1, $1) g
+    ''', users)
+    await connection.execute('''
+        INSERT INTO bookings (user_id, booking_type, booking_date, start_time, end_time, status)
+        SELECT
+            8000000000 + 1 + (g % $1),
+            ($3::text[])[1 + g % 3],
+            CURRENT_DATE - 1000 + (g % 1028),
+            make_time(14 + g % 6, 0, 0),
+            make_time(15 + g % 6 + g % 3, 0, 0),
+            CASE
+                WHEN CURRENT_DATE - 1000 + (g % 1028) >= CURRENT_DATE THEN 'active'
+                WHEN g % 5 = 0 THEN 'cancelled'
+                ELSE 'expired'
+            END
+        FROM generate_series(1, $2) g
+    ''', users, bookings, BOOKING_TYPES)
+    # Лист ожидания: четверть заявок еще ждет, остальные уже обработаны
+    await connection.execute('''
+        INSERT INTO waitlist (user_id, booking_type, booking_date, start_time, end_time, status)
+        SELECT
+            8000000000 + 1 + (g % $1),
+            ($3::text[])[1 + g % 3],
+            CURRENT_DATE + (g % 28),
+            make_time(18 + g % 4, 0, 0),
+            make_time(19 + g % 4, 0, 0),
+            CASE WHEN g % 4 = 0 THEN 'waiting' ELSE 'promoted' END
+        FROM generate_series(1, $2) g
+        ON CONFLICT DO NOTHING
+    ''', users, bookings // 10, BOOKING_TYPES)
+    await connection.execute('''
+        INSERT INTO broadcasts (text, status, last_user_id, finished_at)
+        SELECT 'Broadcast ' || g, 'done', 8000000000 + $1, LOCALTIMESTAMP
+        FROM generate_series(1, 1000) g
+    ''', users)
+    broadcast_id = await connection.fetchval(
+        "INSERT INTO broadcasts (text) VALUES ('Running broadcast') RETURNING id"
+    )
+    await connection.execute('''
+        INSERT INTO bot_settings (key, value) VALUES ('maintenance', 'off')
+        ON CONFLICT (key) DO NOTHING
+    ''')
+    for table in ('users', 'bookings', 'waitlist', 'broadcasts', 'bot_settings'):
+        await connection.execute(f'ANALYZE {table}')
+    return broadcast_id
+
+
+async def run(users, bookings):
+    db = Database()
+    await db.create_pool()
+    await apply_migrations(db)
+    real_pool = db.pool
+
+    try:
+        async with real_pool.acquire() as connection:
+            transaction = connection.transaction()
+            await transaction.start()
+            try:
+                broadcast_id = await seed(connection, users, bookings)
+                pool = ExplainPool(connection)
+                db.pool = pool
+
+                user_id = 8000000001
+                day = date.today() + timedelta(days=1)
+                start, end = time(18, 0), time(20, 0)
+                booking_type = "Компьютеры"
+                recurring_days = [day + timedelta(weeks=week) for week in range(4)]
+
+                # (метка, вызов, изменяет ли данные)
+                calls = [
+                    ("get_user", db.get_user(user_id), False),
+                    ("get_bookings_by_date_and_type (type)",
+                     db.get_bookings_by_date_and_type(day, booking_type), False),
+                    ("get_bookings_by_date_and_type (all)", db.get_bookings_by_date_and_type(day), False),
+                    ("add_user", db.add_user(user_id, "User 1", "+70001", True), True),
+                    ("add_booking", db.add_booking(user_id, booking_type, day, start, end), True),
+                    ("reserve_booking", db.reserve_booking(user_id + 1, booking_type, day, start, end, 16), True),
+                    ("reserve_recurring",
+                     db.reserve_recurring(user_id + 1, booking_type, recurring_days, start, end, 16), True),
+                    ("get_user_bookings (active)", db.get_user_bookings(user_id, active_only=True), False),
+                    ("get_user_bookings (all)", db.get_user_bookings(user_id, active_only=False), False),
+                    ("get_all_active_bookings", db.get_all_active_bookings(), False),
+                    ("export_users_csv", db.export_users_csv(os.devnull), False),
+                    ("export_bookings_csv", db.export_bookings_csv(os.devnull), False),
+                    ("get_stats", db.get_stats(), False),
+                    ("get_booking_by_id", db.get_booking_by_id(1), False),
+                    ("has_booking_type_on_date", db.has_booking_type_on_date(user_id, booking_type, day), False),
+                    ("get_user_booking_types",
+                     db.get_user_booking_types(user_id, day, day + timedelta(days=6)), False),
+                    ("get_conflicting_bookings", db.get_conflicting_bookings(day, start, end, booking_type), False),
+                    ("get_booking_count_by_type_time",
+                     db.get_booking_count_by_type_time(day, start, end, booking_type), False),
+                    ("get_hourly_occupancy", db.get_hourly_occupancy(day, booking_type, 14, 23), False),
+                    ("get_seconds_until_next_expiry", db.get_seconds_until_next_expiry(), False),
+                    ("claim_due_reminders", db.claim_due_reminders(24 * 60, 500), True),
+                    ("add_to_waitlist", db.add_to_waitlist(user_id, booking_type, day, start, end), True),
+                    ("get_waitlist_slots", db.get_waitlist_slots(), False),
+                    ("promote_waitlist", db.promote_waitlist(day, booking_type, 16), True),
+                    ("set_user_active", db.set_user_active(user_id), True),
+                    ("create_broadcast", db.create_broadcast("Test", created_by=user_id), True),
+                    ("claim_running_broadcasts", db.claim_running_broadcasts(), True),
+                    ("release_broadcasts", db.release_broadcasts([broadcast_id]), True),
+                    ("get_broadcast_recipients", db.get_broadcast_recipients(0, 200), False),
+                    ("checkpoint_broadcast",
+                     db.checkpoint_broadcast(broadcast_id, user_id + 200, 190, 5, [user_id + 1]), True),
+                    ("finish_broadcast", db.finish_broadcast(broadcast_id), True),
+                    ("get_setting", db.get_setting('maintenance', 'off'), False),
+                    ("set_setting", db.set_setting('maintenance', 'on'), True),
+                    ("cancel_booking", db.cancel_booking(1, user_id), True),
+                    ("cleanup_expired_bookings", db.cleanup_expired_bookings(), True),
+                    # Последним: после загрузки индекса чтения броней не обращаются к базе
+                    ("load_booking_index", db.load_booking_index(), False),
+                ]
+                for label, call, writes in calls:
+                    pool.label = label
+                    if not writes:
+                        await call
+                        continue
+                    savepoint = connection.transaction()
+                    await savepoint.start()
+                    try:
+                        await call
+                    finally:
+                        await savepoint.rollback()
+            finally:
+                await transaction.rollback()
+    finally:
+        db.pool = real_pool
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.bookings))
+
+
+if __name__ == "__main__":
+    main()
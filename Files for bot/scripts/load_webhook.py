@@ -0,0 +1,98 @@
+"""Нагрузочный тест webhook-сервера
+
+Отправляет синтетические обновления (нажатия кнопок и сообщения от разных
+пользователей) на локальный webhook и печатает RPS и перцентили задержки.
+Для честного замера бот стоит запускать с тестовым токеном.
+
+    BOT_MODE=webhook python ../main.py
+    python scripts/load_webhook.py --url http://127.0.0.1:8080/webhook --updates 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+FIRST_USER_ID = 9_100_000_000
+CALLBACKS = ["view_my_bookings", "show_help", "view_profile", "book_now", "back_to_main"]
+
+
+def make_update(update_id, users):
+    user_id = FIRST_USER_ID + random.randrange(users)
+    user = {"id": user_id, "is_bot": False, "first_name": "Load"}
+    chat = {"id": user_id, "type": "private"}
+    message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user, "text": "/help"}
+
+    if update_id % 3:
+        return {"update_id": update_id, "message": message}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(user_id),
+            "message": message,
+            "data": random.choice(CALLBACKS)
+        }
+    }
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))
+    return sorted_values[index]
+
+
+async def run(url, secret, updates, concurrency, users):
+    counter = itertools.count(1)
+    latencies = []
+    errors = 0
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+
+    async def worker(session):
+        nonlocal errors
+        while True:
+            update_id = next(counter)
+            if update_id > updates:
+                return
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=make_update(update_id, users), headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(session) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"updates={updates} concurrency={concurrency} errors={errors} elapsed={elapsed:.2f}s")
+    print(f"rps={updates / elapsed:.0f}")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET'))
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--users', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.secret, args.updates, args.concurrency, args.users))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
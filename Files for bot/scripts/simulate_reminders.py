@@ -0,0 +1,85 @@
+"""Локальная симуляция рассылки напоминаний без PostgreSQL и Telegram
+
+База заменена очередью из --bookings броней, которую claim_due_reminders
+отдает пачками, бот - заглушкой с задержкой --latency мс на сообщение.
+Печатает пропускную способность ReminderDispatcher и проверяет, что каждое
+напоминание отправлено ровно один раз.
+
+    python scripts/simulate_reminders.py --bookings 5000 --users 800 --workers 4 --rate 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminders import ReminderDispatcher  # noqa: E402
+
+
+class SimulatedDatabase:
+    def __init__(self, bookings):
+        self.pending = list(bookings)
+
+    async def claim_due_reminders(self, lead_minutes, limit):
+        batch, self.pending = self.pending[:limit], self.pending[limit:]
+        return batch
+
+
+class SimulatedBot:
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = Counter()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent[chat_id] += 1
+
+
+async def simulate(args):
+    random.seed(1)
+    day = date.today() + timedelta(days=1)
+    bookings = [
+        {
+            'id': booking_id, 'user_id': random.randrange(1, args.users + 1),
+            'booking_type': "Компьютеры", 'booking_date': day,
+            'start_time': dtime(18), 'end_time': dtime(20)
+        }
+        for booking_id in range(1, args.bookings + 1)
+    ]
+    db = SimulatedDatabase(bookings)
+    bot = SimulatedBot(args.latency / 1000)
+    dispatcher = ReminderDispatcher(db, bot, poll_interval=0, batch_size=args.batch_size,
+                                    workers=args.workers, rate=args.rate)
+
+    task = asyncio.create_task(dispatcher.run())
+    started = time.perf_counter()
+    while dispatcher.sent + dispatcher.failed < args.bookings:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    task.cancel()
+
+    expected = Counter(booking['user_id'] for booking in bookings)
+    assert bot.sent == expected, "every reminder must be sent exactly once"
+    print(f"bookings: {args.bookings}, users: {args.users}, workers: {args.workers}, rate limit: {args.rate}/s")
+    print(f"sent {dispatcher.sent} in {elapsed:.2f} s: {dispatcher.sent / elapsed:.1f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=800)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=30, help="задержка отправки, мс")
+    args = parser.parse_args()
+    asyncio.run(simulate(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,12 @@ class BookingStates(StatesGroup):
     waiting_for_duration = State()
     waiting_for_join_decision = State()
 
+class RecurringBookingStates(StatesGroup):
+    waiting_for_type = State()
+    waiting_for_weekday = State()
+    waiting_for_time = State()
+    waiting_for_duration = State()
+
 class ViewBookingsStates(StatesGroup):
     waiting_for_filter_week = State()
     waiting_for_filter_date = State()
@@ -0,0 +1,51 @@
+"""Окно бронирования пересобирается при смене даты по часам clock"""
+from datetime import date, datetime
+
+from booking_calendar import BookingCalendar, WINDOW_WEEKS
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_window_is_cached_within_a_day():
+    clock = FakeClock(datetime(2026, 10, 14, 9, 0))
+    calendar = BookingCalendar(clock=clock)
+    calendar.available_weeks()
+    clock.now = datetime(2026, 10, 14, 23, 59)
+    calendar.available_weeks()
+    calendar.week_days(1)
+    assert calendar.builds == 1
+
+
+def test_window_is_rebuilt_after_midnight():
+    # Среда -> четверг: среда уходит из окна
+    clock = FakeClock(datetime(2026, 10, 14, 23, 59))
+    calendar = BookingCalendar(clock=clock)
+    assert calendar.week_dates(0)[0] == date(2026, 10, 14)
+
+    clock.now = datetime(2026, 10, 15, 0, 1)
+    assert calendar.today() == date(2026, 10, 15)
+    assert calendar.week_dates(0) == [date(2026, 10, 15), date(2026, 10, 16), date(2026, 10, 17)]
+    assert calendar.builds == 2
+
+
+def test_sunday_is_closed_and_window_moves_to_next_week():
+    # Суббота: в текущей неделе остается только она
+    clock = FakeClock(datetime(2026, 10, 17, 12, 0))
+    calendar = BookingCalendar(clock=clock)
+    assert calendar.week_dates(0) == [date(2026, 10, 17)]
+
+    # Воскресенье: нерабочий день не попадает в окно, текущая неделя пустая
+    clock.now = datetime(2026, 10, 18, 12, 0)
+    assert calendar.week_dates(0) == []
+    assert date(2026, 10, 18) not in [day for week in range(WINDOW_WEEKS) for day in calendar.week_dates(week)]
+    assert [week['start_date'] for week in calendar.available_weeks()] == [
+        date(2026, 10, 19), date(2026, 10, 26), date(2026, 11, 2)
+    ]
+    assert calendar.week_dates(1)[0] == date(2026, 10, 19)
+    assert calendar.builds == 2
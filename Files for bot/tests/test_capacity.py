@@ -0,0 +1,71 @@
+"""Сверка расчета вместимости capacity.py с переборным эталоном
+
+Брони генерируются hypothesis с шагом 15 минут (включая касающиеся и
+вложенные интервалы); эталон считает занятость в каждой минуте интервала.
+"""
+from datetime import time
+
+from hypothesis import given, strategies as st
+
+from capacity import check_capacity, hourly_headroom, peak_concurrency
+
+DAY_START = 9 * 60
+DAY_END = 23 * 60
+STEP = 15
+
+
+def to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+@st.composite
+def intervals(draw, step=STEP):
+    """Интервал [start, end) в минутах от полуночи, кратный step"""
+    start = draw(st.integers(DAY_START // step, DAY_END // step - 1)) * step
+    end = draw(st.integers(start // step + 1, DAY_END // step)) * step
+    return start, end
+
+
+def as_times(minute_intervals):
+    return [(to_time(start), to_time(end)) for start, end in minute_intervals]
+
+
+def oracle_peak(minute_intervals, start, end):
+    """Максимум занятости по всем минутам [start, end)"""
+    return max(
+        (sum(1 for interval_start, interval_end in minute_intervals if interval_start <= minute < interval_end)
+         for minute in range(start, end)),
+        default=0
+    )
+
+
+bookings_strategy = st.lists(intervals(), max_size=12)
+
+
+@given(bookings_strategy, intervals())
+def test_peak_concurrency_matches_oracle(bookings, window):
+    start, end = window
+    assert peak_concurrency(as_times(bookings), to_time(start), to_time(end)) == oracle_peak(bookings, start, end)
+
+
+@given(bookings_strategy, intervals(step=60), st.integers(1, 5))
+def test_hourly_headroom_matches_oracle(bookings, window, capacity):
+    start, end = window
+    headroom = hourly_headroom(as_times(bookings), capacity, start // 60, end // 60)
+    assert list(headroom) == list(range(start // 60, end // 60))
+    for hour, free in headroom.items():
+        assert free == max(0, capacity - oracle_peak(bookings, hour * 60, hour * 60 + 60))
+
+
+@given(bookings_strategy, intervals(step=60), st.integers(1, 5))
+def test_check_capacity_fits_below_capacity(bookings, window, capacity):
+    start, end = window
+    rows = [{'start_time': booking_start, 'end_time': booking_end} for booking_start, booking_end in as_times(bookings)]
+    check = check_capacity(rows, capacity, to_time(start), to_time(end))
+    peak = oracle_peak(bookings, start, end)
+    assert check['peak'] == peak
+    assert check['fits'] == (peak < capacity)
+
+
+def test_touching_bookings_do_not_overlap():
+    assert peak_concurrency([(time(18), time(19)), (time(19), time(20))], time(18), time(21)) == 1
@@ -0,0 +1,57 @@
+"""Нагрузочная проверка Database.reserve_booking на живой PostgreSQL
+
+Сотни параллельных бронирований одного слота не должны превысить
+вместимость. Пропускается, если не задан DATABASE_URL.
+"""
+import asyncio
+from datetime import date, time, timedelta
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from database import Database, DATABASE_URL  # noqa: E402
+from migrator import apply_migrations  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="DATABASE_URL is not set")
+
+# Диапазон ID тестовых пользователей, чтобы не пересекаться с реальными
+FIRST_USER_ID = 9_000_000_000
+BOOKING_TYPE = "Компьютеры"
+
+
+async def reserve_concurrently(requests, capacity):
+    db = Database()
+    await db.create_pool()
+    await apply_migrations(db)
+    booking_date = date.today() + timedelta(days=365)
+    start_time, end_time = time(18, 0), time(20, 0)
+    user_ids = [FIRST_USER_ID + i for i in range(requests)]
+
+    try:
+        for user_id in user_ids:
+            await db.add_user(user_id, f"Stress User{user_id}", "+70000000000", True)
+
+        results = await asyncio.gather(*[
+            db.reserve_booking(user_id, BOOKING_TYPE, booking_date, start_time, end_time, capacity)
+            for user_id in user_ids
+        ])
+        created = sum(1 for result in results if result['booking_id'] is not None)
+        async with db.pool.acquire() as connection:
+            active = await connection.fetchval('''
+                SELECT COUNT(*) FROM bookings
+                WHERE booking_date = $1 AND booking_type = $2 AND status = 'active'
+                AND user_id = ANY($3::bigint[])
+            ''', booking_date, BOOKING_TYPE, user_ids)
+        return created, active
+    finally:
+        async with db.pool.acquire() as connection:
+            await connection.execute('DELETE FROM bookings WHERE user_id = ANY($1::bigint[])', user_ids)
+            await connection.execute('DELETE FROM users WHERE user_id = ANY($1::bigint[])', user_ids)
+        await db.close()
+
+
+@pytest.mark.parametrize("requests, capacity", [(300, 16), (50, 1)])
+def test_capacity_never_exceeded(requests, capacity):
+    created, active = asyncio.run(reserve_concurrently(requests, capacity))
+    assert created == active == capacity
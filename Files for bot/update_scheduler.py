@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from aiogram.fsm.storage.base import BaseEventIsolation
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Сколько обновлений разных пользователей обрабатывается одновременно
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '64'))
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateScheduler(BaseEventIsolation):
+    """Планировщик обработки обновлений
+
+    Обновления разных пользователей обрабатываются параллельно (не больше
+    limit одновременно), обновления одного пользователя - строго по очереди.
+    Подключается к Dispatcher как events_isolation: FSMContextMiddleware
+    читает состояние только после захвата блокировки, поэтому двойное
+    нажатие кнопки не может выполнить два шага сценария над одним состоянием.
+    """
+
+    def __init__(self, limit=UPDATE_CONCURRENCY):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._user_locks = {}
+        self._user_waiters = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.pending = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    @asynccontextmanager
+    async def lock(self, key):
+        user_id = key.user_id
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        self._user_waiters[user_id] = self._user_waiters.get(user_id, 0) + 1
+        self.pending += 1
+        self._idle.clear()
+        queued_at = time.perf_counter()
+
+        try:
+            # Сначала очередь пользователя, потом общий лимит: ожидающий своей
+            # очереди пользователь не занимает место других
+            async with lock:
+                async with self._semaphore:
+                    wait = time.perf_counter() - queued_at
+                    self.last_wait = wait
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+                    self.in_flight += 1
+                    try:
+                        yield
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+        finally:
+            self.pending -= 1
+            self._user_waiters[user_id] -= 1
+            if not self._user_waiters[user_id]:
+                del self._user_waiters[user_id]
+                del self._user_locks[user_id]
+            if self.pending == 0:
+                self._idle.set()
+
+    async def close(self):
+        pass
+
+    async def drain(self, timeout):
+        """Ждет завершения начатых обновлений (не дольше timeout секунд)"""
+        if self.pending:
+            logger.info(f"Draining {self.pending} updates ({self.in_flight} in flight)...")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timeout: {self.pending} updates still pending")
+
+    def stats(self):
+        """Метрики: глубина очереди, обновления в обработке, время ожидания"""
+        return {
+            'queue_depth': self.pending - self.in_flight,
+            'in_flight': self.in_flight,
+            'processed': self.processed,
+            'active_users': len(self._user_locks),
+            'avg_wait': self.total_wait / self.processed if self.processed else 0.0,
+            'max_wait': self.max_wait,
+            'last_wait': self.last_wait
+        }
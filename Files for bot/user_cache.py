@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Время жизни записи и максимальный размер локального кэша
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+# Если задан REDIS_URL, кэш разделяется между процессами бота
+REDIS_URL = os.getenv('REDIS_URL')
+# Канал LISTEN/NOTIFY, по которому экземпляры бота сбрасывают локальный кэш
+USER_CACHE_CHANNEL = 'user_cache'
+
+logger = logging.getLogger(__name__)
+
+
+def _dump_user(user):
+    """Сериализует пользователя в JSON (created_at хранится в ISO-формате)"""
+    data = dict(user)
+    if isinstance(data.get('created_at'), datetime):
+        data['created_at'] = data['created_at'].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _load_user(raw):
+    """Восстанавливает пользователя из JSON"""
+    data = json.loads(raw)
+    if data.get('created_at'):
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
+    return data
+
+
+class UserCache:
+    """TTL/LRU-кэш пользователей перед Database.get_user
+
+    Кэшируются только найденные пользователи: незарегистрированный
+    пользователь всегда проверяется по базе, чтобы регистрация на другом
+    экземпляре бота была видна сразу. После изменения профиля Database
+    рассылает user_id по USER_CACHE_CHANNEL, и каждый экземпляр удаляет
+    пользователя из своего локального кэша (evict_local).
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE, redis_url=REDIS_URL):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.redis = None
+
+        if redis_url:
+            try:
+                from redis import asyncio as aioredis
+                self.redis = aioredis.from_url(redis_url)
+                logger.info("User cache is shared through Redis")
+            except ImportError:
+                logger.warning("REDIS_URL is set but redis package is not installed, using local user cache only")
+
+    @staticmethod
+    def _redis_key(user_id):
+        return f"user:{user_id}"
+
+    async def get(self, user_id):
+        """Возвращает пользователя из кэша или None"""
+        item = self._items.get(user_id)
+        if item is not None:
+            expires_at, user = item
+            if expires_at > time.monotonic():
+                self._items.move_to_end(user_id)
+                self.hits += 1
+                return user
+            del self._items[user_id]
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._redis_key(user_id))
+            except Exception as e:
+                logger.warning(f"Redis user cache read failed: {e}")
+                raw = None
+            if raw is not None:
+                user = _load_user(raw)
+                self._store_local(user_id, user)
+                self.hits += 1
+                self.redis_hits += 1
+                return user
+
+        self.misses += 1
+        return None
+
+    async def set(self, user_id, user):
+        """Кладет пользователя в кэш"""
+        self._store_local(user_id, user)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._redis_key(user_id), _dump_user(user), ex=int(self.ttl))
+            except Exception as e:
+                logger.warning(f"Redis user cache write failed: {e}")
+
+    async def invalidate(self, user_id):
+        """Удаляет пользователя из кэша (после изменения профиля)"""
+        self._items.pop(user_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._redis_key(user_id))
+            except Exception as e:
+                logger.warning(f"Redis user cache invalidation failed: {e}")
+
+    def evict_local(self, user_id):
+        """Удаляет пользователя только из локального кэша (изменение на другом экземпляре)"""
+        self._items.pop(user_id, None)
+
+    def clear_local(self):
+        """Очищает локальный кэш: уведомления об изменениях могли быть потеряны"""
+        self._items.clear()
+
+    def _store_local(self, user_id, user):
+        self._items[user_id] = (time.monotonic() + self.ttl, user)
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def stats(self):
+        """Счетчики попаданий и промахов кэша"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'redis_hits': self.redis_hits,
+            'size': len(self._items),
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from config import BOOKING_CAPACITY
+from helpers import format_date_display
+from keyboards import get_main_menu_keyboard
+
+load_dotenv()
+
+# Сколько секунд собирать отмены перед проходом: волна отмен продвигает очередь за один раз
+WAITLIST_BATCH_DELAY = float(os.getenv('WAITLIST_BATCH_DELAY', '0.5'))
+# Через сколько секунд повторить пары, которые не удалось продвинуть (ошибка базы)
+WAITLIST_RETRY_DELAY = float(os.getenv('WAITLIST_RETRY_DELAY', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+class WaitlistEngine:
+    """Продвижение листа ожидания при освобождении мест
+
+    Отмена и истечение брони (Database.add_listener, в том числе изменения других
+    экземпляров через LISTEN/NOTIFY) помечают пару (дата, тип). Фоновая задача
+    run собирает пары за WAITLIST_BATCH_DELAY и для каждой вызывает
+    Database.promote_waitlist - одна транзакция на пару, сколько бы броней ни
+    освободилось. Пара, на которой promote_waitlist упал, остается в очереди и
+    повторяется через WAITLIST_RETRY_DELAY. Продвинутым пользователям
+    отправляется уведомление.
+    """
+
+    def __init__(self, db, bot, capacity=BOOKING_CAPACITY, batch_delay=WAITLIST_BATCH_DELAY,
+                 retry_delay=WAITLIST_RETRY_DELAY):
+        self.db = db
+        self.bot = bot
+        self.capacity = capacity
+        self.batch_delay = batch_delay
+        self.retry_delay = retry_delay
+        self._pending = set()
+        self._wakeup = asyncio.Event()
+        self.runs = 0
+        self.promoted = 0
+        self.notify_errors = 0
+        db.add_listener(self.on_booking_event)
+
+    def on_booking_event(self, event, booking):
+        if event in ('cancelled', 'expired'):
+            self.enqueue(booking['booking_date'], booking['booking_type'])
+
+    def enqueue(self, booking_date, booking_type):
+        """Проверить очередь пары (дата, тип) на ближайшем проходе"""
+        if booking_type in self.capacity:
+            self._pending.add((booking_date, booking_type))
+            self._wakeup.set()
+
+    async def run_once(self):
+        pending, self._pending = self._pending, set()
+        self.runs += 1
+        for booking_date, booking_type in sorted(pending):
+            try:
+                bookings = await self.db.promote_waitlist(booking_date, booking_type, self.capacity[booking_type])
+            except Exception as e:
+                logger.error(f"Error promoting waitlist for {booking_type} {booking_date}: {e}")
+                self._pending.add((booking_date, booking_type))
+                continue
+            self.promoted += len(bookings)
+            for booking in bookings:
+                await self.notify(booking)
+
+    async def run(self):
+        # Заявки, которые могли не продвинуться до перезапуска
+        try:
+            for booking_date, booking_type in await self.db.get_waitlist_slots():
+                self.enqueue(booking_date, booking_type)
+        except Exception as e:
+            logger.error(f"Error loading waitlist: {e}")
+
+        while True:
+            if self._pending and not self._wakeup.is_set():
+                # Остались пары после ошибки - повтор по таймеру, если раньше не придет новое событие
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.retry_delay)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._wakeup.wait()
+            await asyncio.sleep(self.batch_delay)
+            self._wakeup.clear()
+            await self.run_once()
+
+    async def notify(self, booking):
+        text = (
+            f"🎉 Освободилось место - бронирование из листа ожидания подтверждено!\n\n"
+            f"📋 ID: {booking['id']}\n"
+            f"🎯 Тип: {booking['booking_type']}\n"
+            f"📅 Дата: {format_date_display(booking['booking_date'])}\n"
+            f"🕒 Время: {booking['start_time'].strftime('%H:%M')} - {booking['end_time'].strftime('%H:%M')}"
+        )
+        try:
+            await self.bot.send_message(
+                booking['user_id'], text, reply_markup=get_main_menu_keyboard(booking['user_id'])
+            )
+        except Exception as e:
+            self.notify_errors += 1
+            logger.error(f"Error notifying user {booking['user_id']} about waitlist booking {booking['id']}: {e}")
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'promoted': self.promoted,
+            'notify_errors': self.notify_errors,
+            'pending': len(self._pending)
+        }
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+import signal
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+# Публичный адрес, который регистрируется в Telegram (https://example.com)
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL')
+# Telegram передает его в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Сколько параллельных соединений разрешить Telegram (1-100); лимит обработки - UPDATE_CONCURRENCY
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Сколько секунд ждать завершения начатых обновлений при остановке
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(dp, bot):
+    """aiohttp-приложение, принимающее обновления от Telegram"""
+    scheduler = dp["update_scheduler"]
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    async def on_startup(app):
+        if WEBHOOK_BASE_URL:
+            await bot.set_webhook(
+                f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"Webhook set to {WEBHOOK_BASE_URL}{WEBHOOK_PATH}")
+
+    async def on_shutdown(app):
+        # Новые соединения уже не принимаются - дожидаемся начатых обновлений
+        await scheduler.drain(WEBHOOK_DRAIN_TIMEOUT)
+
+    app.on_startup.append(on_startup)
+    # Дренаж должен выполниться раньше остановки диспетчера
+    app.on_shutdown.insert(0, on_shutdown)
+    return app
+
+
+async def run_webhook(dp, bot):
+    """Запускает webhook-сервер и работает до SIGTERM/SIGINT"""
+    if not WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET is not set, requests are not verified")
+
+    app = create_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+        logger.info("Stopping webhook server...")
+    finally:
+        await runner.cleanup()
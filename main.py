@@ -1,11 +1,29 @@
 import asyncio
 import logging
+import os
 import sys
 from aiogram.types import Message
 from aiogram.filters import Command
-from config import dp, bot
+from aiogram import Dispatcher
+from config import bot
 from database import Database
+from migrator import apply_migrations
+from expiry import ExpiryScheduler
+from fsm_storage import create_fsm_storage
 from handlers import register_all_handlers
+from webhook import run_webhook
+from update_scheduler import UpdateScheduler
+from outbound import RateLimitMiddleware
+from occupancy import OccupancyEngine
+from booking_index import BOOKING_INDEX_ENABLED
+from waitlist import WaitlistEngine
+from reminders import ReminderDispatcher
+from broadcast import BroadcastEngine
+from maintenance import MaintenanceMiddleware
+from metrics import (
+    create_metrics, instrument_database, run_metrics_server, HandlerMetricsMiddleware, BotApiMetricsMiddleware,
+    MetricsStorage
+)
 from keyboards import get_main_menu_keyboard
 
 
@@ -17,9 +35,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def cmd_start(message: Message):
+# polling - long polling, webhook - aiohttp-сервер (см. webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+async def cmd_start(message: Message, db: Database):
     """Команда для начала работы"""
     try:
+        # Пользователь, заблокировавший бота раньше, снова получает рассылки
+        await db.set_user_active(message.from_user.id)
         await message.answer(
             "🏠 Главное меню:",
             reply_markup=get_main_menu_keyboard(message.from_user.id)
@@ -55,54 +78,131 @@ async def cmd_help(message: Message):
     """
     await message.answer(help_text, parse_mode="Markdown")
 
-async def cleanup_task():
-    """Фоновая задача для очистки просроченных бронирований"""
-    try:
-        db = Database()
-        await db.create_pool()
-        while True:
-            try:
-                await db.cleanup_expired_bookings()
-                logger.info("Expired bookings cleanup completed")
-            except Exception as e:
-                logger.error(f"Error during cleanup: {e}")
-            await asyncio.sleep(3600)
-    except Exception as e:
-        logger.error(f"Failed to start cleanup task: {e}")
+async def stats_task(db: Database, expiry: ExpiryScheduler, dp: Dispatcher, rate_limiter: RateLimitMiddleware,
+                     reminders: ReminderDispatcher):
+    """Фоновая задача: периодически пишет в лог статистику кэша и планировщиков"""
+    while True:
+        await asyncio.sleep(3600)
+        logger.info(f"User cache stats: {db.user_cache.stats()}")
+        logger.info(f"Expiry scheduler stats: {expiry.stats()}")
+        logger.info(f"Update scheduler stats: {dp['update_scheduler'].stats()}")
+        logger.info(f"Occupancy cache stats: {dp['occupancy'].stats()}")
+        logger.info(f"Booking index stats: {db.booking_index.stats()}")
+        logger.info(f"Waitlist stats: {dp['waitlist'].stats()}")
+        logger.info(f"Reminder stats: {reminders.stats()}")
+        logger.info(f"Broadcast stats: {dp['broadcast'].stats()}")
+        logger.info(f"Maintenance: enabled={dp['maintenance'].enabled}, refused={dp['maintenance'].refused}")
+        logger.info(f"Outbound flood-control retries: {rate_limiter.retries}")
+
+def create_dispatcher(db: Database, metrics=None):
+    """Диспетчер с зарегистрированными обработчиками (общий для polling и webhook)"""
+    # Обновления одного пользователя - по очереди, разных - параллельно (UPDATE_CONCURRENCY)
+    scheduler = UpdateScheduler()
+    # Хранилище FSM выбирается через FSM_STORAGE (memory, redis, postgres)
+    storage = create_fsm_storage(db)
+    if metrics is not None:
+        # Переходы по шагам сценариев (BookingStates и др.) для воронки
+        storage = MetricsStorage(storage, metrics)
+    dp = Dispatcher(storage=storage, events_isolation=scheduler)
+    dp["db"] = db
+    dp["update_scheduler"] = scheduler
+    # Загрузка по часам для сетки времени (сбрасывается при изменении броней)
+    dp["occupancy"] = OccupancyEngine(db)
+    # Лист ожидания продвигается при отмене и истечении броней
+    dp["waitlist"] = WaitlistEngine(db, bot)
+    # Рассылки администраторов (продолжаются после перезапуска)
+    dp["broadcast"] = BroadcastEngine(db, bot)
+    # Режим техработ: флаг в памяти, переключается из админки или через bot_settings
+    maintenance = MaintenanceMiddleware(db)
+    dp["maintenance"] = maintenance
+    dp.update.outer_middleware(maintenance)
+    if metrics is not None:
+        # Время обработчиков сообщений и кнопок
+        handler_metrics = HandlerMetricsMiddleware(metrics)
+        dp.message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
+
+    # Регистрация обработчиков
+    register_all_handlers(dp)
+
+    # Регистрация команд
+    # /start обрабатывается в handlers/start.py (с регистрацией)
+    dp.message.register(cmd_start, Command("book"))
+    dp.message.register(cmd_help, Command("help"))
+    return dp
 
 async def main():
     """Основная функция запуска бота"""
+    # Единый пул соединений на весь процесс
+    db = Database()
+    dp = None
+    metrics_runner = None
+    background_tasks = []
     try:
         logger.info("Бот запускается...")
 
+        # Метрики Prometheus (METRICS_PORT): до создания пула, чтобы измерялось ожидание соединений
+        metrics = create_metrics(db)
+        if metrics is not None:
+            instrument_database(db, metrics)
+
         # Инициализация базы данных
-        db = Database()
         await db.create_pool()
+        await apply_migrations(db)
         logger.info("База данных инициализирована")
 
-        # Регистрация обработчиков
-        register_all_handlers(dp)
-
-        # Регистрация команд
-        dp.message.register(cmd_start, Command("start"))
-        dp.message.register(cmd_start, Command("book"))
-        dp.message.register(cmd_help, Command("help"))
-
-        # Очистка просроченных бронирований при запуске
-        await db.cleanup_expired_bookings()
-
-        # Запуск фоновой задачи
-        asyncio.create_task(cleanup_task())
-
-        logger.info("Бот успешно запущен!")
-
-        # Запуск поллинга
-        await dp.start_polling(bot)
+        dp = create_dispatcher(db, metrics)
+
+        # Исходящие запросы к Bot API - в пределах лимитов Telegram, с повтором после RetryAfter
+        rate_limiter = RateLimitMiddleware()
+        bot.session.middleware(rate_limiter)
+        if metrics is not None:
+            # После ограничителя: измеряется сам запрос, без ожидания лимитов
+            bot.session.middleware(BotApiMetricsMiddleware(metrics))
+            metrics_runner = await run_metrics_server(metrics)
+
+        # Планировщик истечения броней: первая итерация сразу очищает просроченные
+        expiry = ExpiryScheduler(db)
+        # Напоминания о бронях, которые скоро начнутся (REMINDER_LEAD_MINUTES)
+        reminders = ReminderDispatcher(db, bot)
+
+        # Запуск фоновых задач
+        background_tasks.append(asyncio.create_task(expiry.run()))
+        if BOOKING_INDEX_ENABLED:
+            # Индекс активных броней: загрузка и изменения других экземпляров через LISTEN/NOTIFY
+            db.enable_booking_index()
+        # Одно соединение LISTEN на индекс броней и настройки (режим техработ)
+        background_tasks.append(asyncio.create_task(db.listen_notifications()))
+        background_tasks.append(asyncio.create_task(dp["waitlist"].run()))
+        background_tasks.append(asyncio.create_task(reminders.run()))
+        # Рассылки с истекшей арендой (упавший экземпляр) - при запуске и затем периодически
+        background_tasks.append(asyncio.create_task(dp["broadcast"].run()))
+        background_tasks.append(asyncio.create_task(stats_task(db, expiry, dp, rate_limiter, reminders)))
+
+        logger.info(f"Бот успешно запущен! (режим: {BOT_MODE})")
+
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # Запуск поллинга
+            await dp.start_polling(bot)
 
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
         sys.exit(1)
     finally:
+        for task in background_tasks:
+            task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if dp is not None:
+            # Незавершенные рассылки продолжит следующий запуск без ожидания аренды
+            try:
+                await dp["broadcast"].release()
+            except Exception as e:
+                logger.error(f"Error releasing broadcasts: {e}")
+            await dp.fsm.storage.close()
+        await db.close()
         logger.info("Бот остановлен.")
 
 if __name__ == "__main__":